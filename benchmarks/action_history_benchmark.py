@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the per-step cost of building the prompt as the action
+history grows, comparing ConversationContext with the previous
+create_chat_completion, which copied the messages and rebuilt a function
+message for every action on every call.
+
+Run from the repository root:
+    python -m benchmarks.action_history_benchmark
+"""
+import timeit
+
+from whatDoesThisButtonDo.AiAssistant.conversation_context import (
+    ConversationContext,
+)
+
+HISTORY_SIZES = [10, 100, 1000, 5000]
+STATE = (
+    "Current system state:\n"
+    '{"status": "success", "processes": [{"stdout": "", "stderr": "", '
+    '"status": "running", "returncode": null}]}'
+)
+INSTRUCTIONS = "At this state in the test, you have:\n# Available Actions:\n..."
+ACTION = {
+    "action": "run_cli",
+    "parameters": {"args": ["--help"]},
+    "test_intention": "Check the help output",
+}
+STATUS = {"status": "success"}
+
+
+def legacy_build(messages, action_history):
+    """Message building of create_chat_completion before ConversationContext."""
+    chat_messages = messages.copy()
+    for entry in action_history:
+        chat_messages.append({
+            "role": "function",
+            "name": entry["function_name"],
+            "content": str({
+                "action": entry["action"],
+                "status": entry["status"]
+            })
+        })
+    return chat_messages
+
+
+def legacy_conversation(steps):
+    messages = [{"role": "system", "content": "You are an expert tester."}]
+    action_history = []
+    for _ in range(steps):
+        messages.append({"role": "system", "content": STATE})
+        messages.append({"role": "user", "content": INSTRUCTIONS})
+        legacy_build(messages, action_history)
+        action_history.append({
+            "function_name": "select_next_action",
+            "action": ACTION,
+            "status": STATUS,
+        })
+    return messages, action_history
+
+
+def context_conversation(steps):
+    context = ConversationContext()
+    context.append("system", "You are an expert tester.")
+    for _ in range(steps):
+        context.begin_turn()
+        context.append("system", STATE)
+        context.append("user", INSTRUCTIONS)
+        context.render()
+        context.record_action("select_next_action", ACTION, STATUS)
+    return context
+
+
+def time_step(step, number):
+    """Best time of one step, in microseconds."""
+    return min(timeit.repeat(step, number=number, repeat=5)) / number * 1e6
+
+
+def main(number: int = 200) -> None:
+    print(f"{'history':>8} {'legacy us/step':>15} {'context us/step':>16}")
+    for size in HISTORY_SIZES:
+        messages, action_history = legacy_conversation(size)
+        context = context_conversation(size)
+
+        def legacy_step():
+            legacy_build(messages, action_history)
+
+        def context_step():
+            context.begin_turn()
+            context.append("system", STATE)
+            context.append("user", INSTRUCTIONS)
+            context.render()
+            context.record_action("select_next_action", ACTION, STATUS)
+
+        legacy = time_step(legacy_step, number)
+        # Each context step also grows the conversation, as in a real run
+        incremental = time_step(context_step, number)
+        print(f"{size:>8} {legacy:>15.2f} {incremental:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark comparing the cached assertion engine with the previous
+evaluate_assertion, which parsed the JSON path on every call.
+
+Run from the repository root:
+    python -m benchmarks.assertion_engine_benchmark
+"""
+import re
+import timeit
+
+import jsonpath_ng
+
+from whatDoesThisButtonDo.assertion_engine import AssertionEngine
+
+STATE = {
+    "status": "success",
+    "processes": [{
+        "stdout": "",
+        "stderr": (
+            "usage: whatDoesThisButtonDo [-h] oracle_dir\n"
+            "whatDoesThisButtonDo: error: the following arguments are "
+            "required: oracle_dir\n"
+        ),
+        "status": "completed",
+        "returncode": 1,
+    }],
+}
+
+ASSERTIONS = [
+    {"path": "status", "condition": "equals", "value": "success"},
+    {"path": "processes[0].status", "condition": "equals", "value": "completed"},
+    {
+        "path": "processes[0].stderr",
+        "condition": "contains",
+        "value": "required: oracle_dir",
+    },
+    {
+        "path": "processes[0].stderr",
+        "condition": "matches_regex",
+        "value": "(?s).*required: oracle_dir.*",
+    },
+    {"path": "processes[*].status", "condition": "not_equals", "value": "running"},
+]
+
+
+def legacy_evaluate_assertion(sut_state, assertion_parameters):
+    """evaluate_assertion as it was before the assertion engine."""
+    path_expr = jsonpath_ng.parse(assertion_parameters['path'])
+    matches = [match.value for match in path_expr.find(sut_state)]
+    if not matches:
+        raise AssertionError(
+            f"No match found for path: {assertion_parameters['path']}"
+        )
+    condition = assertion_parameters['condition']
+    value = assertion_parameters['value']
+    path = assertion_parameters['path']
+    for match in matches:
+        if condition == 'equals':
+            if match != value:
+                raise AssertionError(f"Expected {value} at {path}, found {match}")
+        elif condition == 'not_equals':
+            if match == value:
+                raise AssertionError(f"Did not expect {value} at {path}")
+        elif condition == 'contains':
+            if value not in match:
+                raise AssertionError(f"Expected {match} to contain {value}")
+        elif condition == 'not_contains':
+            if value in match:
+                raise AssertionError(f"Did not expect {match} to contain {value}")
+        elif condition == 'matches_regex':
+            if not re.match(value, match):
+                raise AssertionError("Value did not match regex pattern.")
+        else:
+            raise ValueError(f"Unknown condition: {condition}")
+
+
+def run_all(evaluate):
+    for assertion in ASSERTIONS:
+        evaluate(STATE, assertion)
+
+
+def main(number: int = 2000) -> None:
+    engine = AssertionEngine()
+    legacy = min(timeit.repeat(
+        lambda: run_all(legacy_evaluate_assertion), number=number, repeat=3
+    ))
+    cached = min(timeit.repeat(
+        lambda: run_all(engine.evaluate), number=number, repeat=3
+    ))
+    calls = number * len(ASSERTIONS)
+    print(f"{calls} assertions per run")
+    print(f"legacy evaluate_assertion: {legacy / calls * 1e6:8.2f} us/assertion")
+    print(f"AssertionEngine:           {cached / calls * 1e6:8.2f} us/assertion")
+    print(f"speedup:                   {legacy / cached:8.1f}x")
+    print(f"cache: {engine.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
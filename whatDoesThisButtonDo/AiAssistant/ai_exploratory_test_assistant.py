@@ -1,23 +1,175 @@
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from .llm_backend import LLMBackend, OpenAIBackend
+from .request_scheduler import RateLimits, RequestScheduler
+from .openai_transport import DEFAULT_MAX_CONNECTIONS
+
+if TYPE_CHECKING:
+    from ..oracle_relevance_index import OracleRelevanceIndex
+    from .response_cache import ResponseCache
+
+
 class AIExploratoryTestAssistant:
-    def __init__(self, test_oracles, api_key: str, model: str):
+    def __init__(
+        self,
+        test_oracles,
+        api_key: str,
+        model: str,
+        relevance_index: Optional['OracleRelevanceIndex'] = None,
+        relevance_top_k: Optional[int] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        response_cache: Optional['ResponseCache'] = None,
+        backend: Optional[LLMBackend] = None,
+        base_url: Optional[str] = None,
+        stream: bool = False,
+        rate_limits: Optional[RateLimits] = None,
+        max_retries: int = 5,
+        context_turns: Optional[int] = None,
+        context_max_tokens: Optional[int] = None,
+        state_resync_every: Optional[int] = None
+    ):
+        """
+        Args:
+            test_oracles: All loaded test oracles
+            api_key: OpenAI API key
+            model: Model name
+            relevance_index: Index over the oracle sections; with
+                relevance_top_k, each thread only gets the sections most
+                relevant to its sandbox and goal
+            relevance_top_k: Number of oracle sections per thread, None to
+                send all oracles
+            max_connections: Size of the connection pool shared by all threads
+            response_cache: Record/replay cache of model responses shared by
+                all threads, None to always call the API
+            backend: LLMBackend shared by all threads, defaults to an
+                OpenAIBackend behind a RequestScheduler, created on first use
+            base_url: Base URL of the default OpenAI backend, e.g. of a
+                StandInServer
+            stream: Stream responses so each action is dispatched as soon as
+                its tool call is complete
+            rate_limits: Limits of the model for the default backend's
+                scheduler, None to learn them from response headers
+            max_retries: Retries of rate limited or failed requests by the
+                default backend's scheduler
+            context_turns: Number of recent steps each thread sends in full,
+                None to send the whole conversation
+            context_max_tokens: Estimated token ceiling of each prompt, None
+                for no limit
+            state_resync_every: Send threads only the state changes since the
+                last step, and the full state every this many steps; None to
+                always send the full state
+        """
         self.test_oracles = test_oracles
         self.api_key = api_key
         self.model = model
+        self.relevance_index = relevance_index
+        self.relevance_top_k = relevance_top_k
+        self.max_connections = max_connections
+        self.response_cache = response_cache
+        self.base_url = base_url
+        self.stream = stream
+        self.rate_limits = rate_limits
+        self.max_retries = max_retries
+        self.context_turns = context_turns
+        self.context_max_tokens = context_max_tokens
+        self.state_resync_every = state_resync_every
+        self._backend = backend
+        self._backend_lock = threading.Lock()
 
-    def create_test_execution_thread(self, goal):
+    @property
+    def backend(self) -> LLMBackend:
+        """The backend shared by all threads"""
+        with self._backend_lock:
+            if self._backend is None:
+                self._backend = RequestScheduler(
+                    OpenAIBackend.create(
+                        self.api_key,
+                        base_url=self.base_url,
+                        max_connections=self.max_connections,
+                        # The scheduler retries with backoff across threads
+                        max_retries=0
+                    ),
+                    limits={self.model: self.rate_limits} if self.rate_limits else {},
+                    max_retries=self.max_retries
+                )
+            return self._backend
+
+    def backend_stats(self) -> Dict[str, Any]:
+        """Get metrics of the shared backend, e.g. queue wait and connection reuse."""
+        return self.backend.stats()
+
+    async def aclose_loop(self) -> None:
+        """Close the backend's connections bound to the running event loop."""
+        await self.backend.aclose_loop()
+
+    def create_test_execution_thread(self, goal, sandbox=None):
         """
         Creates a new AI assistant thread for handling test interactions
         
         Args:
             goal: Dictionary containing test goal information
+            sandbox: Sandbox the thread explores, used to select relevant
+                test oracles
         
         Returns:
             AIAssistantThread: A new thread instance for test execution
         """
         from .ai_test_execution_thread import AITestExecutionThread
         return AITestExecutionThread(
-            test_oracles=self.test_oracles,
+            test_oracles=self.oracles_for(goal, sandbox),
             api_key=self.api_key,
             model=self.model,
-            goal=goal
-        ) 
\ No newline at end of file
+            goal=goal,
+            backend=self.backend,
+            response_cache=self.response_cache,
+            stream=self.stream,
+            context_turns=self.context_turns,
+            context_max_tokens=self.context_max_tokens,
+            state_resync_every=self.state_resync_every
+        )
+
+    def generate_goals(self, sandbox, max_goals: int):
+        """
+        Ask the model for test goals of a sandbox in one request.
+        
+        Args:
+            sandbox: Sandbox to propose goals for
+            max_goals: Most goals to propose
+        
+        Returns:
+            list: Goals with 'title' and 'description'
+        """
+        from ..oracle_relevance_index import sandbox_query
+        from .generate_goals_command import GenerateGoalsCommand
+        from .openai_client import OpenAIClient
+        openai_client = OpenAIClient(
+            test_oracles=self.oracles_for(None, sandbox),
+            api_key=self.api_key,
+            model=self.model,
+            backend=self.backend,
+            response_cache=self.response_cache
+        )
+        return GenerateGoalsCommand(
+            openai_client, sandbox_query(sandbox.path), max_goals
+        ).execute()
+
+    def oracles_for(self, goal, sandbox=None):
+        """
+        Get the test oracles to send for a goal and sandbox.
+        
+        Returns:
+            The most relevant oracle sections if a relevance index and top-k
+            are configured and a sandbox is given, otherwise all oracles
+        """
+        if (
+            self.relevance_index is None
+            or self.relevance_top_k is None
+            or sandbox is None
+        ):
+            return self.test_oracles
+        from ..oracle_relevance_index import sandbox_query
+        return self.relevance_index.select(
+            self.test_oracles,
+            sandbox_query(sandbox.path, goal),
+            self.relevance_top_k
+        )
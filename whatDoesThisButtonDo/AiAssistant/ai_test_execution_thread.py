@@ -1,14 +1,57 @@
+from .conversation_context import ConversationContext
 from .openai_client import OpenAIClient
+from .state_delta import StateDeltaTracker
 from .get_next_action_command import GetNextActionCommand
 
 class AITestExecutionThread:
-    def __init__(self, test_oracles, api_key: str, model: str, goal):
+    def __init__(
+        self,
+        test_oracles,
+        api_key: str,
+        model: str,
+        goal,
+        backend=None,
+        response_cache=None,
+        stream: bool = False,
+        context_turns: int = None,
+        context_max_tokens: int = None,
+        state_resync_every: int = None
+    ):
+        """
+        Args:
+            test_oracles: Test oracles sent at the start of the conversation
+            api_key: OpenAI API key, used if no backend is given
+            model: Model name
+            goal: Dictionary containing test goal information
+            backend: LLMBackend shared with other threads, None to create an
+                OpenAI backend for this thread
+            response_cache: ResponseCache shared with other threads, None to
+                always call the API
+            stream: Stream responses and dispatch tool calls as soon as they
+                are complete
+            context_turns: Number of recent steps sent in full, older ones
+                are summarized; None to send the whole conversation
+            context_max_tokens: Estimated token ceiling of each prompt, None
+                for no limit
+            state_resync_every: Send only the changes of the state since the
+                last step, and the full state every this many steps; None to
+                always send the full state
+        """
         self.openai_client = OpenAIClient(
             test_oracles=test_oracles,
             api_key=api_key,
-            model=model
+            model=model,
+            backend=backend,
+            response_cache=response_cache,
+            stream=stream,
+            context=ConversationContext(
+                max_turns=context_turns,
+                max_tokens=context_max_tokens
+            )
         )
-        self.action_history = []
+        self.state_tracker = None
+        if state_resync_every is not None:
+            self.state_tracker = StateDeltaTracker(resync_every=state_resync_every)
         
         goal_message = (
             f"Test Goal: {goal['title']}\n"
@@ -16,25 +59,51 @@ class AITestExecutionThread:
         )
         self.openai_client.append_message("user", goal_message)
 
-    def get_next_action(self, possible_actions, sut_state):
+    def get_next_action(self, possible_actions, sut_state, max_plan_steps=None):
         """
         Get the AI's choice for the next action to take
         
         Args:
             possible_actions: List of possible actions with their descriptions
             sut_state: Current state of the system under test
+            max_plan_steps: Also offer the submit_plan tool for plans of up to
+                this many steps
             
         Returns:
             tuple: (ai_tool_call_name, dict with action and parameters)
                   or (None, None) to indicate testing should stop
         """
-        command = GetNextActionCommand(
+        return self._command(possible_actions, sut_state, max_plan_steps).execute()
+
+    async def get_next_action_async(
+        self, possible_actions, sut_state, max_plan_steps=None
+    ):
+        """
+        Asyncio counterpart of get_next_action
+        
+        Returns:
+            tuple: (ai_tool_call_name, dict with action and parameters)
+        """
+        command = self._command(possible_actions, sut_state, max_plan_steps)
+        return await command.execute_async()
+
+    def plan_interrupted(self, reason: str):
+        """
+        Tell the AI why the rest of its plan was not run
+        
+        Args:
+            reason: Why the plan stopped
+        """
+        self.openai_client.append_message("user", f"Plan stopped: {reason}")
+
+    def _command(self, possible_actions, sut_state, max_plan_steps):
+        return GetNextActionCommand(
             self.openai_client,
             possible_actions,
-            self.action_history,
-            sut_state
+            sut_state,
+            self.state_tracker,
+            max_plan_steps
         )
-        return command.execute()
 
     def action_executed(self, ai_tool_call_name, action_choice, status):
         """
@@ -45,9 +114,5 @@ class AITestExecutionThread:
             action_choice: The action that was executed
             status: The status after execution
         """
-        history_entry = {
-            "function_name": ai_tool_call_name,
-            "action": action_choice,
-            "status": status
-        }
-        self.action_history.append(history_entry) 
\ No newline at end of file
+        # Serialized into the conversation once, not again on every request
+        self.openai_client.record_action(ai_tool_call_name, action_choice, status)
@@ -0,0 +1,305 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from ..token_estimate import CHARS_PER_TOKEN, estimate_tokens
+
+Message = Dict[str, str]
+
+_SUMMARY_LINE_CHARS = 300
+_TRUNCATED = "\n... (truncated to fit the context budget)"
+# Per-message overhead of the chat format, in tokens
+_MESSAGE_TOKENS = 4
+
+
+class ContextBudgetExceeded(ValueError):
+    """Raised when even the smallest possible prompt exceeds the token ceiling"""
+
+
+class ConversationContext:
+    """
+    The messages of one conversation, and the prompt built from them.
+
+    Messages added before the first turn form a stable prefix (system prompt,
+    oracles, goal) that is sent unchanged with every request, so providers can
+    cache it. Each step starts a turn holding that step's state and
+    instructions, followed by the result of the action it chose. Messages are
+    only ever appended, each serialized once, so every prompt extends the
+    previous one and the prompt of an unbounded context is built without
+    copying the conversation.
+
+    With max_turns, only the last max_turns turns are sent; the actions of
+    older turns are folded into a compact running summary built locally, and
+    older states are dropped since later ones supersede them.
+
+    With max_tokens, the estimated prompt size is enforced before sending by
+    folding further turns, shortening the summary and finally truncating the
+    current state.
+    """
+
+    def __init__(
+        self,
+        max_turns: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        summary_max_chars: int = 2000
+    ):
+        """
+        Args:
+            max_turns: Number of recent turns sent in full, None for all
+            max_tokens: Estimated token ceiling of a prompt, None for no limit
+            summary_max_chars: Longest the running summary may grow; the
+                oldest lines are dropped beyond this
+        """
+        if max_turns is not None and max_turns < 1:
+            raise ValueError("max_turns must be at least 1")
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summary_max_chars = summary_max_chars
+        # Per rendered prompt: step, message count, token estimate and folding
+        self.step_stats: List[Dict[str, Any]] = []
+        self._messages: List[Message] = []
+        # Estimated tokens of _messages[:i] at index i
+        self._cumulative_tokens = [0]
+        # Index in _messages where each turn starts
+        self._turn_offsets: List[int] = []
+        # Summary lines of the actions executed in each turn
+        self._turn_actions: List[List[str]] = []
+        self._summary_lines: List[str] = []
+        self._omitted_summary_lines = 0
+        self._folded_actions = 0
+        # Turns before this index have been folded
+        self._turn_start = 0
+
+    @property
+    def messages(self) -> List[Message]:
+        """Every message of the conversation, prefix first."""
+        return self._messages
+
+    @property
+    def prefix(self) -> List[Message]:
+        """Messages added before the first turn."""
+        return self._messages[:self._prefix_end()]
+
+    @property
+    def turn_count(self) -> int:
+        """Number of turns started so far."""
+        return len(self._turn_offsets)
+
+    @property
+    def first_full_turn(self) -> int:
+        """Index of the oldest turn the next prompt sends in full, unless the
+        token ceiling folds more; after render, of the oldest turn it sent."""
+        if self.max_turns is None:
+            return self._turn_start
+        return max(self._turn_start, self.turn_count - self.max_turns)
+
+    def append(self, role: str, content: str) -> None:
+        """Add a message to the current turn, or to the prefix before the first."""
+        self._add({"role": role, "content": content})
+
+    def begin_turn(self) -> None:
+        """Start the messages of a new step."""
+        self._turn_offsets.append(len(self._messages))
+        self._turn_actions.append([])
+
+    def replace(self, index: int, content: str) -> None:
+        """
+        Replace the content of a message of the current turn, e.g. to render
+        the prompt again after a change.
+
+        Args:
+            index: Index of the message in messages
+            content: New content
+
+        Raises:
+            ValueError: If the message is not in the current turn
+        """
+        if not self._turn_offsets or index < self._turn_offsets[-1]:
+            raise ValueError("Only messages of the current turn can be replaced")
+        self._messages[index] = dict(self._messages[index], content=content)
+        for i in range(index, len(self._messages)):
+            self._cumulative_tokens[i + 1] = (
+                self._cumulative_tokens[i] + self._message_tokens(self._messages[i])
+            )
+
+    def record_action(self, function_name: str, action: Any, status: Any) -> None:
+        """
+        Add the function message reporting an executed action to the
+        current turn.
+
+        Args:
+            function_name: Name of the tool call that chose the action
+            action: The executed action
+            status: Status of the system after the action
+        """
+        action_json = json.dumps(action, separators=(',', ':'), default=str)
+        status_json = json.dumps(status, separators=(',', ':'), default=str)
+        self._add({
+            "role": "function",
+            "name": function_name,
+            "content": f'{{"action":{action_json},"status":{status_json}}}'
+        })
+        if self._turn_actions:
+            line = f"- {function_name}: {action_json} -> {status_json}"
+            self._turn_actions[-1].append(line[:_SUMMARY_LINE_CHARS])
+
+    def render(self) -> List[Message]:
+        """
+        Build the prompt for the next request.
+
+        Returns:
+            Messages to send; the conversation itself when nothing is folded,
+            so it must not be modified
+
+        Raises:
+            ContextBudgetExceeded: If the prefix and the current turn alone
+                exceed max_tokens
+        """
+        if self.max_turns is not None:
+            self._fold(self.turn_count - self.max_turns)
+        tokens = self._estimate()
+
+        if self.max_tokens is not None:
+            while tokens > self.max_tokens and self._turn_start < self.turn_count - 1:
+                self._fold(self._turn_start + 1)
+                tokens = self._estimate()
+            while tokens > self.max_tokens and self._summary_lines:
+                self._summary_lines.pop(0)
+                self._omitted_summary_lines += 1
+                tokens = self._estimate()
+
+        messages = self._assemble()
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            messages = self._truncate_state(messages, tokens)
+            tokens = sum(self._message_tokens(message) for message in messages)
+            if tokens > self.max_tokens:
+                raise ContextBudgetExceeded(
+                    f"Prompt needs an estimated {tokens} tokens, more than the "
+                    f"ceiling of {self.max_tokens}"
+                )
+
+        self.step_stats.append({
+            "step": self.turn_count,
+            "messages": len(messages),
+            "estimated_prompt_tokens": tokens,
+            "folded_turns": self._turn_start,
+            "folded_actions": self._folded_actions,
+        })
+        return messages
+
+    def render_again(self) -> List[Message]:
+        """
+        Build the prompt again after replace changed the current turn, in
+        place of the last prompt, whose stats are dropped.
+
+        Returns:
+            Messages to send, see render
+        """
+        if self.step_stats:
+            self.step_stats.pop()
+        return self.render()
+
+    def record_usage(
+        self,
+        usage: Dict[str, int],
+        prompt: Optional[int] = None
+    ) -> None:
+        """
+        Add the provider's token usage to the stats of a prompt.
+
+        Args:
+            usage: Token usage reported for the prompt's completion
+            prompt: Index of the prompt in step_stats, None for the last one;
+                usage of a streamed completion can arrive after the next
+                prompt has been rendered
+        """
+        if prompt is None:
+            prompt = len(self.step_stats) - 1
+        if 0 <= prompt < len(self.step_stats) and (
+            usage.get("prompt_tokens") is not None
+        ):
+            self.step_stats[prompt]["prompt_tokens"] = usage["prompt_tokens"]
+
+    def prompt_token_counts(self) -> List[int]:
+        """Prompt tokens per step, actual where reported, otherwise estimated."""
+        return [
+            stats.get("prompt_tokens", stats["estimated_prompt_tokens"])
+            for stats in self.step_stats
+        ]
+
+    def _add(self, message: Message) -> None:
+        self._messages.append(message)
+        self._cumulative_tokens.append(
+            self._cumulative_tokens[-1] + self._message_tokens(message)
+        )
+
+    def _fold(self, turn_end: int) -> None:
+        turn_end = min(turn_end, self.turn_count - 1)
+        for actions in self._turn_actions[self._turn_start:turn_end]:
+            self._summary_lines.extend(actions)
+            self._folded_actions += len(actions)
+        self._turn_start = max(self._turn_start, turn_end)
+        while (
+            len(self._summary_lines) > 1
+            and sum(len(line) + 1 for line in self._summary_lines)
+            > self.summary_max_chars
+        ):
+            self._summary_lines.pop(0)
+            self._omitted_summary_lines += 1
+
+    def _summary(self) -> Optional[Message]:
+        if not self._summary_lines and not self._omitted_summary_lines:
+            return None
+        summary = (
+            f"Summary of the {self._folded_actions} earlier actions; states "
+            "before the recent steps are omitted:"
+        )
+        if self._omitted_summary_lines:
+            summary += f"\n({self._omitted_summary_lines} oldest not listed)"
+        summary += "\n" + "\n".join(self._summary_lines)
+        return {"role": "system", "content": summary}
+
+    def _prefix_end(self) -> int:
+        return self._turn_offsets[0] if self._turn_offsets else len(self._messages)
+
+    def _window_start(self) -> int:
+        if not self._turn_offsets:
+            return len(self._messages)
+        return self._turn_offsets[self._turn_start]
+
+    def _assemble(self) -> List[Message]:
+        summary = self._summary()
+        if self._turn_start == 0 and summary is None:
+            return self._messages
+        messages = self.prefix
+        if summary is not None:
+            messages.append(summary)
+        messages.extend(self._messages[self._window_start():])
+        return messages
+
+    def _estimate(self) -> int:
+        # Prefix, summary and window, from the running totals
+        tokens = self._cumulative_tokens[self._prefix_end()]
+        tokens += self._cumulative_tokens[-1] - self._cumulative_tokens[
+            self._window_start()
+        ]
+        summary = self._summary()
+        if summary is not None:
+            tokens += self._message_tokens(summary)
+        return tokens
+
+    def _truncate_state(self, messages: List[Message], tokens: int) -> List[Message]:
+        # Shorten the longest message of the current turn, normally its state
+        if not self._turn_offsets:
+            return messages
+        current_turn = self._messages[self._turn_offsets[-1]:]
+        if not current_turn:
+            return messages
+        longest = max(current_turn, key=lambda message: len(message["content"]))
+        excess_chars = (tokens - self.max_tokens) * CHARS_PER_TOKEN + len(_TRUNCATED)
+        keep = max(len(longest["content"]) - excess_chars, 0)
+        shortened = dict(longest, content=longest["content"][:keep] + _TRUNCATED)
+        return [shortened if message is longest else message for message in messages]
+
+    @staticmethod
+    def _message_tokens(message: Message) -> int:
+        return estimate_tokens(message["content"]) + _MESSAGE_TOKENS
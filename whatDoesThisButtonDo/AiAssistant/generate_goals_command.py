@@ -0,0 +1,108 @@
+import json
+from typing import Any, Dict, List
+from .openai_client import OpenAIClient
+
+
+class GenerateGoalsCommand:
+    """
+    Asks the model for the test goals of one sandbox in a single request.
+    """
+
+    def __init__(
+        self,
+        openai_client: OpenAIClient,
+        sandbox_description: str,
+        max_goals: int
+    ):
+        """
+        Args:
+            openai_client: Conversation holding the test oracles
+            sandbox_description: Requirements and testability functions of
+                the sandbox
+            max_goals: Most goals to propose
+        """
+        self.openai_client = openai_client
+        self.sandbox_description = sandbox_description
+        self.max_goals = max_goals
+
+    def execute(self) -> List[Dict[str, str]]:
+        """
+        Execute the command and return the proposed goals
+
+        Returns:
+            list: Goals with 'title' and 'description', at most max_goals
+        """
+        self._create_messages()
+        response = self.openai_client.create_chat_completion(
+            function_schema=[self._function_schema()]
+        )
+        return self._parse_response(response)
+
+    async def execute_async(self) -> List[Dict[str, str]]:
+        """
+        Asyncio counterpart of execute
+
+        Returns:
+            list: Goals with 'title' and 'description', at most max_goals
+        """
+        self._create_messages()
+        response = await self.openai_client.create_chat_completion_async(
+            function_schema=[self._function_schema()]
+        )
+        return self._parse_response(response)
+
+    def _parse_response(self, response: Dict[str, Any]) -> List[Dict[str, str]]:
+        try:
+            goals = json.loads(response['arguments'])["goals"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            error_msg = f"Failed to parse proposed goals: {response}"
+            raise ValueError(error_msg) from e
+        return [
+            {"title": goal["title"], "description": goal.get("description", "")}
+            for goal in goals
+            if isinstance(goal, dict) and goal.get("title")
+        ][:self.max_goals]
+
+    def _function_schema(self):
+        return {
+            "name": "propose_goals",
+            "description": "Propose the goals of exploratory tests of the sandbox",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "goals": {
+                        "type": "array",
+                        "maxItems": self.max_goals,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "title": {
+                                    "type": "string",
+                                    "description": "Short name of the goal"
+                                },
+                                "description": {
+                                    "type": "string",
+                                    "description": (
+                                        "What the test must verify, in terms of "
+                                        "the requirements"
+                                    )
+                                }
+                            },
+                            "required": ["title", "description"]
+                        }
+                    }
+                },
+                "required": ["goals"]
+            }
+        }
+
+    def _create_messages(self):
+        message = (
+            "Propose up to "
+            f"{self.max_goals} distinct goals for exploratory tests of the "
+            "sandbox described below. Each goal should check one requirement "
+            "from the test oracles that the sandbox's actions can reach. "
+            "Prefer goals that exercise different actions and outcomes.\n\n"
+            f"# Sandbox\n{self.sandbox_description}\n"
+        )
+        self.openai_client.append_message("user", message)
@@ -1,5 +1,7 @@
 import json
 from typing import Dict, Any
+from .. import tracing
+from ..token_estimate import estimate_tokens
 from .openai_client import OpenAIClient
 
 class GetNextActionCommand:
@@ -7,13 +9,15 @@ class GetNextActionCommand:
         self,
         openai_client: OpenAIClient,
         possible_actions: Dict[str, Dict[str, Any]],
-        action_history=None,
-        sut_state=None
+        sut_state=None,
+        state_tracker=None,
+        max_plan_steps=None
     ):
         self.openai_client = openai_client
         self.possible_actions = possible_actions
         self.sut_state = sut_state
-        self.action_history = action_history or []
+        self.state_tracker = state_tracker
+        self.max_plan_steps = max_plan_steps
     
     def execute(self):
         """
@@ -22,9 +26,110 @@ class GetNextActionCommand:
         Returns:
             tuple: (function_name, dict with action details)
         """
-        self._create_messages(self.possible_actions, self.sut_state)
+        self._build_prompt()
         
-        function_schemas = [{
+        response = self.openai_client.create_chat_completion(
+            function_schema=self._function_schemas()
+        )
+        return self._parse_response(response)
+
+    async def execute_async(self):
+        """
+        Asyncio counterpart of execute
+        
+        Returns:
+            tuple: (function_name, dict with action details)
+        """
+        self._build_prompt()
+        
+        response = await self.openai_client.create_chat_completion_async(
+            function_schema=self._function_schemas()
+        )
+        return self._parse_response(response)
+
+    @staticmethod
+    def _parse_response(response):
+        try:
+            return (
+                response['name'],
+                json.loads(response['arguments'])
+            )
+        except json.JSONDecodeError as e:
+            error_msg = f"Failed to parse AI response as JSON: {response['arguments']}"
+            raise ValueError(error_msg) from e
+
+    def _function_schemas(self):
+        schemas = self._step_schemas()
+        if self.max_plan_steps:
+            schemas.append(self._plan_schema())
+        return schemas
+
+    def _plan_schema(self):
+        return {
+            "name": "submit_plan",
+            "description": (
+                "Submit an ordered plan of actions and assertions that is run "
+                "without asking you again, until an expectation fails, new "
+                "actions become available or the plan is done"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "steps": {
+                        "type": "array",
+                        "maxItems": self.max_plan_steps,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "tool_call": {
+                                    "type": "string",
+                                    "enum": [
+                                        "select_next_action",
+                                        "assertion_for_regression"
+                                    ],
+                                    "description": "The kind of step"
+                                },
+                                "action": {
+                                    "type": "string",
+                                    "description": (
+                                        "The action to take, or assert_state"
+                                    )
+                                },
+                                "parameters": {
+                                    "type": "object",
+                                    "description": (
+                                        "Parameters of the action or assertion"
+                                    )
+                                },
+                                "purpose": {
+                                    "type": "string",
+                                    "description": "Why this step is taken"
+                                },
+                                "expect": {
+                                    "type": "object",
+                                    "description": (
+                                        "Condition the state must meet after "
+                                        "an action, with the same path, "
+                                        "condition and value as assert_state"
+                                    ),
+                                    "properties": {
+                                        "path": {"type": "string"},
+                                        "condition": {"type": "string"},
+                                        "value": {"type": "string"}
+                                    },
+                                    "required": ["path", "condition", "value"]
+                                }
+                            },
+                            "required": ["tool_call", "action", "parameters"]
+                        }
+                    }
+                },
+                "required": ["steps"]
+            }
+        }
+
+    def _step_schemas(self):
+        return [{
             "name": "select_next_action",
             "description": "Select the next action to take from the available options",
             "parameters": {
@@ -114,33 +219,45 @@ class GetNextActionCommand:
                 "required": ["result", "conclusion"]
             }
         }]
-        
-        response = self.openai_client.create_chat_completion(
-            function_schema=function_schemas,
-            action_history=self.action_history
-        )
-        
-        try:
-            return (
-                response['name'],
-                json.loads(response['arguments'])
-            )
-        except json.JSONDecodeError as e:
-            error_msg = f"Failed to parse AI response as JSON: {response['arguments']}"
-            raise ValueError(error_msg) from e
     
+    def _build_prompt(self):
+        with tracing.span("prompt.build") as span:
+            first_new = len(self.openai_client.messages)
+            self._create_messages(self.possible_actions, self.sut_state)
+            if span.recording:
+                new_messages = self.openai_client.messages[first_new:]
+                span.set(
+                    actions=len(self.possible_actions),
+                    messages=len(self.openai_client.messages),
+                    new_messages=len(new_messages),
+                    new_bytes=sum(len(m["content"]) for m in new_messages),
+                    estimated_new_tokens=sum(
+                        estimate_tokens(m["content"]) for m in new_messages
+                    )
+                )
+
     def _create_messages(self, possible_actions, sut_state):
+        self.openai_client.begin_turn()
         actions_description = "\n".join(
             f"- {action_name}: {action_info['description']}" 
             for action_name, action_info in possible_actions.items()
         ) or "No actions available in current state"
         
         if sut_state:
-            self.openai_client.append_message(
-                "system",
-                f"Current system state:\n{json.dumps(sut_state, indent=2)}"
-            )
+            self.openai_client.append_state(sut_state, self.state_tracker)
         
+        options = "3. End the test using test_done.\n\n"
+        calls_rule = "Make only one function call at a time."
+        if self.max_plan_steps:
+            options = (
+                "3. Plan the next steps using submit_plan (see below).\n"
+                "4. End the test using test_done.\n\n"
+            )
+            calls_rule = (
+                "Make only one function call at a time; to take several steps,\n"
+                "make that call submit_plan."
+            )
+
         message = (
     "At this state in the test, you have:\n"
     f"# Available Actions:\n{actions_description}\n\n"
@@ -163,8 +280,8 @@ class GetNextActionCommand:
     "1. Make assertions about the current state using assertion_for_regression.\n"
     "2. Choose the next action using select_next_action (ONLY from the Available\n"
     "   Actions list above).\n"
-    "3. End the test using test_done.\n\n"
-    "Important: Make only one function call at a time. The next action MUST be chosen\n"
+    f"{options}"
+    f"Important: {calls_rule} The next action MUST be chosen\n"
     "from the Available Actions list above - if no actions are available, you can\n"
     "only make assertions or call test_done. Add assertions only when they provide\n"
     "meaningful validation of critical application state - avoid assertions that are\n"
@@ -173,6 +290,17 @@ class GetNextActionCommand:
     "test goal is achieved, or if there are no possible actions available.\n"
 )
 
+        if self.max_plan_steps:
+            message += (
+                "\nWhen the next steps are predictable, call submit_plan instead "
+                "of a single action or assertion, with up to "
+                f"{self.max_plan_steps} actions and assertions in order; the "
+                "plan counts as your one call. Give each action an 'expect' "
+                "condition on the state it should lead to. You are asked again "
+                "when an expectation fails, new actions become available or "
+                "the plan is done.\n"
+            )
+
         self.openai_client.append_message("user", message)
         return []
     
\ No newline at end of file
@@ -0,0 +1,480 @@
+import asyncio
+import inspect
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .openai_transport import OpenAITransport
+
+
+@dataclass
+class LLMCompletion:
+    """A chat completion, independent of the backend that produced it"""
+    content: Optional[str] = None
+    # Each tool call is a dictionary with 'name' and JSON 'arguments'
+    tool_calls: List[Dict[str, str]] = field(default_factory=list)
+    usage: Dict[str, int] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_openai(
+        cls,
+        response: Any,
+        headers: Optional[Dict[str, str]] = None
+    ) -> 'LLMCompletion':
+        """
+        Convert an OpenAI SDK ChatCompletion.
+
+        Args:
+            response: The parsed ChatCompletion
+            headers: HTTP response headers, e.g. rate limit information
+        """
+        message = response.choices[0].message
+        usage = {}
+        if getattr(response, "usage", None) is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+        return cls(
+            content=message.content,
+            tool_calls=[
+                {
+                    'name': tool_call.function.name,
+                    'arguments': tool_call.function.arguments
+                }
+                for tool_call in message.tool_calls or []
+            ],
+            usage=usage,
+            headers={k.lower(): v for k, v in (headers or {}).items()},
+        )
+
+
+class _JSONObjectScanner:
+    """Tracks bracket depth over streamed JSON text to spot its end."""
+
+    __slots__ = ("depth", "in_string", "escaped", "started", "complete")
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.complete = False
+
+    def feed(self, text: str) -> bool:
+        for char in text:
+            if self.complete:
+                break
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            elif char in "}]":
+                self.depth -= 1
+                self.complete = self.started and self.depth == 0
+        return self.complete
+
+
+class ToolCallAssembler:
+    """
+    Assembles a streamed chat completion from its deltas.
+
+    A tool call is complete as soon as its arguments form a whole JSON value,
+    which is usually before the stream has finished.
+    """
+
+    def __init__(self):
+        self.content_parts: List[str] = []
+        self.tool_calls: List[Dict[str, str]] = []
+        self._scanners: List[_JSONObjectScanner] = []
+
+    def add_content(self, text: str) -> None:
+        self.content_parts.append(text)
+
+    def add_tool_call_delta(
+        self,
+        index: int,
+        name: Optional[str] = None,
+        arguments: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """
+        Add a tool call delta.
+
+        Args:
+            index: Index of the tool call in the message
+            name: Function name, sent in the first delta of a tool call
+            arguments: Next fragment of the JSON arguments
+
+        Returns:
+            The tool call if this delta completed it, otherwise None
+        """
+        while len(self.tool_calls) <= index:
+            self.tool_calls.append({'name': "", 'arguments': ""})
+            self._scanners.append(_JSONObjectScanner())
+        tool_call = self.tool_calls[index]
+        scanner = self._scanners[index]
+        if name:
+            tool_call['name'] += name
+        if not arguments:
+            return None
+        was_complete = scanner.complete
+        tool_call['arguments'] += arguments
+        if was_complete or not scanner.feed(arguments) or not tool_call['name']:
+            return None
+        try:
+            json.loads(tool_call['arguments'])
+        except ValueError:
+            # Leave malformed arguments to the caller once the stream ends
+            return None
+        return dict(tool_call)
+
+    def completion(
+        self,
+        usage: Optional[Dict[str, int]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> LLMCompletion:
+        """The completion assembled from all deltas so far."""
+        return LLMCompletion(
+            content="".join(self.content_parts) if self.content_parts else None,
+            tool_calls=[dict(tool_call) for tool_call in self.tool_calls],
+            usage=usage or {},
+            headers=headers or {},
+        )
+
+
+class StreamedCompletion:
+    """
+    A chat completion that is still being streamed.
+
+    early() returns as soon as the first tool call is complete, so it can be
+    dispatched while the rest of the stream is drained in the background;
+    result() waits for the whole completion.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.dispatched_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._early: Optional[LLMCompletion] = None
+        self._final: Optional[LLMCompletion] = None
+        self._error: Optional[BaseException] = None
+        self._dispatched = threading.Event()
+        self._finished = threading.Event()
+        # Keeps the asyncio drain task alive
+        self._task: Optional["asyncio.Task"] = None
+        self._callbacks: List[Callable[..., None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def is_dispatched(self) -> bool:
+        return self._dispatched.is_set()
+
+    def dispatch(self, completion: LLMCompletion) -> None:
+        """Make a completion with the first complete tool call available."""
+        if not self._dispatched.is_set():
+            self._early = completion
+            self.dispatched_at = time.monotonic()
+            self._dispatched.set()
+
+    def finish(
+        self,
+        completion: Optional[LLMCompletion] = None,
+        error: Optional[BaseException] = None
+    ) -> None:
+        """Record the end of the stream, with the whole completion or an error."""
+        self._final = completion
+        self._error = error
+        self.finished_at = time.monotonic()
+        if self.dispatched_at is None:
+            self.dispatched_at = self.finished_at
+        with self._callbacks_lock:
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        self._dispatched.set()
+        for callback in callbacks:
+            callback(completion, error)
+
+    def add_done_callback(
+        self,
+        callback: Callable[[Optional[LLMCompletion], Optional[BaseException]], None]
+    ) -> None:
+        """
+        Call a function with the whole completion, or the error, once the
+        stream has finished. It runs on the thread or task draining the
+        stream, or right away if the stream has already finished.
+        """
+        with self._callbacks_lock:
+            if not self._finished.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self._final, self._error)
+
+    def early(self, timeout: Optional[float] = None) -> LLMCompletion:
+        """
+        Wait for the first complete tool call, or the end of the stream if
+        there is none.
+
+        Raises:
+            TimeoutError: If nothing arrived in time
+        """
+        if not self._dispatched.wait(timeout):
+            raise TimeoutError("No complete tool call was streamed in time")
+        if self._early is not None:
+            return self._early
+        return self.result()
+
+    def result(self, timeout: Optional[float] = None) -> LLMCompletion:
+        """
+        Wait for the whole completion.
+
+        Raises:
+            TimeoutError: If the stream did not finish in time
+        """
+        if not self._finished.wait(timeout):
+            raise TimeoutError("Streamed completion did not finish in time")
+        if self._error is not None:
+            raise self._error
+        return self._final
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """
+        Get the seconds from the request to dispatch and to the end of the
+        stream, and the tail between the two that overlaps the action.
+        """
+        def since_start(moment):
+            return None if moment is None else moment - self.started_at
+
+        tail = None
+        if self.finished_at is not None and self.dispatched_at is not None:
+            tail = self.finished_at - self.dispatched_at
+        return {
+            "dispatch_seconds": since_start(self.dispatched_at),
+            "total_seconds": since_start(self.finished_at),
+            "overlapped_tail_seconds": tail,
+        }
+
+
+class LLMBackend(ABC):
+    """
+    A chat-completions capable model provider.
+
+    Requests are the keyword arguments of OpenAI's chat.completions.create:
+    model, messages and optionally tools and tool_choice. Backends must be
+    safe to share between conversations and threads.
+    """
+
+    @abstractmethod
+    def complete(self, request: Dict[str, Any]) -> LLMCompletion:
+        """
+        Create a chat completion.
+
+        Args:
+            request: Chat completion request
+
+        Returns:
+            The completion
+        """
+        pass
+
+    @abstractmethod
+    async def complete_async(self, request: Dict[str, Any]) -> LLMCompletion:
+        """Asyncio counterpart of complete"""
+        pass
+
+    def stream(self, request: Dict[str, Any]) -> StreamedCompletion:
+        """
+        Create a chat completion, returning before it has been fully received
+        if the backend supports streaming. Backends that don't stream return
+        a finished StreamedCompletion.
+
+        Args:
+            request: Chat completion request
+        """
+        streamed = StreamedCompletion()
+        streamed.finish(self.complete(request))
+        return streamed
+
+    async def stream_async(self, request: Dict[str, Any]) -> StreamedCompletion:
+        """
+        Asyncio counterpart of stream. Returns once early() will not block.
+        """
+        streamed = StreamedCompletion()
+        streamed.finish(await self.complete_async(request))
+        return streamed
+
+    def stats(self) -> Dict[str, Any]:
+        """Get backend specific metrics."""
+        return {}
+
+    def close(self) -> None:
+        """Release connections held by the backend."""
+
+    async def aclose_loop(self) -> None:
+        """Release connections bound to the running event loop; call it
+        before the loop ends."""
+
+
+async def _parse(raw_response) -> Any:
+    # parse() of async raw responses is a coroutine in most SDK versions
+    parsed = raw_response.parse()
+    if inspect.isawaitable(parsed):
+        parsed = await parsed
+    return parsed
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Backend for the OpenAI API, or any server speaking its chat-completions
+    protocol when given a base URL.
+    """
+
+    def __init__(self, transport: OpenAITransport):
+        """
+        Args:
+            transport: Pooled transport to send requests through
+        """
+        self.transport = transport
+
+    @classmethod
+    def create(
+        cls,
+        api_key: str,
+        base_url: Optional[str] = None,
+        **transport_options
+    ) -> 'OpenAIBackend':
+        """
+        Create a backend with its own transport.
+
+        Args:
+            api_key: OpenAI API key
+            base_url: API base URL, None for the OpenAI default
+            **transport_options: Passed to OpenAITransport
+        """
+        return cls(OpenAITransport(api_key, base_url=base_url, **transport_options))
+
+    def complete(self, request: Dict[str, Any]) -> LLMCompletion:
+        raw = self.transport.client.chat.completions.with_raw_response.create(
+            **request
+        )
+        return LLMCompletion.from_openai(raw.parse(), dict(raw.headers))
+
+    async def complete_async(self, request: Dict[str, Any]) -> LLMCompletion:
+        client = self.transport.async_client
+        raw = await client.chat.completions.with_raw_response.create(**request)
+        return LLMCompletion.from_openai(await _parse(raw), dict(raw.headers))
+
+    def stream(self, request: Dict[str, Any]) -> StreamedCompletion:
+        """
+        Stream a chat completion. The rest of the stream is drained on a
+        background thread once the first tool call has been dispatched.
+        """
+        raw = self.transport.client.chat.completions.with_raw_response.create(
+            **request, **self._stream_options()
+        )
+        streamed = StreamedCompletion()
+        chunks = raw.parse()
+        headers = {k.lower(): v for k, v in raw.headers.items()}
+        threading.Thread(
+            target=self._drain,
+            args=(chunks, streamed, headers),
+            name="llm-stream",
+            daemon=True,
+        ).start()
+        return streamed
+
+    async def stream_async(self, request: Dict[str, Any]) -> StreamedCompletion:
+        """
+        Asyncio counterpart of stream. The rest of the stream is drained by a
+        task once the first tool call has been dispatched.
+        """
+        client = self.transport.async_client
+        raw = await client.chat.completions.with_raw_response.create(
+            **request, **self._stream_options()
+        )
+        streamed = StreamedCompletion()
+        chunks = (await _parse(raw)).__aiter__()
+        headers = {k.lower(): v for k, v in raw.headers.items()}
+        assembler = ToolCallAssembler()
+        usage: Dict[str, int] = {}
+
+        async def drain():
+            try:
+                async for chunk in chunks:
+                    self._feed(chunk, assembler, usage, streamed, headers)
+            except Exception as e:
+                streamed.finish(error=e)
+            else:
+                streamed.finish(assembler.completion(usage, headers))
+
+        try:
+            while not streamed.is_dispatched:
+                chunk = await chunks.__anext__()
+                self._feed(chunk, assembler, usage, streamed, headers)
+        except StopAsyncIteration:
+            streamed.finish(assembler.completion(usage, headers))
+            return streamed
+        streamed._task = asyncio.get_running_loop().create_task(drain())
+        return streamed
+
+    @staticmethod
+    def _stream_options() -> Dict[str, Any]:
+        return {"stream": True, "stream_options": {"include_usage": True}}
+
+    @classmethod
+    def _drain(cls, chunks, streamed: StreamedCompletion, headers) -> None:
+        assembler = ToolCallAssembler()
+        usage: Dict[str, int] = {}
+        try:
+            for chunk in chunks:
+                cls._feed(chunk, assembler, usage, streamed, headers)
+        except Exception as e:
+            streamed.finish(error=e)
+        else:
+            streamed.finish(assembler.completion(usage, headers))
+
+    @staticmethod
+    def _feed(chunk, assembler, usage, streamed, headers) -> None:
+        if getattr(chunk, "usage", None) is not None:
+            usage.update(
+                prompt_tokens=chunk.usage.prompt_tokens,
+                completion_tokens=chunk.usage.completion_tokens,
+                total_tokens=chunk.usage.total_tokens,
+            )
+        for choice in chunk.choices:
+            delta = choice.delta
+            if delta.content:
+                assembler.add_content(delta.content)
+            for tool_call in delta.tool_calls or []:
+                function = tool_call.function
+                complete = assembler.add_tool_call_delta(
+                    tool_call.index,
+                    function.name if function else None,
+                    function.arguments if function else None,
+                )
+                if complete is not None and not streamed.is_dispatched:
+                    streamed.dispatch(
+                        LLMCompletion(tool_calls=[complete], headers=headers)
+                    )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the connection reuse metrics of the transport."""
+        return self.transport.stats()
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose_loop(self) -> None:
+        await self.transport.aclose_loop()
@@ -1,87 +1,267 @@
-from openai import OpenAI
+import json
+from typing import Dict, List, Optional
+from .. import tracing
 from ..test_oracles import TestOracles
+from ..token_estimate import estimate_tokens
+from .conversation_context import ConversationContext
+from .llm_backend import (
+    LLMBackend, LLMCompletion, OpenAIBackend, StreamedCompletion
+)
+from .response_cache import ResponseCache
 
 class OpenAIClient:
-    def __init__(self, test_oracles: TestOracles, api_key: str, model: str):
-        if not api_key:
-            raise ValueError("API key cannot be empty")
-        self.client = OpenAI(api_key=api_key)
+    """
+    One conversation with the model. It keeps its own message list and sends
+    requests through an LLMBackend, which may be shared with other
+    conversations.
+    """
+
+    def __init__(
+        self,
+        test_oracles: TestOracles,
+        api_key: str,
+        model: str,
+        backend: Optional[LLMBackend] = None,
+        response_cache: Optional[ResponseCache] = None,
+        stream: bool = False,
+        context: Optional[ConversationContext] = None
+    ):
+        """
+        Args:
+            test_oracles: Test oracles sent at the start of the conversation
+            api_key: OpenAI API key, used if no backend is given
+            model: Model name
+            backend: LLMBackend to send requests through
+            response_cache: Record/replay cache of responses
+            stream: Stream responses and return as soon as the first tool call
+                is complete, while the rest of the stream is received in the
+                background
+            context: Keeps the messages and builds each prompt, bounding its
+                size if configured; defaults to an unbounded context
+        """
+        if backend is None:
+            backend = OpenAIBackend.create(api_key)
+        self.api_key = api_key
+        self.backend = backend
+        self.response_cache = response_cache
+        self.stream = stream
+        self.streams: List[StreamedCompletion] = []
         self.model = model
-        self.messages = [{
-            "role": "system",
-            "content": (
-                "You are an expert in testing software applications. "
-                "You are given a list of test oracles to help you "
-                "understand the system under test and the expected testing rules. "
-                "There will also be requirements the system must meet. "
-            )
-        }]
+        self.context = context or ConversationContext()
+        # Tracker and index of the current turn's state message
+        self._state_tracker = None
+        self._state_index: Optional[int] = None
+        self.append_message("system", (
+            "You are an expert in testing software applications. "
+            "You are given a list of test oracles to help you "
+            "understand the system under test and the expected testing rules. "
+            "There will also be requirements the system must meet. "
+        ))
         # Add test oracles message
         self.append_message("assistant", test_oracles.as_assistant_message())
 
+    def stream_timings(self) -> List[Dict[str, Optional[float]]]:
+        """Dispatch and total latency of each streamed completion."""
+        return [streamed.timings() for streamed in self.streams]
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """Every message of the conversation, including folded ones"""
+        return self.context.messages
+
+    def prompt_token_counts(self) -> List[int]:
+        """Prompt tokens of each request, estimated where not reported."""
+        return self.context.prompt_token_counts()
+
+    def begin_turn(self):
+        """Start the messages of a new step in the conversation"""
+        self.context.begin_turn()
+        self._state_tracker = None
+        self._state_index = None
+
     def append_message(self, role: str, content: str):
         """Add a new message to the conversation history"""
-        self.messages.append({"role": role, "content": content})
+        self.context.append(role, content)
+
+    def state_message(self, sut_state, state_tracker=None) -> str:
+        """
+        Render the system state for the current turn.
+
+        Args:
+            sut_state: Current state of the system under test
+            state_tracker: StateDeltaTracker of this conversation, None to
+                always send the full state
+
+        Returns:
+            The message content
+        """
+        if state_tracker is None:
+            return f"Current system state:\n{json.dumps(sut_state, indent=2)}"
+        return state_tracker.message(
+            sut_state,
+            turn=self.context.turn_count - 1,
+            first_turn_sent=self.context.first_full_turn
+        )
+
+    def append_state(self, sut_state, state_tracker=None):
+        """
+        Add the system state message of the current turn, see state_message.
+        If the token ceiling folds away the last full state while the prompt
+        is built, the message is replaced with the full state.
+        """
+        self._state_tracker = state_tracker
+        self._state_index = len(self.context.messages)
+        self.append_message("system", self.state_message(sut_state, state_tracker))
+
+    def record_action(self, function_name: str, action, status):
+        """Add the result of an executed action to the conversation history"""
+        self.context.record_action(function_name, action, status)
 
     def create_chat_completion(
         self, 
-        function_schema: list = None,
-        action_history: list = None
+        function_schema: list = None
     ) -> dict:
         """
         Create a chat completion using the OpenAI API with function calling
 
         Args:
             function_schema: Optional function definition for tool calling
-            action_history: List of previous actions and their results
 
         Returns:
             dict: The tool call arguments as a JSON string
 
         Raises:
             Exception: If there's an error creating chat completion
+            ResponseCacheMiss: If the response cache is replay-only and has no
+                response recorded for this request
         """
-        chat_messages = self.messages.copy()
+        kwargs = self._build_request(function_schema)
+        if self.response_cache is None:
+            return self._complete(kwargs, function_schema)
+        return self.response_cache.lookup(
+            kwargs, lambda: self._complete(kwargs, function_schema)
+        )
+
+    def _complete(self, kwargs: dict, function_schema: list):
+        try:
+            with self._request_span(kwargs) as span:
+                if self.stream:
+                    streamed = self.backend.stream(kwargs)
+                    self.streams.append(streamed)
+                    self._record_when_drained(streamed, span)
+                    completion = streamed.early()
+                else:
+                    completion = self.backend.complete(kwargs)
+                    self.context.record_usage(completion.usage)
+                    self._record_response(span, completion)
+            return self._parse_response(completion, function_schema)
+        except Exception as e:
+            raise Exception(f"Error creating chat completion: {str(e)}") from e
+
+    async def create_chat_completion_async(
+        self, 
+        function_schema: list = None
+    ) -> dict:
+        """
+        Asyncio counterpart of create_chat_completion
+        """
+        kwargs = self._build_request(function_schema)
+        if self.response_cache is None:
+            return await self._complete_async(kwargs, function_schema)
+        return await self.response_cache.lookup_async(
+            kwargs, lambda: self._complete_async(kwargs, function_schema)
+        )
+
+    async def _complete_async(self, kwargs: dict, function_schema: list):
+        try:
+            with self._request_span(kwargs) as span:
+                if self.stream:
+                    streamed = await self.backend.stream_async(kwargs)
+                    self.streams.append(streamed)
+                    self._record_when_drained(streamed, span)
+                    completion = streamed.early()
+                else:
+                    completion = await self.backend.complete_async(kwargs)
+                    self.context.record_usage(completion.usage)
+                    self._record_response(span, completion)
+            return self._parse_response(completion, function_schema)
+        except Exception as e:
+            raise Exception(f"Error creating chat completion: {str(e)}") from e
+
+    def _request_span(self, kwargs: dict):
+        span = tracing.span("llm.request")
+        if span.recording:
+            span.set(
+                model=self.model,
+                stream=self.stream,
+                messages=len(kwargs["messages"]),
+                request_bytes=tracing.payload_size(kwargs),
+                estimated_prompt_tokens=sum(
+                    estimate_tokens(message["content"])
+                    for message in kwargs["messages"]
+                )
+            )
+        return span
+
+    def _record_when_drained(self, streamed: StreamedCompletion, span) -> None:
+        # The usage of a stream arrives with its last chunk, after the first
+        # tool call has been dispatched and maybe after the next prompt
+        prompt = len(self.context.step_stats) - 1
+        span.keep_open()
+
+        def drained(completion, error):
+            if completion is not None:
+                self.context.record_usage(completion.usage, prompt)
+                self._record_response(span, completion)
+            else:
+                span.set(error=type(error).__name__)
+            span.set(**streamed.timings())
+            span.finish()
+
+        streamed.add_done_callback(drained)
+
+    @staticmethod
+    def _record_response(span, completion: LLMCompletion) -> None:
+        if span.recording:
+            span.set(
+                response_bytes=len(completion.content or "") + sum(
+                    len(call.get("arguments", "")) for call in completion.tool_calls
+                ),
+                **completion.usage
+            )
+
+    def _build_request(self, function_schema: list) -> dict:
+        # The conversation, bounded by the context's window and token ceiling
+        chat_messages = self.context.render()
+        tracker = self._state_tracker
+        if tracker is not None and tracker.needs_resync(
+            self.context.first_full_turn
+        ):
+            # The delta's base state was folded
+            self.context.replace(self._state_index, tracker.resync())
+            chat_messages = self.context.render_again()
         
-        # Add function messages for action history
-        if action_history:
-            for entry in action_history:
-                chat_messages.append({
-                    "role": "function",
-                    "name": entry["function_name"],
-                    "content": str({
-                        "action": entry["action"],
-                        "status": entry["status"]
-                    })
-                })
+        kwargs = {
+            "model": self.model,
+            "messages": chat_messages,
+        }
         
-        try:
-            kwargs = {
-                "model": self.model,
-                "messages": chat_messages,
-            }
-            
-            if function_schema:
-                kwargs["tools"] = [
-                    {"type": "function", "function": schema}
-                    for schema in function_schema
-                ]
-                if len(function_schema) == 1:
-                    tool_choice = {
-                        "type": "function",
-                        "function": {"name": function_schema[0]["name"]}
-                    }
-                    kwargs["tool_choice"] = tool_choice
-                
-            response = self.client.chat.completions.create(**kwargs)
-            
-            if function_schema and response.choices[0].message.tool_calls:
-                tool_call = response.choices[0].message.tool_calls[0]
-                return {
-                    'name': tool_call.function.name,
-                    'arguments': tool_call.function.arguments
+        if function_schema:
+            kwargs["tools"] = [
+                {"type": "function", "function": schema}
+                for schema in function_schema
+            ]
+            if len(function_schema) == 1:
+                tool_choice = {
+                    "type": "function",
+                    "function": {"name": function_schema[0]["name"]}
                 }
-                
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            raise Exception(f"Error creating chat completion: {str(e)}") 
\ No newline at end of file
+                kwargs["tool_choice"] = tool_choice
+        return kwargs
+
+    @staticmethod
+    def _parse_response(completion: LLMCompletion, function_schema: list):
+        if function_schema and completion.tool_calls:
+            return dict(completion.tool_calls[0])
+            
+        return (completion.content or "").strip()
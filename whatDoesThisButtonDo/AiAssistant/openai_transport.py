@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+from openai import (
+    AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+)
+
+# The HTTP library of the installed SDK, which is httpx or one of its forks
+# depending on the SDK version, so it is not imported by name
+http = importlib.import_module(
+    DefaultHttpxClient.__mro__[1].__module__.split(".")[0]
+)
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+
+class OpenAITransport:
+    """
+    Pooled HTTP transport to the OpenAI API, shared by all conversations.
+
+    The sync client and the asyncio client of each event loop keep one
+    keep-alive connection pool, so connections and TLS sessions are reused
+    across execution threads instead of being set up again for every
+    conversation. The sync client is safe to use from several threads at once;
+    asyncio connections cannot outlive their event loop, so each loop gets its
+    own client.
+
+    Connection setup is observed through the HTTP trace extension, which gives
+    the reuse metrics in stats().
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        base_url: Optional[str] = None,
+        max_retries: int = 2
+    ):
+        """
+        Initialize the transport. Clients are created on first use.
+
+        Args:
+            api_key: OpenAI API key
+            max_connections: Maximum number of open connections per client;
+                all of them are kept alive between requests
+            keepalive_expiry: Seconds an idle connection is kept open
+            base_url: API base URL, None for the OpenAI default
+            max_retries: Retries done by the OpenAI SDK itself; 0 when a
+                RequestScheduler handles retries
+        """
+        if not api_key:
+            raise ValueError("API key cannot be empty")
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.limits = http.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[OpenAI] = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "connections_opened": 0,
+            "tls_handshakes": 0,
+        }
+
+    @property
+    def client(self) -> OpenAI:
+        """The shared OpenAI client, created on first use"""
+        with self._lock:
+            if self._client is None:
+                self._client = OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=self.max_retries,
+                    http_client=DefaultHttpxClient(
+                        limits=self.limits,
+                        event_hooks={"request": [self._on_request]},
+                    ),
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """The asyncio OpenAI client of the running event loop, created on
+        first use"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_clients:
+                self._async_clients[loop] = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=self.max_retries,
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=self.limits,
+                        event_hooks={"request": [self._on_request_async]},
+                    ),
+                )
+            return self._async_clients[loop]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get connection reuse metrics.
+
+        Returns:
+            Dictionary with the number of requests sent, connections opened,
+            TLS handshakes, requests sent on a reused connection and the
+            resulting reuse ratio
+        """
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        reused = max(stats["requests"] - stats["connections_opened"], 0)
+        stats["reused_connections"] = reused
+        stats["reuse_ratio"] = reused / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def close(self) -> None:
+        """Close the sync client's connections. Asyncio clients are closed by
+        aclose()."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose_loop(self) -> None:
+        """Close the connections of the running loop's client, e.g. before a
+        loop of asyncio.run ends. Other clients stay open."""
+        with self._lock:
+            async_client = self._async_clients.pop(
+                asyncio.get_running_loop(), None
+            )
+        if async_client is not None:
+            await async_client.close()
+
+    async def aclose(self) -> None:
+        """Close the connections of the running loop's client and the sync
+        client."""
+        await self.aclose_loop()
+        self.close()
+
+    def _on_request(self, request: http.Request) -> None:
+        self._count("requests")
+        request.extensions["trace"] = self._trace
+
+    async def _on_request_async(self, request: http.Request) -> None:
+        self._count("requests")
+        request.extensions["trace"] = self._trace_async
+
+    def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self._count("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            self._count("tls_handshakes")
+
+    async def _trace_async(self, event_name: str, info: dict) -> None:
+        self._trace(event_name, info)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,420 @@
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+from openai import APIConnectionError, APITimeoutError
+
+from ..token_estimate import estimate_tokens
+from .llm_backend import LLMBackend, LLMCompletion, StreamedCompletion
+
+# Completion tokens reserved per request before the actual usage is known
+DEFAULT_COMPLETION_TOKENS = 256
+_RETRY_STATUS_CODES = {408, 409, 429}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# Longest an asyncio waiter sleeps before checking the queue again
+_ASYNC_POLL_SECONDS = 0.05
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate limit reset duration such as '1s', '6m0s' or '20ms'.
+
+    Returns:
+        Seconds, or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+@dataclass
+class RateLimits:
+    """Provider limits of one model; None means not limited"""
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+
+class TokenBucket:
+    """Refills continuously up to its capacity at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.available = self.capacity
+        self._updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken, 0 if it can be taken now."""
+        self._refill(now)
+        # A request larger than the bucket only waits for a full bucket
+        needed = min(amount, self.capacity)
+        if self.available >= needed:
+            return 0.0
+        return (needed - self.available) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.available -= amount
+
+    def refund(self, amount: float) -> None:
+        self.available = min(self.available + amount, self.capacity)
+
+    def sync(
+        self,
+        remaining: Optional[float],
+        reset_seconds: Optional[float],
+        limit: Optional[float],
+        now: float
+    ) -> None:
+        """Align the bucket with what the provider reports."""
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+            self.rate = limit / 60.0
+        if remaining is not None:
+            self.available = min(self.available, remaining)
+            if reset_seconds and remaining < self.capacity:
+                # The provider is full again after reset_seconds
+                self.rate = max(self.rate, (self.capacity - remaining) / reset_seconds)
+
+    def _refill(self, now: float) -> None:
+        self.available = min(
+            self.capacity, self.available + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+@dataclass(order=True)
+class _Ticket:
+    sort_key: Tuple[float, int]
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class _ModelQueue:
+    def __init__(self, limits: Optional[RateLimits]):
+        limits = limits or RateLimits()
+        self.requests = (
+            TokenBucket(limits.requests_per_minute)
+            if limits.requests_per_minute else None
+        )
+        self.tokens = (
+            TokenBucket(limits.tokens_per_minute)
+            if limits.tokens_per_minute else None
+        )
+        self.waiting: List[_Ticket] = []
+        self.paused_until = 0.0
+
+
+class RequestScheduler(LLMBackend):
+    """
+    Shared scheduler in front of an LLM backend.
+
+    Requests wait in a priority queue per model until the model's request and
+    token buckets allow them. Conversations with a longer history, which are
+    closer to finishing their goal, go first. Buckets are configured per model
+    and corrected from the provider's x-ratelimit-* response headers. On 429,
+    5xx and connection errors the request is retried with jittered exponential
+    backoff, honoring retry-after, and the whole model queue pauses meanwhile.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        limits: Optional[Mapping[str, RateLimits]] = None,
+        default_limits: Optional[RateLimits] = None,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        call_log_size: int = 1000
+    ):
+        """
+        Args:
+            backend: Backend the requests are sent to
+            limits: Rate limits per model name
+            default_limits: Rate limits of models not in limits, None to only
+                learn them from response headers
+            max_retries: Retries of a request after a retryable error
+            base_delay: Backoff before the first retry, in seconds
+            max_delay: Upper bound of the backoff, in seconds
+            call_log_size: Number of recent calls kept in call_log
+        """
+        self.backend = backend
+        self.limits = dict(limits or {})
+        self.default_limits = default_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Queue wait, attempts and priority of each recent call
+        self.call_log: Deque[Dict[str, Any]] = deque(maxlen=call_log_size)
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def complete(self, request: Dict[str, Any]) -> LLMCompletion:
+        return self._run(request, self.backend.complete)
+
+    async def complete_async(self, request: Dict[str, Any]) -> LLMCompletion:
+        return await self._run_async(request, self.backend.complete_async)
+
+    def stream(self, request: Dict[str, Any]) -> StreamedCompletion:
+        return self._run(request, self.backend.stream)
+
+    async def stream_async(self, request: Dict[str, Any]) -> StreamedCompletion:
+        return await self._run_async(request, self.backend.stream_async)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get scheduler counters merged with those of the backend."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats["queued"] = sum(len(q.waiting) for q in self._queues.values())
+        if stats["calls"]:
+            stats["average_queue_wait_seconds"] = (
+                stats["queue_wait_seconds"] / stats["calls"]
+            )
+        return dict(self.backend.stats(), **stats)
+
+    def close(self) -> None:
+        self.backend.close()
+
+    async def aclose_loop(self) -> None:
+        await self.backend.aclose_loop()
+
+    @staticmethod
+    def priority(request: Dict[str, Any]) -> float:
+        """Higher for conversations further along, i.e. with more messages."""
+        return float(len(request.get("messages", [])))
+
+    def _run(self, request, call):
+        model = request.get("model", "")
+        tokens = self._estimate_tokens(request)
+        waited = 0.0
+        for attempt in itertools.count():
+            ticket = self._enqueue(model, request, tokens)
+            try:
+                with self._condition:
+                    while True:
+                        delay = self._try_acquire(model, ticket)
+                        if delay == 0:
+                            break
+                        self._condition.wait(delay)
+            except BaseException:
+                self._withdraw(model, ticket)
+                raise
+            waited += time.monotonic() - ticket.enqueued_at
+            try:
+                result = call(request)
+            except Exception as e:
+                if not self._should_retry(model, e, attempt):
+                    self._record(model, request, waited, attempt + 1, e)
+                    raise
+                continue
+            self._observe(model, tokens, result)
+            self._record(model, request, waited, attempt + 1)
+            return result
+
+    async def _run_async(self, request, call):
+        model = request.get("model", "")
+        tokens = self._estimate_tokens(request)
+        waited = 0.0
+        for attempt in itertools.count():
+            ticket = self._enqueue(model, request, tokens)
+            try:
+                while True:
+                    with self._condition:
+                        delay = self._try_acquire(model, ticket)
+                    if delay == 0:
+                        break
+                    await asyncio.sleep(min(delay, _ASYNC_POLL_SECONDS))
+            except BaseException:
+                # E.g. the task was cancelled while waiting
+                self._withdraw(model, ticket)
+                raise
+            waited += time.monotonic() - ticket.enqueued_at
+            try:
+                result = await call(request)
+            except Exception as e:
+                if not self._should_retry(model, e, attempt):
+                    self._record(model, request, waited, attempt + 1, e)
+                    raise
+                continue
+            self._observe(model, tokens, result)
+            self._record(model, request, waited, attempt + 1)
+            return result
+
+    @staticmethod
+    def _estimate_tokens(request: Dict[str, Any]) -> int:
+        prompt = json.dumps(request.get("messages", []))
+        if request.get("tools"):
+            prompt += json.dumps(request["tools"])
+        return estimate_tokens(prompt) + int(
+            request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        )
+
+    def _queue(self, model: str) -> _ModelQueue:
+        # Called with the condition held
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = _ModelQueue(self.limits.get(model, self.default_limits))
+            self._queues[model] = queue
+        return queue
+
+    def _enqueue(self, model, request, tokens) -> _Ticket:
+        ticket = _Ticket(
+            (-self.priority(request), next(self._sequence)),
+            tokens,
+            time.monotonic(),
+        )
+        with self._condition:
+            heapq.heappush(self._queue(model).waiting, ticket)
+        return ticket
+
+    def _withdraw(self, model: str, ticket: _Ticket) -> None:
+        # Removes a ticket that gives up waiting, so it doesn't block the queue
+        with self._condition:
+            queue = self._queue(model)
+            if ticket in queue.waiting:
+                queue.waiting.remove(ticket)
+                heapq.heapify(queue.waiting)
+                self._condition.notify_all()
+
+    def _try_acquire(self, model: str, ticket: _Ticket) -> float:
+        # Called with the condition held; 0 means the ticket may proceed
+        queue = self._queue(model)
+        now = time.monotonic()
+        if queue.waiting[0] is not ticket:
+            # Woken when the tickets ahead proceed
+            return max(queue.paused_until - now, _ASYNC_POLL_SECONDS)
+        delay = max(queue.paused_until - now, 0.0)
+        if queue.requests is not None:
+            delay = max(delay, queue.requests.wait_time(1, now))
+        if queue.tokens is not None:
+            delay = max(delay, queue.tokens.wait_time(ticket.tokens, now))
+        if delay > 0:
+            return delay
+        heapq.heappop(queue.waiting)
+        if queue.requests is not None:
+            queue.requests.take(1, now)
+        if queue.tokens is not None:
+            queue.tokens.take(ticket.tokens, now)
+        self._condition.notify_all()
+        return 0.0
+
+    def _observe(self, model: str, estimated_tokens: int, result) -> None:
+        completion = result
+        if isinstance(result, StreamedCompletion):
+            if not result.is_dispatched:
+                return
+            try:
+                # Doesn't block once dispatched; carries the response headers
+                completion = result.early()
+            except Exception:
+                return
+        # Give back what the reservation overestimated
+        used = completion.usage.get("total_tokens", estimated_tokens)
+        unused = estimated_tokens - used
+        with self._condition:
+            queue = self._queue(model)
+            if queue.tokens is not None and unused > 0:
+                queue.tokens.refund(unused)
+            self._sync(queue, completion.headers)
+            self._condition.notify_all()
+
+    @staticmethod
+    def _sync(queue: _ModelQueue, headers: Mapping[str, str]) -> None:
+        # Called with the condition held
+        now = time.monotonic()
+        for kind in ("requests", "tokens"):
+            limit = _number(headers.get(f"x-ratelimit-limit-{kind}"))
+            bucket = getattr(queue, kind)
+            if bucket is None and limit:
+                bucket = TokenBucket(limit)
+                setattr(queue, kind, bucket)
+            if bucket is not None:
+                bucket.sync(
+                    _number(headers.get(f"x-ratelimit-remaining-{kind}")),
+                    parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                    limit,
+                    now,
+                )
+
+    def _should_retry(self, model: str, error: Exception, attempt: int) -> bool:
+        status = getattr(error, "status_code", None)
+        retryable = (
+            status in _RETRY_STATUS_CODES
+            or (status is not None and status >= 500)
+            or isinstance(error, (APIConnectionError, APITimeoutError))
+        )
+        if not retryable or attempt >= self.max_retries:
+            return False
+
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        # Full jitter keeps retrying conversations from synchronizing
+        delay = random.uniform(delay / 2, delay)
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        retry_after = _number(headers.get("retry-after-ms"))
+        if retry_after is not None:
+            delay = max(delay, retry_after / 1000)
+        else:
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        with self._condition:
+            if status == 429:
+                self._stats["rate_limited"] += 1
+            elif status is not None and status >= 500:
+                self._stats["server_errors"] += 1
+            self._stats["retries"] += 1
+            queue = self._queue(model)
+            self._sync(queue, {k.lower(): v for k, v in headers.items()})
+            queue.paused_until = max(queue.paused_until, time.monotonic() + delay)
+            self._condition.notify_all()
+        return True
+
+    def _record(self, model, request, waited, attempts, error=None) -> None:
+        entry = {
+            "model": model,
+            "priority": self.priority(request),
+            "queue_wait_seconds": waited,
+            "attempts": attempts,
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+        }
+        with self._condition:
+            self._stats["calls"] += 1
+            self._stats["queue_wait_seconds"] += waited
+            self._stats["max_queue_wait_seconds"] = max(
+                self._stats["max_queue_wait_seconds"], waited
+            )
+            self.call_log.append(entry)
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except ValueError:
+        return None
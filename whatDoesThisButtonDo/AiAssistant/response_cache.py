@@ -0,0 +1,210 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# off: always call the API; read-through: serve hits, record misses;
+# record-only: always call the API and record; replay-only: serve hits and
+# fail on a miss without calling the API
+CACHE_MODES = ("off", "read-through", "record-only", "replay-only")
+
+CACHE_FILE_NAME = "responses.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Request fields that decide the response
+_KEY_FIELDS = ("model", "messages", "tools", "tool_choice")
+
+
+class ResponseCacheMiss(LookupError):
+    """Raised in replay-only mode when a request has no recorded response"""
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a chat completion request.
+
+    Args:
+        request: Keyword arguments of chat.completions.create
+
+    Returns:
+        Hex SHA-256 of the model, messages, tools and tool_choice, serialized
+        with sorted keys so dict ordering does not matter
+    """
+    canonical = json.dumps(
+        {field: request.get(field) for field in _KEY_FIELDS},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent record/replay cache of parsed chat completion responses.
+
+    Responses are stored zlib-compressed in a single sqlite file. When the
+    stored size exceeds max_bytes, the least recently used responses are
+    evicted. The cache can be shared by all conversations and threads.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: str = "read-through",
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        """
+        Open or create the cache.
+
+        Args:
+            path: sqlite file, e.g. .wdtbd_cache/responses.sqlite3
+            mode: One of CACHE_MODES
+            max_bytes: Maximum total size of the compressed responses
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown response cache mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def get(self, key: str) -> Any:
+        """
+        Get a recorded response.
+
+        Returns:
+            The response, or None if the key has no recorded response
+        """
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            db.commit()
+            self.stats["hits"] += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, response: Any) -> None:
+        """Record a response, evicting old ones if the cache grows too large."""
+        value = zlib.compress(json.dumps(response, separators=(",", ":")).encode())
+        with self._lock:
+            db = self._connect()
+            previous = db.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            self._size += len(value) - (previous[0] if previous else 0)
+            self.stats["stores"] += 1
+            self._evict(db)
+            db.commit()
+
+    def lookup(self, request: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+        """
+        Get the response to a request according to the cache mode.
+
+        Args:
+            request: Keyword arguments of chat.completions.create
+            fetch: Calls the API and returns the parsed response
+
+        Raises:
+            ResponseCacheMiss: In replay-only mode if nothing was recorded
+        """
+        if not self.enabled:
+            return fetch()
+        key = request_key(request)
+        if self.mode != "record-only":
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            if self.mode == "replay-only":
+                raise ResponseCacheMiss(
+                    f"No recorded response for request {key[:12]} "
+                    f"(model {request.get('model')})"
+                )
+        response = fetch()
+        self.put(key, response)
+        return response
+
+    async def lookup_async(
+        self,
+        request: Dict[str, Any],
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Asyncio counterpart of lookup, fetch returning an awaitable."""
+        if not self.enabled:
+            return await fetch()
+        key = request_key(request)
+        if self.mode != "record-only":
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            if self.mode == "replay-only":
+                raise ResponseCacheMiss(
+                    f"No recorded response for request {key[:12]} "
+                    f"(model {request.get('model')})"
+                )
+        response = await fetch()
+        self.put(key, response)
+        return response
+
+    def close(self) -> None:
+        """Close the sqlite connection."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Called with the lock held
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used "
+                "ON responses (last_used)"
+            )
+            self._size = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+        return self._db
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        while self._size > self.max_bytes:
+            row = db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._size = 0
+                return
+            db.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._size -= row[1]
+            self.stats["evictions"] += 1
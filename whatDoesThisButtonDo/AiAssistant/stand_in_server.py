@@ -0,0 +1,539 @@
+"""
+Local stand-in for the OpenAI chat-completions API.
+
+It answers tool-calling requests with scripted or policy-driven tool calls
+after a configurable latency, so the exploration pipeline can be run and
+load-tested on one machine without network access or API costs:
+
+    python -m whatDoesThisButtonDo.AiAssistant.stand_in_server --port 8089
+
+and point the application at it with --base-url http://127.0.0.1:8089/v1.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..token_estimate import estimate_tokens
+from .request_scheduler import TokenBucket
+
+_ACTIONS_HEADER = "# Available Actions:"
+_ACTION_LINE = re.compile(r"^- ([^:\s]+):")
+
+
+def step_index(request: Dict[str, Any]) -> int:
+    """Number of next-action prompts in a conversation before the last one."""
+    prompts = [
+        message for message in request.get("messages", [])
+        if message.get("role") == "user"
+        and _ACTIONS_HEADER in (message.get("content") or "")
+    ]
+    return max(len(prompts) - 1, 0)
+
+
+def available_actions(request: Dict[str, Any]) -> List[str]:
+    """Action names listed in the latest next-action prompt of a request."""
+    for message in reversed(request.get("messages", [])):
+        content = message.get("content") or ""
+        if message.get("role") != "user" or _ACTIONS_HEADER not in content:
+            continue
+        listing = content.split(_ACTIONS_HEADER, 1)[1].split("\n\n", 1)[0]
+        return [
+            match.group(1) for match in map(_ACTION_LINE.match, listing.splitlines())
+            if match
+        ]
+    return []
+
+
+class StandInPolicy(ABC):
+    """Decides the stand-in's response to a chat completion request"""
+
+    @abstractmethod
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Produce a response.
+
+        Args:
+            request: The chat completion request body
+
+        Returns:
+            A tool call as {'name': ..., 'arguments': {...}} or a text reply
+            as {'content': ...}
+        """
+        pass
+
+
+def _tool_schema(request: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
+    for tool in request.get("tools") or []:
+        function = tool.get("function", {})
+        if function.get("name") == name:
+            return function
+    return None
+
+
+def plan_limit(request: Dict[str, Any]) -> int:
+    """Most steps the request's submit_plan tool accepts, 0 if not offered."""
+    function = _tool_schema(request, "submit_plan")
+    if function is None:
+        return 0
+    return function["parameters"]["properties"]["steps"].get("maxItems", 1)
+
+
+class ExplorePolicy(StandInPolicy):
+    """
+    Selects a random available action at each step and ends the test after
+    max_steps steps, or once no action is available. When submit_plan is
+    offered, it plans as many random actions as allowed, each expecting a
+    successful status. Goal requests get as many numbered goals as allowed.
+    """
+
+    def __init__(self, max_steps: int = 5, seed: Optional[int] = None):
+        self.max_steps = max_steps
+        self.seed = seed
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if not request.get("tools"):
+            return {"content": "OK"}
+        goals_schema = _tool_schema(request, "propose_goals")
+        if goals_schema is not None:
+            count = goals_schema["parameters"]["properties"]["goals"].get(
+                "maxItems", 1
+            )
+            return {
+                "name": "propose_goals",
+                "arguments": {"goals": [{
+                    "title": f"stand-in goal {number}",
+                    "description": "Explore the sandbox at random",
+                } for number in range(1, count + 1)]},
+            }
+        step = step_index(request)
+        actions = available_actions(request)
+        if step >= self.max_steps or not actions:
+            return {
+                "name": "test_done",
+                "arguments": {
+                    "result": "successful",
+                    "conclusion": f"Stand-in explored {step} steps",
+                },
+            }
+        # Seeded per step so concurrent conversations stay deterministic
+        rng = random.Random(None if self.seed is None else f"{self.seed}:{step}")
+        plan_steps = plan_limit(request)
+        if plan_steps:
+            return {
+                "name": "submit_plan",
+                "arguments": {"steps": [{
+                    "tool_call": "select_next_action",
+                    "action": rng.choice(actions),
+                    "parameters": {},
+                    "purpose": "stand-in plan",
+                    "expect": {
+                        "path": "status", "condition": "equals", "value": "success"
+                    },
+                } for _ in range(plan_steps)]},
+            }
+        return {
+            "name": "select_next_action",
+            "arguments": {
+                "action": rng.choice(actions),
+                "parameters": {},
+                "test_intention": "stand-in exploration",
+            },
+        }
+
+
+class ScriptedPolicy(StandInPolicy):
+    """
+    Replays a script of responses, one per step of a conversation. Once the
+    script is exhausted the test is ended.
+    """
+
+    def __init__(self, responses: List[Dict[str, Any]]):
+        """
+        Args:
+            responses: Responses in the format returned by respond()
+        """
+        self.responses = responses
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ScriptedPolicy':
+        """Load a script from a JSON file holding a list of responses."""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        step = step_index(request)
+        if step < len(self.responses):
+            return self.responses[step]
+        return {
+            "name": "test_done",
+            "arguments": {"result": "successful", "conclusion": "Script finished"},
+        }
+
+
+class StandInServer:
+    """
+    OpenAI-compatible chat-completions server running in a background thread.
+
+    Both regular and streamed (server-sent events) responses are supported.
+    """
+
+    def __init__(
+        self,
+        policy: Optional[StandInPolicy] = None,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        stream_chunk_size: int = 16,
+        stream_chunk_delay: float = 0.0,
+        requests_per_minute: Optional[float] = None,
+        failure_rate: float = 0.0
+    ):
+        """
+        Args:
+            policy: Decides the responses, defaults to ExplorePolicy()
+            latency: Seconds to wait before answering a request, or before the
+                first chunk of a streamed response
+            latency_jitter: Up to this many seconds are added to the latency
+                at random
+            host: Interface to listen on
+            port: Port to listen on, 0 for any free port
+            stream_chunk_size: Characters of content or arguments per streamed
+                chunk
+            stream_chunk_delay: Seconds between streamed chunks
+            requests_per_minute: Answer 429 above this rate, with the
+                x-ratelimit-* and retry-after headers OpenAI sends; None for
+                no limit
+            failure_rate: Fraction of requests answered with a 500 error
+        """
+        self.policy = policy or ExplorePolicy()
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_chunk_delay = stream_chunk_delay
+        self.requests_per_minute = requests_per_minute
+        self.failure_rate = failure_rate
+        self.stats = {
+            "requests": 0, "streamed": 0, "errors": 0,
+            "rate_limited": 0, "failed": 0,
+        }
+        self._bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to give to an OpenAI client."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> 'StandInServer':
+        """Serve requests on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._server.serve_forever,
+                name="stand-in-server",
+                daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve requests on the calling thread."""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the chat.completion response body for a request.
+
+        Args:
+            request: The chat completion request body
+        """
+        reply = self.policy.respond(request)
+        message: Dict[str, Any] = {"role": "assistant", "content": None}
+        if "name" in reply:
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {
+                    "name": reply["name"],
+                    "arguments": self._arguments(reply),
+                },
+            }]
+            finish_reason = "tool_calls"
+            completion_text = message["tool_calls"][0]["function"]["arguments"]
+        else:
+            message["content"] = reply.get("content", "")
+            finish_reason = "stop"
+            completion_text = message["content"]
+        prompt_tokens = estimate_tokens(json.dumps(request.get("messages", [])))
+        completion_tokens = estimate_tokens(completion_text)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stand-in"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": finish_reason,
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def stream_chunks(
+        self,
+        completion: Dict[str, Any],
+        include_usage: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Split a completion into chat.completion.chunk bodies.
+
+        Args:
+            completion: Body built by completion()
+            include_usage: End with a chunk carrying the token usage
+        """
+        choice = completion["choices"][0]
+        message = choice["message"]
+        base = {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+        }
+
+        def chunk(delta, finish_reason=None):
+            return dict(base, choices=[{
+                "index": 0, "delta": delta, "finish_reason": finish_reason
+            }])
+
+        size = self.stream_chunk_size
+        if message.get("tool_calls"):
+            tool_call = message["tool_calls"][0]
+            yield chunk({"role": "assistant", "content": None, "tool_calls": [{
+                "index": 0,
+                "id": tool_call["id"],
+                "type": "function",
+                "function": {"name": tool_call["function"]["name"], "arguments": ""},
+            }]})
+            arguments = tool_call["function"]["arguments"]
+            for start in range(0, len(arguments), size):
+                yield chunk({"tool_calls": [{
+                    "index": 0,
+                    "function": {"arguments": arguments[start:start + size]},
+                }]})
+        else:
+            yield chunk({"role": "assistant", "content": ""})
+            content = message["content"] or ""
+            for start in range(0, len(content), size):
+                yield chunk({"content": content[start:start + size]})
+        yield chunk({}, choice["finish_reason"])
+        if include_usage:
+            yield dict(base, choices=[], usage=completion["usage"])
+
+    @staticmethod
+    def _arguments(reply: Dict[str, Any]) -> str:
+        arguments = reply.get("arguments", {})
+        if isinstance(arguments, str):
+            return arguments
+        return json.dumps(arguments)
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _admit(self) -> Tuple[int, Dict[str, str]]:
+        """Apply the simulated limits. Returns the status and headers to send."""
+        if random.random() < self.failure_rate:
+            self._count("failed")
+            return 500, {}
+        if self._bucket is None:
+            return 200, {}
+        with self._stats_lock:
+            now = time.monotonic()
+            wait = self._bucket.wait_time(1, now)
+            if wait == 0:
+                self._bucket.take(1, now)
+            remaining = max(self._bucket.available, 0)
+            # Time until the bucket is full again, as OpenAI reports it
+            reset = (self._bucket.capacity - remaining) / self._bucket.rate
+        headers = {
+            "x-ratelimit-limit-requests": str(int(self._bucket.capacity)),
+            "x-ratelimit-remaining-requests": str(int(remaining)),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }
+        if wait > 0:
+            self._count("rate_limited")
+            headers["retry-after-ms"] = str(int(wait * 1000) + 1)
+            return 429, headers
+        return 200, headers
+
+    def _wait(self) -> None:
+        delay = self.latency + random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server._count("requests")
+                status, headers = server._admit()
+                if status != 200:
+                    message = "Rate limit reached" if status == 429 else "Failure"
+                    self._send_json(status, {"error": {"message": message}}, headers)
+                    return
+                try:
+                    request = json.loads(body)
+                    completion = server.completion(request)
+                except Exception as e:
+                    server._count("errors")
+                    self._send_json(500, {"error": {"message": str(e)}})
+                    return
+                server._wait()
+                if request.get("stream"):
+                    server._count("streamed")
+                    options = request.get("stream_options") or {}
+                    self._send_stream(server.stream_chunks(
+                        completion, bool(options.get("include_usage"))
+                    ), headers)
+                else:
+                    self._send_json(200, completion, headers)
+
+            def _send_json(
+                self,
+                status: int,
+                body: Dict[str, Any],
+                headers: Optional[Dict[str, str]] = None
+            ) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(
+                self,
+                chunks: Iterator[Dict[str, Any]],
+                headers: Dict[str, str]
+            ) -> None:
+                self.send_response(200)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    if i and server.stream_chunk_delay:
+                        time.sleep(server.stream_chunk_delay)
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the stand-in server from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Local OpenAI-compatible stand-in for load testing'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Seconds to wait before each response'
+    )
+    parser.add_argument(
+        '--latency-jitter', type=float, default=0.0,
+        help='Random extra latency of up to this many seconds'
+    )
+    parser.add_argument(
+        '--script',
+        help='JSON file with a list of responses to replay at each step'
+    )
+    parser.add_argument(
+        '--max-steps', type=int, default=5,
+        help='Steps before the explore policy ends the test'
+    )
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument(
+        '--requests-per-minute', type=float, default=None,
+        help='Answer 429 above this request rate'
+    )
+    parser.add_argument(
+        '--failure-rate', type=float, default=0.0,
+        help='Fraction of requests answered with a 500 error'
+    )
+    args = parser.parse_args(argv)
+
+    if args.script:
+        policy = ScriptedPolicy.from_file(args.script)
+    else:
+        policy = ExplorePolicy(max_steps=args.max_steps, seed=args.seed)
+    server = StandInServer(
+        policy,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        host=args.host,
+        port=args.port,
+        requests_per_minute=args.requests_per_minute,
+        failure_rate=args.failure_rate,
+    )
+    print(f"Stand-in chat-completions server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
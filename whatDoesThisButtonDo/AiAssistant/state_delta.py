@@ -0,0 +1,250 @@
+import copy
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+DEFAULT_RESYNC_EVERY = 10
+DEFAULT_MAX_STRING_CHARS = 500
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _child_path(path: str, key: Any) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    key = key if _IDENTIFIER.match(key) else "'" + key.replace("'", "\\'") + "'"
+    return f"{path}.{key}" if path else key
+
+
+def _clip(text: str, max_chars: int, keep_end: bool = False) -> str:
+    if len(text) <= max_chars:
+        return text
+    omitted = f"...({len(text) - max_chars} chars omitted)..."
+    return omitted + text[-max_chars:] if keep_end else text[:max_chars] + omitted
+
+
+def _full_message(state: Any) -> str:
+    return f"Current system state:\n{json.dumps(state, indent=2)}"
+
+
+def _string_change(
+    path: str, old: str, new: str, max_chars: int
+) -> Dict[str, Any]:
+    if new.startswith(old):
+        # Output that only grew, e.g. a process's stdout
+        return {
+            "op": "append",
+            "path": path,
+            "value": _clip(new[len(old):], max_chars, keep_end=True),
+        }
+    if len(old) <= max_chars and len(new) <= max_chars:
+        return {"op": "change", "path": path, "value": new}
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]
+    ):
+        suffix += 1
+    return {
+        "op": "edit",
+        "path": path,
+        "at": prefix,
+        "removed": _clip(old[prefix:len(old) - suffix], max_chars),
+        "inserted": _clip(new[prefix:len(new) - suffix], max_chars),
+    }
+
+
+def state_diff(
+    old: Any,
+    new: Any,
+    path: str = "",
+    max_string_chars: int = DEFAULT_MAX_STRING_CHARS
+) -> List[Dict[str, Any]]:
+    """
+    Compute the structural difference between two JSON states.
+
+    Args:
+        old: Previous state
+        new: Current state
+        path: JSON path of the compared values, empty for the root
+        max_string_chars: Longest string value reported; longer changes are
+            reduced to what changed and clipped
+
+    Returns:
+        Changes in document order, each with an op ("add", "remove",
+        "change", "append" or "edit") and the JSON path it applies to
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key, value in new.items():
+            child = _child_path(path, key)
+            if key not in old:
+                changes.append({"op": "add", "path": child, "value": value})
+            else:
+                changes.extend(
+                    state_diff(old[key], value, child, max_string_chars)
+                )
+        for key in old:
+            if key not in new:
+                changes.append({"op": "remove", "path": _child_path(path, key)})
+        return changes
+    if isinstance(old, list) and isinstance(new, list):
+        changes = []
+        for index, value in enumerate(new):
+            child = _child_path(path, index)
+            if index >= len(old):
+                changes.append({"op": "add", "path": child, "value": value})
+            else:
+                changes.extend(
+                    state_diff(old[index], value, child, max_string_chars)
+                )
+        for index in range(len(new), len(old)):
+            changes.append({"op": "remove", "path": _child_path(path, index)})
+        return changes
+    if isinstance(old, str) and isinstance(new, str):
+        if old == new:
+            return []
+        return [_string_change(path, old, new, max_string_chars)]
+    if type(old) is type(new) and old == new:
+        return []
+    return [{"op": "change", "path": path, "value": new}]
+
+
+class StateDeltaTracker:
+    """
+    Keeps the last state sent to one conversation and renders each new state
+    as only what changed since then.
+
+    The full state is sent first, then every resync_every steps, whenever
+    the delta would not be smaller than the full state, and whenever the
+    conversation no longer contains the last full state. A prompt whose token
+    ceiling folds away the last full state after the delta was rendered is
+    corrected with resync.
+    """
+
+    def __init__(
+        self,
+        resync_every: int = DEFAULT_RESYNC_EVERY,
+        max_string_chars: int = DEFAULT_MAX_STRING_CHARS
+    ):
+        """
+        Args:
+            resync_every: Steps after which the full state is sent again
+            max_string_chars: Longest string value reported in a delta
+        """
+        if resync_every < 1:
+            raise ValueError("resync_every must be at least 1")
+        self.resync_every = resync_every
+        self.max_string_chars = max_string_chars
+        self._last_state: Any = None
+        self._last_turn: Optional[int] = None
+        self._last_chars = 0
+        self._full_turn: Optional[int] = None
+        self._steps_since_full = 0
+        self._stats = {
+            "full_states": 0,
+            "deltas": 0,
+            "chars_sent": 0,
+            "full_state_chars": 0,
+        }
+
+    def message(self, state: Any, turn: int, first_turn_sent: int = 0) -> str:
+        """
+        Render the state message of a step.
+
+        Args:
+            state: Current state of the system under test
+            turn: Index of the turn the message is added to
+            first_turn_sent: Index of the oldest turn still sent in full, so
+                a full state that was folded away is sent again
+
+        Returns:
+            The full state, or the changes since the last state message
+        """
+        full = _full_message(state)
+        message = full
+        resync = (
+            self._full_turn is None
+            or self._full_turn < first_turn_sent
+            or self._steps_since_full + 1 >= self.resync_every
+        )
+        if not resync:
+            changes = state_diff(
+                self._last_state, state, max_string_chars=self.max_string_chars
+            )
+            if not changes:
+                delta = "System state unchanged since the last step."
+            else:
+                delta = (
+                    "System state changes since the last step (paths as used "
+                    "by assert_state):\n"
+                    + json.dumps(changes, indent=2, default=str)
+                )
+            if len(delta) < len(full):
+                message = delta
+
+        if message is full:
+            self._full_turn = turn
+            self._steps_since_full = 0
+            self._stats["full_states"] += 1
+        else:
+            self._steps_since_full += 1
+            self._stats["deltas"] += 1
+        self._stats["chars_sent"] += len(message)
+        self._stats["full_state_chars"] += len(full)
+        self._last_state = copy.deepcopy(state)
+        self._last_turn = turn
+        self._last_chars = len(message)
+        return message
+
+    def needs_resync(self, first_turn_sent: int) -> bool:
+        """
+        Check whether the last message is a delta whose full state is not
+        sent, e.g. because the prompt was folded further after it was built.
+
+        Args:
+            first_turn_sent: Index of the oldest turn the prompt sends in full
+
+        Returns:
+            True if the last message must be replaced with resync
+        """
+        return (
+            self._full_turn is not None
+            and self._full_turn != self._last_turn
+            and self._full_turn < first_turn_sent
+        )
+
+    def resync(self) -> str:
+        """
+        Render the last state in full, to replace the delta returned for it.
+
+        Returns:
+            The full state message
+        """
+        full = _full_message(self._last_state)
+        self._full_turn = self._last_turn
+        self._steps_since_full = 0
+        self._stats["deltas"] -= 1
+        self._stats["full_states"] += 1
+        self._stats["chars_sent"] += len(full) - self._last_chars
+        self._last_chars = len(full)
+        return full
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the size of the state messages sent.
+
+        Returns:
+            Dictionary with the number of full states and deltas sent, the
+            characters sent and the characters full states would have taken
+        """
+        stats: Dict[str, Any] = dict(self._stats)
+        full_chars = stats["full_state_chars"]
+        stats["saved_ratio"] = (
+            1 - stats["chars_sent"] / full_chars if full_chars else 0.0
+        )
+        return stats
@@ -0,0 +1,417 @@
+import hashlib
+import json
+import random
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from typing import Any, Deque, Dict, FrozenSet, Optional, Set, Tuple
+
+from .assertion_engine import default_engine
+
+POLICIES = ("llm", "random", "least-visited", "hybrid", "planning")
+DEFAULT_MAX_ACTIONS = 50
+DEFAULT_MAX_PLAN_STEPS = 5
+DEFAULT_MAX_FORCED_MOVES = 10
+
+Choice = Tuple[str, Dict[str, Any]]
+
+
+def state_fingerprint(
+    possible_actions: Dict[str, Dict[str, Any]],
+    state: Dict[str, Any]
+) -> str:
+    """
+    Identify a state of the system under test.
+
+    Args:
+        possible_actions: Actions available in the state
+        state: State read from the sandbox
+
+    Returns:
+        Hex digest that is equal for equal states and action sets
+    """
+    canonical = json.dumps(
+        {"actions": sorted(possible_actions), "state": state},
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class ActionPolicy(ABC):
+    """
+    Chooses the next step of an exploration: an action, an assertion or the
+    end of the test, as (tool call name, choice) like the AI thread returns.
+    """
+
+    def __init__(self):
+        self._stats = Counter()
+        # Explorations of parallel goals share the policy across threads
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def choose(
+        self,
+        ai_thread,
+        possible_actions: Dict[str, Dict[str, Any]],
+        state: Dict[str, Any],
+        step: int
+    ) -> Choice:
+        """
+        Choose the next step.
+
+        Args:
+            ai_thread: AI thread of the exploration, for policies that ask the
+                model
+            possible_actions: Actions available in the current state
+            state: Current state of the system under test
+            step: Number of the step in the exploration, starting at 1
+
+        Returns:
+            tuple: (tool call name, dict with action and parameters)
+        """
+
+    async def choose_async(
+        self,
+        ai_thread,
+        possible_actions: Dict[str, Dict[str, Any]],
+        state: Dict[str, Any],
+        step: int
+    ) -> Choice:
+        """
+        Asyncio counterpart of choose. Local policies decide without waiting,
+        so the default runs choose directly.
+        """
+        return self.choose(ai_thread, possible_actions, state, step)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get how the steps were decided.
+
+        Returns:
+            Dictionary with the number of model calls and local choices
+        """
+        with self._lock:
+            return {"llm_calls": 0, "local_choices": 0, **self._stats}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+
+class LLMPolicy(ActionPolicy):
+    """Asks the model for every step."""
+
+    def choose(self, ai_thread, possible_actions, state, step) -> Choice:
+        self._count("llm_calls")
+        return ai_thread.get_next_action(possible_actions, state)
+
+    async def choose_async(self, ai_thread, possible_actions, state, step) -> Choice:
+        self._count("llm_calls")
+        return await ai_thread.get_next_action_async(possible_actions, state)
+
+
+class LocalPolicy(ActionPolicy):
+    """
+    Base of the policies that choose actions locally, without parameters.
+    The test ends when no action is available or after max_actions steps.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        max_actions: int = DEFAULT_MAX_ACTIONS
+    ):
+        """
+        Args:
+            seed: Seed of the random choices, None for a random seed
+            max_actions: Steps after which the test ends
+        """
+        super().__init__()
+        self.random = random.Random(seed)
+        self.max_actions = max_actions
+
+    def choose(self, ai_thread, possible_actions, state, step) -> Choice:
+        self._count("local_choices")
+        if not possible_actions or step > self.max_actions:
+            return "test_done", {
+                "result": "successful",
+                "conclusion": (
+                    f"{self.name} exploration ended after {step - 1} actions"
+                ),
+            }
+        action = self.select(possible_actions, state)
+        return "select_next_action", {
+            "action": action,
+            "parameters": {},
+            "test_intention": f"{self.name} exploration",
+        }
+
+    @abstractmethod
+    def select(
+        self,
+        possible_actions: Dict[str, Dict[str, Any]],
+        state: Dict[str, Any]
+    ) -> str:
+        """Select the name of one of the possible actions."""
+
+
+class RandomWalkPolicy(LocalPolicy):
+    """Picks a uniformly random action at every step."""
+
+    name = "Random walk"
+
+    def select(self, possible_actions, state) -> str:
+        return self.random.choice(sorted(possible_actions))
+
+
+class LeastVisitedPolicy(LocalPolicy):
+    """
+    Picks the action taken least often from the current state, so every
+    action of a state is tried before any is repeated. Visit counts are kept
+    across explorations sharing the policy.
+    """
+
+    name = "Least visited"
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        max_actions: int = DEFAULT_MAX_ACTIONS
+    ):
+        super().__init__(seed, max_actions)
+        self.visits: Counter = Counter()
+
+    def select(self, possible_actions, state) -> str:
+        fingerprint = state_fingerprint(possible_actions, state)
+        with self._lock:
+            fewest = min(self.visits[fingerprint, name] for name in possible_actions)
+            action = self.random.choice(sorted(
+                name for name in possible_actions
+                if self.visits[fingerprint, name] == fewest
+            ))
+            self.visits[fingerprint, action] += 1
+        return action
+
+
+class _Visits:
+    """States one exploration of the hybrid policy went through"""
+
+    def __init__(self):
+        # States the model has been asked about
+        self.seen: Set[str] = set()
+        # States left by forced moves since the model was last asked
+        self.forced: Set[str] = set()
+
+
+class HybridPolicy(ActionPolicy):
+    """
+    Asks the model when the state is new or several actions are available,
+    and takes forced moves locally: the only action of a state the model has
+    already seen in the same exploration. The model is asked again when
+    forced moves lead back to a state they already left, which would repeat
+    forever, and after max_forced_moves forced moves in a row.
+    """
+
+    def __init__(self, max_forced_moves: int = DEFAULT_MAX_FORCED_MOVES):
+        """
+        Args:
+            max_forced_moves: Most forced moves taken before the model is
+                asked again
+        """
+        super().__init__()
+        self.max_forced_moves = max_forced_moves
+        self._visits = weakref.WeakKeyDictionary()
+
+    def choose(self, ai_thread, possible_actions, state, step) -> Choice:
+        forced = self._forced_move(ai_thread, possible_actions, state)
+        if forced is not None:
+            return forced
+        self._count("llm_calls")
+        return ai_thread.get_next_action(possible_actions, state)
+
+    async def choose_async(self, ai_thread, possible_actions, state, step) -> Choice:
+        forced = self._forced_move(ai_thread, possible_actions, state)
+        if forced is not None:
+            return forced
+        self._count("llm_calls")
+        return await ai_thread.get_next_action_async(possible_actions, state)
+
+    def _forced_move(self, ai_thread, possible_actions, state) -> Optional[Choice]:
+        fingerprint = state_fingerprint(possible_actions, state)
+        with self._lock:
+            visits = self._visits.get(ai_thread)
+            if visits is None:
+                visits = self._visits[ai_thread] = _Visits()
+        forced = (
+            len(possible_actions) == 1
+            and fingerprint in visits.seen
+            and fingerprint not in visits.forced
+            and len(visits.forced) < self.max_forced_moves
+        )
+        if not forced:
+            visits.seen.add(fingerprint)
+            visits.forced.clear()
+            return None
+        visits.forced.add(fingerprint)
+        self._count("local_choices")
+        return "select_next_action", {
+            "action": next(iter(possible_actions)),
+            "parameters": {},
+            "test_intention": "Only available action",
+        }
+
+
+class _Plan:
+    """The steps of a plan still to run, and what they were planned for"""
+
+    def __init__(self, steps, action_names: FrozenSet[str]):
+        self.steps: Deque[Dict[str, Any]] = deque(steps)
+        self.action_names = action_names
+        # Expectation of the last planned action, checked at the next step
+        self.expect: Optional[Dict[str, Any]] = None
+        self.last_action: Optional[str] = None
+
+    def interruption(
+        self,
+        possible_actions: Dict[str, Dict[str, Any]],
+        state: Dict[str, Any]
+    ) -> Optional[str]:
+        """Why the next step must not run, None if it can."""
+        if self.expect is not None:
+            try:
+                default_engine.evaluate(state, self.expect)
+            except (AssertionError, ValueError) as e:
+                return f"the state after {self.last_action} was not as expected: {e}"
+        new_actions = set(possible_actions) - self.action_names
+        if new_actions:
+            return f"new actions became available: {', '.join(sorted(new_actions))}"
+        if not self.steps:
+            return None
+        step = self.steps[0]
+        if (
+            step.get("tool_call") != "assertion_for_regression"
+            and step.get("action") not in possible_actions
+        ):
+            return f"the planned action {step.get('action')} is not available"
+        return None
+
+
+class PlanningPolicy(ActionPolicy):
+    """
+    Lets the model answer with a plan of several actions and assertions, and
+    runs the plan locally. The model is asked again once an action's expected
+    state is not reached, new actions become available or the plan is done.
+    """
+
+    def __init__(self, max_plan_steps: int = DEFAULT_MAX_PLAN_STEPS):
+        """
+        Args:
+            max_plan_steps: Most steps the model may plan at once
+        """
+        super().__init__()
+        self.max_plan_steps = max_plan_steps
+        self._plans = weakref.WeakKeyDictionary()
+
+    def choose(self, ai_thread, possible_actions, state, step) -> Choice:
+        planned = self._next_planned(ai_thread, possible_actions, state)
+        if planned is not None:
+            return planned
+        self._count("llm_calls")
+        choice = ai_thread.get_next_action(
+            possible_actions, state, max_plan_steps=self.max_plan_steps
+        )
+        return self._start_plan(ai_thread, possible_actions, state, choice)
+
+    async def choose_async(self, ai_thread, possible_actions, state, step) -> Choice:
+        planned = self._next_planned(ai_thread, possible_actions, state)
+        if planned is not None:
+            return planned
+        self._count("llm_calls")
+        choice = await ai_thread.get_next_action_async(
+            possible_actions, state, max_plan_steps=self.max_plan_steps
+        )
+        return self._start_plan(ai_thread, possible_actions, state, choice)
+
+    def _next_planned(self, ai_thread, possible_actions, state) -> Optional[Choice]:
+        plan = self._plans.pop(ai_thread, None)
+        if plan is None:
+            return None
+        reason = plan.interruption(possible_actions, state)
+        if reason is not None:
+            self._count("plan_interruptions")
+            ai_thread.plan_interrupted(reason)
+            return None
+        if not plan.steps:
+            return None
+        self._plans[ai_thread] = plan
+        self._count("local_choices")
+        return self._take(plan)
+
+    def _start_plan(self, ai_thread, possible_actions, state, choice) -> Choice:
+        tool_call_name, arguments = choice
+        if tool_call_name != "submit_plan":
+            return choice
+        steps = [step for step in arguments.get("steps", []) if "action" in step]
+        if not steps:
+            raise ValueError("The model submitted an empty plan")
+        self._count("plans")
+        self._count("planned_steps", len(steps))
+        plan = _Plan(steps[:self.max_plan_steps], frozenset(possible_actions))
+        self._plans[ai_thread] = plan
+        # The first step was chosen for the current state, like a single call
+        return self._take(plan)
+
+    @staticmethod
+    def _take(plan: _Plan) -> Choice:
+        step = plan.steps.popleft()
+        purpose = step.get("purpose", "planned step")
+        if step.get("tool_call") == "assertion_for_regression":
+            plan.expect = None
+            return "assertion_for_regression", {
+                "action": step["action"],
+                "parameters": step.get("parameters", {}),
+                "assertion_purpose": purpose,
+            }
+        plan.expect = step.get("expect")
+        plan.last_action = step["action"]
+        return "select_next_action", {
+            "action": step["action"],
+            "parameters": step.get("parameters", {}),
+            "test_intention": purpose,
+        }
+
+
+def create_action_policy(
+    name: str,
+    seed: Optional[int] = None,
+    max_actions: int = DEFAULT_MAX_ACTIONS,
+    max_plan_steps: int = DEFAULT_MAX_PLAN_STEPS
+) -> ActionPolicy:
+    """
+    Create an action policy by name.
+
+    Args:
+        name: One of POLICIES
+        seed: Seed of the local policies' random choices
+        max_actions: Steps after which the local policies end the test
+        max_plan_steps: Most steps the planning policy lets the model plan
+
+    Returns:
+        The policy
+    """
+    if name == "llm":
+        return LLMPolicy()
+    if name == "random":
+        return RandomWalkPolicy(seed, max_actions)
+    if name == "least-visited":
+        return LeastVisitedPolicy(seed, max_actions)
+    if name == "hybrid":
+        return HybridPolicy()
+    if name == "planning":
+        return PlanningPolicy(max_plan_steps)
+    raise ValueError(f"Unknown action policy {name!r}, expected one of {POLICIES}")
@@ -1,8 +1,25 @@
 from . import AIExploratoryTestAssistant
-from .explorer import Explorer
+from .AiAssistant.openai_transport import DEFAULT_MAX_CONNECTIONS
+from .AiAssistant.request_scheduler import RateLimits
+from .AiAssistant.response_cache import (
+    CACHE_FILE_NAME, DEFAULT_MAX_BYTES, ResponseCache
+)
+from .action_policy import (
+    DEFAULT_MAX_ACTIONS, DEFAULT_MAX_PLAN_STEPS, create_action_policy
+)
+from .exploratory_test import ExplorationCheckpoint
+from .frontier_explorer import (
+    DEFAULT_MAX_DEPTH, FRONTIER_FILE_SUFFIX, FrontierExplorer, FrontierScheduler,
+    testability_signature
+)
+from .goals import DEFAULT_GOAL, goals_for, load_goal_file
+from .multi_goal_executor import GoalResult, MultiGoalExecutor
+from .oracle_cache import get_cache_dir
 from .test_scope import TestScope
+from . import tracing
+from dataclasses import replace
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from .regression_test_proposal import RegressionTestProposal
 import os
 
@@ -13,40 +30,289 @@ class Application:
     Handles initialization, test oracle loading, and test execution.
     """
     
-    def __init__(self):
-        pass
-        
-    def run(self, oracle_dir: str) -> None:
+    def __init__(
+        self,
+        oracle_format: str = "json",
+        oracle_token_budget: Optional[int] = None,
+        oracle_top_k: Optional[int] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        response_cache_mode: str = "off",
+        response_cache_max_bytes: int = DEFAULT_MAX_BYTES,
+        model: str = "gpt-4o-mini",
+        base_url: Optional[str] = None,
+        stream: bool = False,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 5,
+        context_turns: Optional[int] = None,
+        context_max_tokens: Optional[int] = None,
+        state_resync_every: Optional[int] = None,
+        action_policy: str = "llm",
+        policy_seed: Optional[int] = None,
+        policy_max_actions: int = DEFAULT_MAX_ACTIONS,
+        max_plan_steps: int = DEFAULT_MAX_PLAN_STEPS,
+        pipelined: bool = False,
+        goal_file: Optional[str] = None,
+        generate_goals: int = 0,
+        max_parallel: int = 1,
+        frontier_states: int = 0,
+        frontier_depth: int = DEFAULT_MAX_DEPTH,
+        sandbox_pool_size: int = 0,
+        record_checkpoints: bool = False,
+        trace_file: Optional[str] = None,
+        chrome_trace_file: Optional[str] = None
+    ):
         """
-        Main execution method that runs the test oracles
+        Initialize the application.
         
         Args:
-            oracle_dir: Directory containing test oracle files
+            oracle_format: How test oracles are rendered into the prompt, one of
+                test_oracles.RENDER_MODES
+            oracle_token_budget: Estimated token budget for the rendered test
+                oracles, None for no limit
+            oracle_top_k: Send each sandbox only this many oracle sections,
+                ranked by the local relevance index, None to send all oracles
+            max_connections: Size of the OpenAI connection pool shared by all
+                explorations
+            response_cache_mode: One of response_cache.CACHE_MODES; the cache
+                is kept in the oracle directory's .wdtbd_cache
+            response_cache_max_bytes: Size at which old cached responses are
+                evicted
+            model: Model used for the explorations
+            base_url: Base URL of an OpenAI-compatible API, e.g. a local
+                stand_in_server, None for OpenAI
+            stream: Stream model responses and dispatch each action as soon as
+                its tool call is complete
+            requests_per_minute: Request rate limit of the model, None to
+                learn it from the provider's response headers
+            tokens_per_minute: Token rate limit of the model, None to learn it
+                from the provider's response headers
+            max_retries: Retries of rate limited or failed model requests
+            context_turns: Number of recent steps sent in full to the model,
+                older ones are summarized; None to send the whole conversation
+            context_max_tokens: Estimated token ceiling of each prompt, None
+                for no limit
+            state_resync_every: Send only the state changes since the last
+                step, and the full state every this many steps; None to
+                always send the full state
+            action_policy: Name of the policy choosing each step, one of
+                action_policy.POLICIES
+            policy_seed: Seed of the random choices of local policies
+            policy_max_actions: Steps after which local policies end a test
+            max_plan_steps: Most steps the model may plan at once with the
+                planning policy
+            pipelined: Overlap requesting each next step with sandbox work
+            goal_file: JSON file with the test goals per sandbox, see
+                goals.load_goal_file
+            generate_goals: Ask the model for up to this many goals per
+                sandbox not covered by the goal file, 0 to use the default goal
+            max_parallel: Most explorations running at the same time; above
+                1, each runs its sandbox in a worker process
+            frontier_states: Explore up to this many new distinct states of
+                each sandbox breadth-first without the model, continuing the
+                frontier kept in .wdtbd_cache, and start the goals'
+                explorations from the best frontier states; 0 to start them
+                from scratch
+            frontier_depth: Actions from start after which the breadth-first
+                exploration stops expanding states
+            sandbox_pool_size: Sandboxes of each sandbox directory kept
+                started ahead of the explorations, 0 to start each one when
+                its exploration begins; at most 1 without worker processes
+            record_checkpoints: Record a checkpoint after every action,
+                snapshotting the sandbox when it supports it or runs in a
+                worker process
+            trace_file: JSONL file to write a span per sandbox call, prompt
+                and model request to, None to disable tracing
+            chrome_trace_file: Also write the spans as a Chrome trace-event
+                file, used with trace_file
+        """
+        self.oracle_format = oracle_format
+        self.oracle_token_budget = oracle_token_budget
+        self.oracle_top_k = oracle_top_k
+        self.max_connections = max_connections
+        self.response_cache_mode = response_cache_mode
+        self.response_cache_max_bytes = response_cache_max_bytes
+        self.model = model
+        self.base_url = base_url
+        self.stream = stream
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.context_turns = context_turns
+        self.context_max_tokens = context_max_tokens
+        self.state_resync_every = state_resync_every
+        self.action_policy = action_policy
+        self.policy_seed = policy_seed
+        self.policy_max_actions = policy_max_actions
+        self.max_plan_steps = max_plan_steps
+        self.pipelined = pipelined
+        self.goal_file = goal_file
+        self.generate_goals = generate_goals
+        self.max_parallel = max_parallel
+        self.frontier_states = frontier_states
+        self.frontier_depth = frontier_depth
+        self.sandbox_pool_size = sandbox_pool_size
+        self.record_checkpoints = record_checkpoints
+        self.trace_file = trace_file
+        self.chrome_trace_file = chrome_trace_file
+        
+    def _goals(self, ai_assistant, sandbox) -> List[Dict[str, Any]]:
+        """Goals of a sandbox: from the goal file, generated, or the default."""
+        goals = []
+        if self.goal_file:
+            goals = goals_for(load_goal_file(self.goal_file), sandbox.name)
+        if not goals and self.generate_goals > 0:
+            goals = ai_assistant.generate_goals(sandbox, self.generate_goals)
+        return goals or [DEFAULT_GOAL]
+
+    def _frontier_starts(
+        self,
+        sandbox,
+        oracle_dir: str,
+        use_workers: bool
+    ) -> List[Optional[ExplorationCheckpoint]]:
+        """
+        Explore a sandbox breadth-first and get checkpoints of its best
+        frontier states, [None] to start from scratch. With use_workers, the
+        sandbox runs in a worker process like the explorations.
+        """
+        if self.frontier_states <= 0:
+            return [None]
+        path = get_cache_dir(Path(oracle_dir)) / (
+            sandbox.name + FRONTIER_FILE_SUFFIX
+        )
+        signature = testability_signature(sandbox.testability_dir)
+        instance = sandbox.spawn_worker() if use_workers else sandbox
+        try:
+            explorer = FrontierExplorer(
+                instance,
+                FrontierScheduler.load(path, signature=signature),
+                max_states=self.frontier_states,
+                max_depth=self.frontier_depth
+            )
+            scheduler = explorer.explore()
+        finally:
+            if instance is not sandbox:
+                instance.close()
+        scheduler.save(path, signature=signature)
+        print(f"Breadth-first exploration of {sandbox.name}: {explorer.stats()}")
+        # Snapshots belong to this process, explorations may run in workers
+        return [
+            replace(node.checkpoint(), snapshot_token=None)
+            for node in scheduler.frontier_nodes()
+        ] or [None]
+        
+    def _explore(
+        self,
+        oracle_dir: str
+    ) -> Tuple[List[RegressionTestProposal], List[GoalResult]]:
+        """
+        Explore the goals of every sandbox and collect their proposals and
+        the results of the explorations that failed.
         """
         test_scope = TestScope()
         test_scope.load_test_oracles(oracle_dir)
+        test_oracles = test_scope.get_test_oracles()
+        test_oracles.render_mode = self.oracle_format
+        test_oracles.token_budget = self.oracle_token_budget
+        
+        response_cache = None
+        if self.response_cache_mode != "off":
+            response_cache = ResponseCache(
+                get_cache_dir(Path(oracle_dir)) / CACHE_FILE_NAME,
+                mode=self.response_cache_mode,
+                max_bytes=self.response_cache_max_bytes
+            )
         
         # Initialize OpenAI client with test oracles
         openai_client = AIExploratoryTestAssistant(
-            test_oracles=test_scope.get_test_oracles(),
+            test_oracles=test_oracles,
             api_key=os.getenv('OPENAI_API_KEY'),
-            model="gpt-4o-mini"
+            model=self.model,
+            relevance_index=(
+                test_scope.relevance_index if self.oracle_top_k is not None
+                else None
+            ),
+            relevance_top_k=self.oracle_top_k,
+            max_connections=self.max_connections,
+            response_cache=response_cache,
+            base_url=self.base_url,
+            stream=self.stream,
+            rate_limits=RateLimits(
+                self.requests_per_minute, self.tokens_per_minute
+            ),
+            max_retries=self.max_retries,
+            context_turns=self.context_turns,
+            context_max_tokens=self.context_max_tokens,
+            state_resync_every=self.state_resync_every
+        )
+        
+        action_policy = create_action_policy(
+            self.action_policy,
+            self.policy_seed,
+            self.policy_max_actions,
+            self.max_plan_steps
         )
         
         # Collect all proposals
         all_proposals: List[RegressionTestProposal] = []
+        failures: List[GoalResult] = []
         
-        # Create and run executors for each sandbox
+        # Explore every goal of every sandbox, collecting results as they finish
+        executor = MultiGoalExecutor(
+            openai_client,
+            max_parallel=self.max_parallel,
+            pool_size=self.sandbox_pool_size,
+            record_checkpoints=self.record_checkpoints,
+            action_policy=action_policy,
+            pipelined=self.pipelined,
+            sandbox_config={
+                "environment": "test",
+                "cleanup_enabled": True
+            }
+        )
+        jobs = []
         for sandbox in test_scope.get_testable_sandboxes():
-            executor = (Explorer.create()
-                    .with_sandbox(sandbox, {
-                        "environment": "test",
-                        "cleanup_enabled": True
-                    })
-                    .with_ai_assistant(openai_client)
-                    .build())
-            proposals = executor.explore()
-            all_proposals.extend(proposals)
+            starts = self._frontier_starts(
+                sandbox, oracle_dir, executor.use_workers
+            )
+            jobs.extend(
+                (sandbox, goal, starts[i % len(starts)])
+                for i, goal in enumerate(self._goals(openai_client, sandbox))
+            )
+        for result in executor.run(jobs):
+            if result.error is not None:
+                print(f"Exploration of '{result.goal['title']}' on "
+                      f"{result.sandbox_name} failed: {result.error!r}")
+                failures.append(result)
+                continue
+            print(f"Explored '{result.goal['title']}' on {result.sandbox_name} "
+                  f"in {result.duration:.1f}s")
+            if self.record_checkpoints:
+                snapshots = sum(
+                    1 for checkpoint in result.checkpoints
+                    if checkpoint.snapshot_token is not None
+                )
+                print(f"Recorded {len(result.checkpoints)} checkpoints, "
+                      f"{snapshots} with a sandbox snapshot")
+            all_proposals.extend(result.proposals)
+        print(f"Steps decided by the {self.action_policy} policy: "
+              f"{action_policy.stats()}")
+        return all_proposals, failures
+
+    def run(self, oracle_dir: str) -> None:
+        """
+        Main execution method that runs the test oracles
+        
+        Args:
+            oracle_dir: Directory containing test oracle files
+
+        Raises:
+            RuntimeError: If any exploration failed, after the proposals of
+                the others have been reviewed
+        """
+        with tracing.traced(self.trace_file, self.chrome_trace_file):
+            all_proposals, failures = self._explore(oracle_dir)
         
         # Ask user to confirm each proposal
         for proposal in all_proposals:
@@ -70,4 +336,10 @@ class Application:
                 # Write the test to the appropriate file
                 test_file = regression_dir / f"test_{proposal.sandbox_name}.py"
                 proposal.write_to_file(test_file)
-                print(f"Test written to {test_file}")
\ No newline at end of file
+                print(f"Test written to {test_file}")
+
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} exploration(s) failed, the first on "
+                f"{failures[0].sandbox_name}: '{failures[0].goal['title']}'"
+            ) from failures[0].error
\ No newline at end of file
@@ -0,0 +1,292 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import jsonpath_ng
+
+# Paths such as 'status', 'processes[0].stderr' or '$.user.name.first'
+_SIMPLE_PATH = re.compile(
+    r"^(?:\$\.)?[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*|\[[0-9]+\])*$"
+)
+_PATH_STEP = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)|\[([0-9]+)\]")
+# Identifiers jsonpath_ng parses as keywords rather than field names
+_RESERVED_WORDS = {"where", "wherenot"}
+
+
+class CompiledPath:
+    """
+    A JSON path parsed once and evaluated many times.
+
+    Simple dotted or indexed paths are walked natively over dicts and lists.
+    Any other path, or a value of a type the native walker does not handle,
+    is evaluated with jsonpath_ng so the matches are always the same.
+    """
+
+    __slots__ = ("path", "steps", "_jsonpath")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.steps = self._parse_steps(path)
+        self._jsonpath = None
+
+    @staticmethod
+    def _parse_steps(path: str) -> Optional[Tuple[Union[str, int], ...]]:
+        if not _SIMPLE_PATH.match(path):
+            return None
+        if path.startswith("$."):
+            path = path[2:]
+        steps = []
+        for name, index in _PATH_STEP.findall(path):
+            if name:
+                if name in _RESERVED_WORDS:
+                    return None
+                steps.append(name)
+            else:
+                steps.append(int(index))
+        return tuple(steps)
+
+    @property
+    def is_native(self) -> bool:
+        """Whether the path can be evaluated without jsonpath_ng."""
+        return self.steps is not None
+
+    def find(self, state: Any) -> List[Any]:
+        """
+        Find all values matching the path.
+
+        Args:
+            state: The SUT state to search
+
+        Returns:
+            List of matched values, empty if nothing matched
+        """
+        if self.steps is None:
+            return self._find_with_jsonpath(state)
+        value = state
+        for step in self.steps:
+            if isinstance(step, str):
+                if isinstance(value, dict):
+                    if step not in value:
+                        return []
+                    value = value[step]
+                    continue
+            elif isinstance(value, list):
+                if step >= len(value):
+                    return []
+                value = value[step]
+                continue
+            return self._find_with_jsonpath(state)
+        return [value]
+
+    def _find_with_jsonpath(self, state: Any) -> List[Any]:
+        if self._jsonpath is None:
+            self._jsonpath = jsonpath_ng.parse(self.path)
+        return [match.value for match in self._jsonpath.find(state)]
+
+
+@dataclass
+class AssertionResult:
+    """Outcome of one assertion evaluated in a batch"""
+    action: str
+    parameters: Dict[str, Any]
+    passed: bool
+    error: Optional[Exception] = None
+
+
+@dataclass
+class _PathTrieNode:
+    children: Dict[Union[str, int], '_PathTrieNode'] = field(default_factory=dict)
+    terminals: List[int] = field(default_factory=list)
+
+    def all_terminals(self) -> List[int]:
+        found = list(self.terminals)
+        for child in self.children.values():
+            found.extend(child.all_terminals())
+        return found
+
+
+class AssertionEngine:
+    """
+    Evaluates assert_state assertions with bounded LRU caches of compiled
+    paths and regular expressions.
+    """
+
+    def __init__(self, cache_size: int = 256):
+        """
+        Initialize the engine.
+
+        Args:
+            cache_size: Maximum number of compiled paths and of compiled
+                regular expressions kept
+        """
+        self.compile_path = lru_cache(maxsize=cache_size)(CompiledPath)
+        self.compile_regex = lru_cache(maxsize=cache_size)(re.compile)
+
+    def find(self, sut_state: Any, path: str) -> List[Any]:
+        """Find all values matching a path in the SUT state."""
+        return self.compile_path(path).find(sut_state)
+
+    def find_many(self, sut_state: Any, paths: Sequence[str]) -> List[List[Any]]:
+        """
+        Find the matches of many paths in a single traversal of the state.
+
+        Native paths are merged into a prefix tree so shared prefixes such as
+        'processes[0]' are resolved once.
+
+        Args:
+            sut_state: The SUT state to search
+            paths: JSON paths to resolve
+
+        Returns:
+            List of matched values for each path, in the order given
+        """
+        compiled = [self.compile_path(path) for path in paths]
+        results: List[Optional[List[Any]]] = [None] * len(compiled)
+        root = _PathTrieNode()
+        for i, path in enumerate(compiled):
+            if not path.is_native:
+                results[i] = path.find(sut_state)
+                continue
+            node = root
+            for step in path.steps:
+                node = node.children.setdefault(step, _PathTrieNode())
+            node.terminals.append(i)
+        self._walk(root, sut_state, sut_state, compiled, results)
+        return results
+
+    def _walk(self, node, value, sut_state, compiled, results) -> None:
+        for i in node.terminals:
+            results[i] = [value]
+        for step, child in node.children.items():
+            if isinstance(step, str) and isinstance(value, dict):
+                if step in value:
+                    self._walk(child, value[step], sut_state, compiled, results)
+                    continue
+                for i in child.all_terminals():
+                    results[i] = []
+            elif isinstance(step, int) and isinstance(value, list):
+                if step < len(value):
+                    self._walk(child, value[step], sut_state, compiled, results)
+                    continue
+                for i in child.all_terminals():
+                    results[i] = []
+            else:
+                # Let jsonpath_ng decide for types the walker does not handle
+                for i in child.all_terminals():
+                    results[i] = compiled[i].find(sut_state)
+
+    def evaluate(self, sut_state: Any, assertion_parameters: dict) -> None:
+        """
+        Evaluate an assertion against the SUT state.
+
+        Args:
+            sut_state: The state returned by read_state
+            assertion_parameters: Dictionary with 'path', 'condition' and 'value'
+
+        Raises:
+            AssertionError: If the assertion does not hold
+            ValueError: If the condition is unknown
+        """
+        matches = self.find(sut_state, assertion_parameters['path'])
+        self.check_matches(matches, assertion_parameters)
+
+    def check_matches(self, matches: List[Any], assertion_parameters: dict) -> None:
+        """
+        Check already resolved path matches against an assertion's condition.
+
+        Args:
+            matches: Values found at the assertion's path
+            assertion_parameters: Dictionary with 'path', 'condition' and 'value'
+        """
+        if not matches:
+            raise AssertionError(
+                f"No match found for path: {assertion_parameters['path']}"
+            )
+
+        condition = assertion_parameters['condition']
+        value = assertion_parameters['value']
+        path = assertion_parameters['path']
+
+        for match in matches:
+            if condition == 'equals':
+                if match != value:
+                    raise AssertionError(
+                        f"Expected {value} at {path}, found {match}"
+                    )
+            elif condition == 'not_equals':
+                if match == value:
+                    raise AssertionError(
+                        f"Did not expect {value} at {path}"
+                    )
+            elif condition == 'contains':
+                if value not in match:
+                    raise AssertionError(f"Expected {match} to contain {value}")
+            elif condition == 'not_contains':
+                if value in match:
+                    raise AssertionError(f"Did not expect {match} to contain {value}")
+            elif condition == 'matches_regex':
+                if not self.compile_regex(value).match(match):
+                    raise AssertionError(
+                        f"Value did not match regex pattern.\n"
+                        f"Pattern: {value}\n"
+                        f"Actual output:\n{match}\n"
+                        "Hint: For CLI output, use (?s).* to match across multiple "
+                        "lines"
+                    )
+            else:
+                raise ValueError(f"Unknown condition: {condition}")
+
+    def evaluate_many(
+        self,
+        sut_state: Any,
+        assertions: Sequence[Tuple[str, dict]],
+        collect_all: bool = False
+    ) -> List[AssertionResult]:
+        """
+        Evaluate a batch of assertions against one state snapshot.
+
+        Args:
+            sut_state: The state returned by read_state
+            assertions: (action, parameters) pairs, action being 'assert_state'
+            collect_all: Record every failure instead of raising the first one
+
+        Returns:
+            One AssertionResult per assertion, in the order given
+
+        Raises:
+            AssertionError: On the first failing assertion unless collect_all
+            ValueError: On an unknown assertion type or condition unless
+                collect_all
+        """
+        known = [
+            i for i, (action, _) in enumerate(assertions) if action == "assert_state"
+        ]
+        found = self.find_many(
+            sut_state, [assertions[i][1]['path'] for i in known]
+        )
+        all_matches = dict(zip(known, found))
+
+        results = []
+        for i, (action, parameters) in enumerate(assertions):
+            try:
+                if action != "assert_state":
+                    raise ValueError(f"Unknown assertion type: {action}")
+                self.check_matches(all_matches[i], parameters)
+            except (AssertionError, ValueError) as e:
+                if not collect_all:
+                    raise
+                results.append(AssertionResult(action, parameters, False, e))
+            else:
+                results.append(AssertionResult(action, parameters, True))
+        return results
+
+    def cache_info(self) -> dict:
+        """Get the LRU statistics of the path and regex caches."""
+        return {
+            "paths": self.compile_path.cache_info()._asdict(),
+            "regexes": self.compile_regex.cache_info()._asdict(),
+        }
+
+
+default_engine = AssertionEngine()
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from .assertion_engine import AssertionResult
+from .testable_sandbox import TestableSandbox
+
+# Upper bound on testability functions running at the same time across all
+# AsyncSandbox instances sharing the default executor
+DEFAULT_MAX_SANDBOX_THREADS = 16
+
+_default_executor: Optional[ThreadPoolExecutor] = None
+_default_executor_lock = threading.Lock()
+
+
+def get_sandbox_executor() -> ThreadPoolExecutor:
+    """Get the bounded executor shared by AsyncSandbox instances by default."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(
+                max_workers=DEFAULT_MAX_SANDBOX_THREADS,
+                thread_name_prefix="sandbox-io",
+            )
+        return _default_executor
+
+
+class AsyncSandbox:
+    """
+    Asyncio interface to a sandbox.
+
+    Testability functions are blocking, so every call is offloaded to a
+    bounded executor. Calls on the same sandbox are serialized, while calls on
+    different sandboxes run concurrently up to the executor's size.
+    """
+
+    def __init__(
+        self,
+        sandbox: TestableSandbox,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Wrap a sandbox.
+
+        Args:
+            sandbox: TestableSandbox, SandboxWorker or PooledSandbox to drive
+            executor: Executor running the blocking calls, defaults to the
+                shared one from get_sandbox_executor()
+        """
+        self.sandbox = sandbox
+        self.executor = executor or get_sandbox_executor()
+        self._lock = asyncio.Lock()
+
+    @property
+    def name(self) -> str:
+        """Get the name of the wrapped sandbox."""
+        return self.sandbox.name
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Run a blocking function that uses the sandbox on the executor.
+
+        Args:
+            func: Function to call
+            *args: Arguments passed to func
+
+        Returns:
+            The function's result
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def start(self) -> dict:
+        """Asyncio counterpart of TestableSandbox.start"""
+        return await self.run(self.sandbox.start)
+
+    async def execute_action(
+        self,
+        action_name: str,
+        parameters: Optional[dict] = None
+    ) -> dict:
+        """Asyncio counterpart of TestableSandbox.execute_action"""
+        return await self.run(self.sandbox.execute_action, action_name, parameters)
+
+    async def read_state(self) -> dict:
+        """Asyncio counterpart of TestableSandbox.read_state"""
+        return await self.run(self.sandbox.read_state)
+
+    async def teardown(self) -> None:
+        """Asyncio counterpart of TestableSandbox.teardown"""
+        return await self.run(self.sandbox.teardown)
+
+    async def execute_assertion(
+        self,
+        action: str,
+        parameters: dict,
+        current_state: dict,
+    ) -> bool:
+        """Asyncio counterpart of TestableSandbox.execute_assertion"""
+        return await self.run(
+            self.sandbox.execute_assertion, action, parameters, current_state
+        )
+
+    async def execute_assertions(
+        self,
+        assertions: Sequence[Tuple[str, dict]],
+        current_state: Optional[dict] = None,
+        collect_all: bool = False,
+    ) -> List[AssertionResult]:
+        """Asyncio counterpart of TestableSandbox.execute_assertions"""
+        return await self.run(
+            self.sandbox.execute_assertions, assertions, current_state, collect_all
+        )
@@ -1,5 +1,11 @@
 import argparse
+from .AiAssistant.openai_transport import DEFAULT_MAX_CONNECTIONS
+from .AiAssistant.response_cache import CACHE_MODES
+from .AiAssistant.state_delta import DEFAULT_RESYNC_EVERY
+from .action_policy import DEFAULT_MAX_ACTIONS, DEFAULT_MAX_PLAN_STEPS, POLICIES
 from .application import Application
+from .frontier_explorer import DEFAULT_MAX_DEPTH
+from .test_oracles import RENDER_MODES
 
 class CommandLineApplication:
     def __init__(self):
@@ -10,12 +16,233 @@ class CommandLineApplication:
             'oracle_dir',
             help='Directory containing test oracle files'
         )
+        self.parser.add_argument(
+            '--model',
+            default='gpt-4o-mini',
+            help='Model used for the explorations'
+        )
+        self.parser.add_argument(
+            '--base-url',
+            default=None,
+            help='Base URL of an OpenAI-compatible API, e.g. the local stand-in '
+                 'server'
+        )
+        self.parser.add_argument(
+            '--stream',
+            action='store_true',
+            help='Stream model responses and run each action as soon as its '
+                 'tool call is complete'
+        )
+        self.parser.add_argument(
+            '--goals',
+            default=None,
+            help='JSON file with the test goals, a list for every sandbox or an '
+                 'object by sandbox name'
+        )
+        self.parser.add_argument(
+            '--generate-goals',
+            type=int,
+            default=0,
+            help='Ask the model for up to N goals per sandbox without goals in '
+                 'the goal file'
+        )
+        self.parser.add_argument(
+            '--parallel',
+            type=int,
+            default=1,
+            help='Explorations running at the same time, each with its own '
+                 'sandbox worker process'
+        )
+        self.parser.add_argument(
+            '--sandbox-pool',
+            type=int,
+            default=0,
+            help='Keep N sandboxes per sandbox directory started ahead of the '
+                 'explorations (at most 1 without --parallel)'
+        )
+        self.parser.add_argument(
+            '--record-checkpoints',
+            action='store_true',
+            help='Record a checkpoint after every action, snapshotting the '
+                 'sandbox when it supports snapshots'
+        )
+        self.parser.add_argument(
+            '--pipelined',
+            action='store_true',
+            help='Request the next step while the sandbox is still busy with '
+                 'assertions and checkpoints'
+        )
+        self.parser.add_argument(
+            '--frontier-states',
+            type=int,
+            default=0,
+            help='Explore up to N new distinct states per sandbox breadth-first '
+                 'without the model, then start the goals from the frontier'
+        )
+        self.parser.add_argument(
+            '--frontier-depth',
+            type=int,
+            default=DEFAULT_MAX_DEPTH,
+            help='Actions from start after which the breadth-first '
+                 'exploration stops expanding states'
+        )
+        self.parser.add_argument(
+            '--trace',
+            default=None,
+            help='Write a JSONL span per sandbox call, prompt and model '
+                 'request to this file'
+        )
+        self.parser.add_argument(
+            '--chrome-trace',
+            default=None,
+            help='Also write the spans as a Chrome trace-event file, for '
+                 'chrome://tracing or Perfetto'
+        )
+        self.parser.add_argument(
+            '--policy',
+            choices=POLICIES,
+            default='llm',
+            help='How each step is chosen: by the model, locally at random or '
+                 'by least visited action, by the model except for forced '
+                 'moves, or by plans of several steps from the model'
+        )
+        self.parser.add_argument(
+            '--policy-seed',
+            type=int,
+            default=None,
+            help='Seed of the random choices of the local policies'
+        )
+        self.parser.add_argument(
+            '--policy-max-actions',
+            type=int,
+            default=DEFAULT_MAX_ACTIONS,
+            help='Steps after which the local policies end a test'
+        )
+        self.parser.add_argument(
+            '--plan-steps',
+            type=int,
+            default=DEFAULT_MAX_PLAN_STEPS,
+            help='Most steps the model may plan at once with --policy planning'
+        )
+        self.parser.add_argument(
+            '--requests-per-minute',
+            type=float,
+            default=None,
+            help='Request rate limit of the model, learned from response '
+                 'headers if not given'
+        )
+        self.parser.add_argument(
+            '--tokens-per-minute',
+            type=float,
+            default=None,
+            help='Token rate limit of the model, learned from response '
+                 'headers if not given'
+        )
+        self.parser.add_argument(
+            '--max-retries',
+            type=int,
+            default=5,
+            help='Retries of rate limited or failed model requests'
+        )
+        self.parser.add_argument(
+            '--context-turns',
+            type=int,
+            default=None,
+            help='Send only the last N steps in full and summarize older ones'
+        )
+        self.parser.add_argument(
+            '--context-max-tokens',
+            type=int,
+            default=None,
+            help='Estimated token ceiling of each prompt sent to the model'
+        )
+        self.parser.add_argument(
+            '--state-delta',
+            action='store_true',
+            help='Send only what changed in the system state since the last step; '
+                 'with --context-max-tokens, the full state is sent again when '
+                 'the ceiling folds away the last one'
+        )
+        self.parser.add_argument(
+            '--state-resync-every',
+            type=int,
+            default=DEFAULT_RESYNC_EVERY,
+            help='With --state-delta, send the full state every N steps'
+        )
+        self.parser.add_argument(
+            '--oracle-format',
+            choices=RENDER_MODES,
+            default='json',
+            help='How test oracles are rendered into the prompt'
+        )
+        self.parser.add_argument(
+            '--oracle-token-budget',
+            type=int,
+            default=None,
+            help='Estimated token budget for the rendered test oracles'
+        )
+        self.parser.add_argument(
+            '--oracle-top-k',
+            type=int,
+            default=None,
+            help='Send each sandbox only the K most relevant oracle sections'
+        )
+        self.parser.add_argument(
+            '--max-connections',
+            type=int,
+            default=DEFAULT_MAX_CONNECTIONS,
+            help='Size of the OpenAI connection pool shared by all explorations'
+        )
+        self.parser.add_argument(
+            '--response-cache',
+            choices=CACHE_MODES,
+            default='off',
+            help='Record and replay model responses; replay-only fails on a miss'
+        )
+        self.parser.add_argument(
+            '--response-cache-max-mb',
+            type=int,
+            default=256,
+            help='Evict least recently used cached responses above this size'
+        )
 
     def run(self):
         """Run the command line application"""
         try:
             args = self.parser.parse_args()
-            app = Application()
+            app = Application(
+                oracle_format=args.oracle_format,
+                oracle_token_budget=args.oracle_token_budget,
+                oracle_top_k=args.oracle_top_k,
+                max_connections=args.max_connections,
+                response_cache_mode=args.response_cache,
+                response_cache_max_bytes=args.response_cache_max_mb * 1024 * 1024,
+                model=args.model,
+                base_url=args.base_url,
+                stream=args.stream,
+                requests_per_minute=args.requests_per_minute,
+                tokens_per_minute=args.tokens_per_minute,
+                max_retries=args.max_retries,
+                context_turns=args.context_turns,
+                context_max_tokens=args.context_max_tokens,
+                state_resync_every=(
+                    args.state_resync_every if args.state_delta else None
+                ),
+                action_policy=args.policy,
+                policy_seed=args.policy_seed,
+                policy_max_actions=args.policy_max_actions,
+                max_plan_steps=args.plan_steps,
+                pipelined=args.pipelined,
+                goal_file=args.goals,
+                generate_goals=args.generate_goals,
+                max_parallel=args.parallel,
+                frontier_states=args.frontier_states,
+                frontier_depth=args.frontier_depth,
+                sandbox_pool_size=args.sandbox_pool,
+                record_checkpoints=args.record_checkpoints,
+                trace_file=args.trace,
+                chrome_trace_file=args.chrome_trace
+            )
             app.run(args.oracle_dir)
         except Exception:
             import traceback
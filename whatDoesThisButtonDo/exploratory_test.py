@@ -1,10 +1,35 @@
-from typing import TYPE_CHECKING
-from .testable_sandbox import TestableSandbox
-from .regression_test_proposal import RegressionTestProposal
+import asyncio
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from .action_policy import ActionPolicy, LLMPolicy
+from .async_sandbox import AsyncSandbox
+from .goals import DEFAULT_GOAL
+from .testable_sandbox import SnapshotNotSupportedError, TestableSandbox
+from .regression_test_proposal import RegressionTestProposal, TestStep
+from .stage_timer import StageTimer
 
 if TYPE_CHECKING:
     from . import AIExploratoryTestAssistant
 
+
+@dataclass
+class ExplorationCheckpoint:
+    """A point in an exploration that a new exploration can continue from"""
+    steps: List[TestStep]
+    possible_next_actions: Dict[str, Dict[str, Any]]
+    current_state: Dict[str, Any]
+    snapshot_token: Any = None
+
+    @property
+    def action_count(self) -> int:
+        """Number of sandbox actions needed to replay this checkpoint"""
+        return sum(
+            1 for step in self.steps
+            if step.tool_call != "assertion_for_regression"
+        )
+
+
 class ExploratoryTest:
     """
     Handles exploratory testing of a sandbox environment using AI assistance
@@ -13,7 +38,11 @@ class ExploratoryTest:
     def __init__(
         self, 
         testable_sandbox: TestableSandbox, 
-        ai_assistant: 'AIExploratoryTestAssistant'
+        ai_assistant: 'AIExploratoryTestAssistant',
+        record_checkpoints: bool = False,
+        action_policy: Optional[ActionPolicy] = None,
+        pipelined: bool = False,
+        goal: Optional[Dict[str, Any]] = None
     ):
         """
         Initialize ExploratoryTest with a sandbox and AI assistant
@@ -21,91 +50,94 @@ class ExploratoryTest:
         Args:
             testable_sandbox: The sandbox environment to explore
             ai_assistant: AI assistant to help guide the exploration
+            record_checkpoints: Record an ExplorationCheckpoint after every
+                action, snapshotting the sandbox when it supports it
+            action_policy: Chooses each step, defaults to asking the AI
+                assistant every time
+            pipelined: Overlap requesting the next step with sandbox work;
+                execute then runs execute_async on an event loop
+            goal: Test goal with 'title' and 'description', defaults to
+                DEFAULT_GOAL
         """
         self.testable_sandbox = testable_sandbox
         self.ai_assistant = ai_assistant
-        self.goal = {
-            "title": "start cli with no parameter should receive helpful message",
-            "description": (
-                "Verify that when the CLI is started without any parameters, "
-                "it displays a helpful message to remind the user that a "
-                "oracle_dir is required."
-            )
-        }
+        self.record_checkpoints = record_checkpoints
+        self.action_policy = action_policy or LLMPolicy()
+        self.pipelined = pipelined
+        self.stage_timer = StageTimer()
+        self.checkpoints: List[ExplorationCheckpoint] = []
+        self.replay_steps_saved = 0
+        self.max_steps = 100
+        self.goal = goal or DEFAULT_GOAL
         self.regression_proposal = RegressionTestProposal(
             sandbox_name=testable_sandbox.name,
             test_title=self.goal["title"],
             test_description=self.goal["description"]
         )
         
-    def execute(self) -> RegressionTestProposal:
+    def execute(
+        self,
+        from_checkpoint: Optional[ExplorationCheckpoint] = None
+    ) -> RegressionTestProposal:
         """
         Executes the exploratory testing process and returns a regression test proposal
         
+        Args:
+            from_checkpoint: Continue from a checkpoint of an earlier exploration
+                instead of starting the sandbox from scratch
+        
         Returns:
             RegressionTestProposal containing the test steps and results
         """
+        if self.pipelined:
+            return asyncio.run(self._execute_on_own_loop(from_checkpoint))
         try:
             # Create an AI assistant thread for this test execution
-            ai_thread = self.ai_assistant.create_test_execution_thread(self.goal)
+            ai_thread = self.ai_assistant.create_test_execution_thread(
+                self.goal, sandbox=self.testable_sandbox
+            )
             
-            possible_next_actions = self.testable_sandbox.start()
-            current_state = {
-                "status": "started",
-                "message_to_ai": "Please select the first action."
-            }
+            if from_checkpoint:
+                possible_next_actions, current_state = self._resume(
+                    from_checkpoint, ai_thread
+                )
+            else:
+                possible_next_actions = self.testable_sandbox.start()
+                current_state = self._initial_state()
             
             step_count = 0
-            max_steps = 100
             
             while True:
                 step_count += 1
-                if step_count > max_steps:
-                    raise RuntimeError(
-                        f"Test exceeded maximum number of steps ({max_steps}). "
-                        "Possible infinite loop detected."
-                    )
+                self._check_step_limit(step_count)
                 
-                # Get AI's chosen action and parameters using the thread
-                ai_tool_call_name, action_choice = ai_thread.get_next_action(
-                    possible_next_actions,
-                    current_state
-                )
+                # Get the chosen action and parameters from the policy
+                with self.stage_timer.stage("choose"):
+                    ai_tool_call_name, action_choice = self.action_policy.choose(
+                        ai_thread,
+                        possible_next_actions,
+                        current_state,
+                        step_count
+                    )
                 
                 # Handle test_done function
                 if ai_tool_call_name == "test_done":
-                    print(f"Test completed - Result: {action_choice['result']}")
-                    print(f"Conclusion: {action_choice['conclusion']}")
-                    self.regression_proposal.test_result = action_choice['result']
-                    self.regression_proposal.test_conclusion = (
-                        action_choice['conclusion']
-                    )
-                    break
-                
-                # Record the action in the proposal
-                self.regression_proposal.add_step(
-                    ai_tool_call_name,
-                    action_choice["action"],
-                    action_choice.get("parameters")
-                )
-                
-                # If AI decides to stop testing, break the loop
-                if action_choice is None:
+                    self._conclude(action_choice)
                     break
                 
-                print(f"Tool Call: {ai_tool_call_name}")
-                print(f"Action: {action_choice}")
+                self._record_choice(ai_tool_call_name, action_choice)
 
                 # Execute the chosen action in the sandbox
                 parameters = action_choice.get("parameters", None)
                 
                 if ai_tool_call_name == "assertion_for_regression":
                     # Execute the assertion check
-                    self.testable_sandbox.execute_assertion(
-                        action_choice["action"],
-                        action_choice.get("parameters", {}),
-                        current_state
-                    )
+                    with self.stage_timer.stage("assertion"):
+                        self.testable_sandbox.execute_assertion(
+                            action_choice["action"],
+                            action_choice.get("parameters", {}),
+                            current_state
+                        )
                     # Report assertion success
                     ai_thread.action_executed(
                         ai_tool_call_name,
@@ -114,21 +146,289 @@ class ExploratoryTest:
                     )
                 else:
                     # Execute regular action and update possible next actions
-                    possible_next_actions = self.testable_sandbox.execute_action(
-                        action_choice["action"],
-                        parameters
+                    with self.stage_timer.stage("action"):
+                        possible_next_actions = self.testable_sandbox.execute_action(
+                            action_choice["action"],
+                            parameters
+                        )
+                        # Read and print the current state after the action
+                        current_state = self.testable_sandbox.read_state()
+                    self._action_done(
+                        ai_thread, ai_tool_call_name, action_choice, current_state
                     )
-                    # Read and print the current state after the action
-                    current_state = self.testable_sandbox.read_state()
-                    ai_thread.action_executed(
-                        ai_tool_call_name, 
-                        action_choice, 
-                        current_state.get("status", None)
-                    )
-                    print("Current state:", current_state)
+                    if self.record_checkpoints:
+                        with self.stage_timer.stage("checkpoint"):
+                            self._record_checkpoint(
+                                possible_next_actions, current_state
+                            )
                 
+            self._report_replay_savings()
             return self.regression_proposal
             
         finally:
             # Ensure teardown is called even if an exception occurs
-            self.testable_sandbox.teardown()
\ No newline at end of file
+            self.testable_sandbox.teardown()
+
+    async def execute_async(
+        self,
+        from_checkpoint: Optional[ExplorationCheckpoint] = None,
+        sandbox_executor: Optional[Executor] = None
+    ) -> RegressionTestProposal:
+        """
+        Asyncio counterpart of execute. Sandbox calls run on a bounded executor
+        so one event loop can drive many explorations at once.
+        
+        When pipelined, the next step is requested as soon as the state it
+        depends on is known: while an assertion is checked, since assertions
+        do not change the state, and while a checkpoint is recorded.
+        
+        Args:
+            from_checkpoint: Continue from a checkpoint of an earlier exploration
+            sandbox_executor: Executor for the blocking sandbox calls, defaults
+                to the shared one from get_sandbox_executor()
+        
+        Returns:
+            RegressionTestProposal containing the test steps and results
+        """
+        sandbox = AsyncSandbox(self.testable_sandbox, sandbox_executor)
+        next_choice: Optional[asyncio.Future] = None
+        try:
+            ai_thread = self.ai_assistant.create_test_execution_thread(
+                self.goal, sandbox=self.testable_sandbox
+            )
+            
+            if from_checkpoint:
+                possible_next_actions, current_state = await sandbox.run(
+                    self._resume, from_checkpoint, ai_thread
+                )
+            else:
+                possible_next_actions = await sandbox.start()
+                current_state = self._initial_state()
+            
+            step_count = 0
+            
+            while True:
+                step_count += 1
+                self._check_step_limit(step_count)
+                
+                if next_choice is None:
+                    next_choice = self._request_choice(
+                        ai_thread, possible_next_actions, current_state, step_count
+                    )
+                ai_tool_call_name, action_choice = await next_choice
+                next_choice = None
+                
+                if ai_tool_call_name == "test_done":
+                    self._conclude(action_choice)
+                    break
+                
+                self._record_choice(ai_tool_call_name, action_choice)
+                
+                if ai_tool_call_name == "assertion_for_regression":
+                    if self.pipelined:
+                        # A failed assertion ends the exploration, so the next
+                        # step can be requested before the check completes
+                        ai_thread.action_executed(
+                            ai_tool_call_name,
+                            action_choice,
+                            "assertion passed"
+                        )
+                        next_choice = self._request_choice(
+                            ai_thread,
+                            possible_next_actions,
+                            current_state,
+                            step_count + 1
+                        )
+                    with self.stage_timer.stage("assertion"):
+                        await sandbox.execute_assertion(
+                            action_choice["action"],
+                            action_choice.get("parameters", {}),
+                            current_state
+                        )
+                    if not self.pipelined:
+                        ai_thread.action_executed(
+                            ai_tool_call_name,
+                            action_choice,
+                            "assertion passed"
+                        )
+                else:
+                    with self.stage_timer.stage("action"):
+                        if self.pipelined:
+                            # Read the state in the same executor call
+                            possible_next_actions, current_state = await sandbox.run(
+                                self._execute_and_read,
+                                action_choice["action"],
+                                action_choice.get("parameters", None)
+                            )
+                        else:
+                            possible_next_actions = await sandbox.execute_action(
+                                action_choice["action"],
+                                action_choice.get("parameters", None)
+                            )
+                            current_state = await sandbox.read_state()
+                    self._action_done(
+                        ai_thread, ai_tool_call_name, action_choice, current_state
+                    )
+                    if self.pipelined:
+                        next_choice = self._request_choice(
+                            ai_thread,
+                            possible_next_actions,
+                            current_state,
+                            step_count + 1
+                        )
+                    if self.record_checkpoints:
+                        with self.stage_timer.stage("checkpoint"):
+                            await sandbox.run(
+                                self._record_checkpoint,
+                                possible_next_actions,
+                                current_state
+                            )
+                
+            self._report_replay_savings()
+            if self.pipelined:
+                print(self.stage_timer.report())
+            return self.regression_proposal
+            
+        finally:
+            if next_choice is not None:
+                next_choice.cancel()
+            await sandbox.teardown()
+
+    async def _execute_on_own_loop(
+        self,
+        from_checkpoint: Optional[ExplorationCheckpoint]
+    ) -> RegressionTestProposal:
+        # The backend's asyncio client of this loop dies with it; let streams
+        # finish draining, then close its connections
+        try:
+            return await self.execute_async(from_checkpoint)
+        finally:
+            pending = asyncio.all_tasks() - {asyncio.current_task()}
+            await asyncio.gather(*pending, return_exceptions=True)
+            await self.ai_assistant.aclose_loop()
+
+    def _request_choice(
+        self, ai_thread, possible_next_actions, current_state, step_count
+    ) -> asyncio.Future:
+        async def choose():
+            with self.stage_timer.stage("choose"):
+                return await self.action_policy.choose_async(
+                    ai_thread, possible_next_actions, current_state, step_count
+                )
+        return asyncio.ensure_future(choose())
+
+    def _execute_and_read(self, action: str, parameters: Optional[dict]):
+        possible_next_actions = self.testable_sandbox.execute_action(
+            action, parameters
+        )
+        return possible_next_actions, self.testable_sandbox.read_state()
+
+    @staticmethod
+    def _initial_state() -> Dict[str, Any]:
+        return {
+            "status": "started",
+            "message_to_ai": "Please select the first action."
+        }
+
+    def _check_step_limit(self, step_count: int) -> None:
+        if step_count > self.max_steps:
+            raise RuntimeError(
+                f"Test exceeded maximum number of steps ({self.max_steps}). "
+                "Possible infinite loop detected."
+            )
+
+    def _conclude(self, action_choice: Dict[str, Any]) -> None:
+        print(f"Test completed - Result: {action_choice['result']}")
+        print(f"Conclusion: {action_choice['conclusion']}")
+        self.regression_proposal.test_result = action_choice['result']
+        self.regression_proposal.test_conclusion = action_choice['conclusion']
+
+    def _record_choice(
+        self,
+        ai_tool_call_name: str,
+        action_choice: Dict[str, Any]
+    ) -> None:
+        # Record the action in the proposal
+        self.regression_proposal.add_step(
+            ai_tool_call_name,
+            action_choice["action"],
+            action_choice.get("parameters")
+        )
+        print(f"Tool Call: {ai_tool_call_name}")
+        print(f"Action: {action_choice}")
+
+    @staticmethod
+    def _action_done(ai_thread, ai_tool_call_name, action_choice, current_state):
+        ai_thread.action_executed(
+            ai_tool_call_name, 
+            action_choice, 
+            current_state.get("status", None)
+        )
+        print("Current state:", current_state)
+
+    def _report_replay_savings(self) -> None:
+        if self.replay_steps_saved:
+            print(
+                f"Restored from snapshot, saved {self.replay_steps_saved} "
+                "replay steps"
+            )
+
+    def _record_checkpoint(
+        self,
+        possible_next_actions: Dict[str, Dict[str, Any]],
+        current_state: Dict[str, Any]
+    ) -> None:
+        snapshot_token = None
+        if getattr(self.testable_sandbox, "supports_snapshot", False):
+            try:
+                snapshot_token = self.testable_sandbox.snapshot()
+            except SnapshotNotSupportedError:
+                pass
+        self.checkpoints.append(ExplorationCheckpoint(
+            steps=list(self.regression_proposal.steps),
+            possible_next_actions=possible_next_actions,
+            current_state=current_state,
+            snapshot_token=snapshot_token
+        ))
+
+    def release_checkpoints(self) -> None:
+        """
+        Free the sandbox snapshots of the recorded checkpoints and forget the
+        checkpoints, once no exploration will continue from them.
+        """
+        checkpoints, self.checkpoints = self.checkpoints, []
+        release = getattr(self.testable_sandbox, "release_snapshot", None)
+        if release is None:
+            return
+        for checkpoint in checkpoints:
+            if checkpoint.snapshot_token is not None:
+                release(checkpoint.snapshot_token)
+
+    def _resume(self, checkpoint: ExplorationCheckpoint, ai_thread):
+        """
+        Bring the sandbox to a checkpoint, restoring its snapshot if it has one
+        and otherwise replaying its actions from start.
+        """
+        restored = False
+        if checkpoint.snapshot_token is not None:
+            try:
+                self.testable_sandbox.restore(checkpoint.snapshot_token)
+                restored = True
+                self.replay_steps_saved += checkpoint.action_count
+            except ValueError:
+                # The snapshot has been released, e.g. evicted by a worker
+                pass
+        if not restored:
+            self.testable_sandbox.start()
+            for step in checkpoint.steps:
+                if step.tool_call != "assertion_for_regression":
+                    self.testable_sandbox.execute_action(step.action, step.parameters)
+
+        self.regression_proposal.steps = list(checkpoint.steps)
+        for step in checkpoint.steps:
+            ai_thread.action_executed(
+                step.tool_call,
+                {"action": step.action, "parameters": step.parameters},
+                "replayed from checkpoint"
+            )
+        return checkpoint.possible_next_actions, checkpoint.current_state
@@ -1,6 +1,10 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional
 
 from whatDoesThisButtonDo.testable_sandbox import TestableSandbox
+from .action_policy import ActionPolicy
+from .exploratory_test import ExplorationCheckpoint
+from .sandbox_pool import SandboxPool
 from .exploratory_test import ExploratoryTest
 from whatDoesThisButtonDo.AiAssistant.ai_exploratory_test_assistant import (
     AIExploratoryTestAssistant
@@ -15,8 +19,14 @@ class ExplorerFactory:
     
     def __init__(self):
         self._testable_sandbox = None
+        self._sandbox_pool = None
         self._sandbox_config: Dict[str, Any] = {}
         self._ai_assistant = None
+        self._action_policy = None
+        self._pipelined = False
+        self._goal = None
+        self._checkpoint = None
+        self._record_checkpoints = False
         
     def with_sandbox(self, 
                     testable_sandbox: TestableSandbox, 
@@ -24,6 +34,15 @@ class ExplorerFactory:
         self._testable_sandbox = testable_sandbox
         self._sandbox_config = config or {}
         return self
+
+    def with_sandbox_pool(
+        self,
+        sandbox_pool: SandboxPool,
+        config: Dict[str, Any] = None
+    ) -> 'ExplorerFactory':
+        self._sandbox_pool = sandbox_pool
+        self._sandbox_config = config or {}
+        return self
         
     def with_ai_assistant(
         self, 
@@ -31,9 +50,35 @@ class ExplorerFactory:
     ) -> 'ExplorerFactory':
         self._ai_assistant = ai_assistant
         return self
+
+    def with_action_policy(
+        self,
+        action_policy: ActionPolicy
+    ) -> 'ExplorerFactory':
+        self._action_policy = action_policy
+        return self
+
+    def with_pipelining(self, pipelined: bool = True) -> 'ExplorerFactory':
+        self._pipelined = pipelined
+        return self
+
+    def with_goal(self, goal: Dict[str, Any]) -> 'ExplorerFactory':
+        self._goal = goal
+        return self
+
+    def with_checkpoint(
+        self,
+        checkpoint: Optional[ExplorationCheckpoint]
+    ) -> 'ExplorerFactory':
+        self._checkpoint = checkpoint
+        return self
+
+    def with_checkpoint_recording(self, record: bool = True) -> 'ExplorerFactory':
+        self._record_checkpoints = record
+        return self
         
     def build(self) -> 'Explorer':
-        if not self._testable_sandbox:
+        if not self._testable_sandbox and not self._sandbox_pool:
             raise ValueError("Testable sandbox must be configured before building")
             
         if not self._ai_assistant:
@@ -42,7 +87,13 @@ class ExplorerFactory:
         return Explorer(
             self._testable_sandbox, 
             self._sandbox_config, 
-            self._ai_assistant
+            self._ai_assistant,
+            sandbox_pool=self._sandbox_pool,
+            action_policy=self._action_policy,
+            pipelined=self._pipelined,
+            goal=self._goal,
+            checkpoint=self._checkpoint,
+            record_checkpoints=self._record_checkpoints
         )
 
 class Explorer:
@@ -53,9 +104,15 @@ class Explorer:
     
     def __init__(
         self, 
-        testable_sandbox: TestableSandbox, 
+        testable_sandbox: Optional[TestableSandbox], 
         config: Dict[str, Any],
-        ai_assistant: AIExploratoryTestAssistant
+        ai_assistant: AIExploratoryTestAssistant,
+        sandbox_pool: Optional[SandboxPool] = None,
+        action_policy: Optional[ActionPolicy] = None,
+        pipelined: bool = False,
+        goal: Optional[Dict[str, Any]] = None,
+        checkpoint: Optional[ExplorationCheckpoint] = None,
+        record_checkpoints: bool = False
     ):
         """
         Initialize Executor with a testable sandbox and AI assistant.
@@ -64,10 +121,28 @@ class Explorer:
             testable_sandbox: TestableSandbox instance
             config: Configuration parameters for the sandbox
             ai_assistant: OpenAITestGenerator instance for test generation
+            sandbox_pool: Optional pool to lease a pre-warmed sandbox from for
+                each exploration instead of using testable_sandbox
+            action_policy: Chooses the steps of the explorations, None to ask
+                the AI assistant for every step
+            pipelined: Overlap requesting each next step with sandbox work
+            goal: Test goal to explore, None for the default goal
+            checkpoint: Continue from this point, e.g. a frontier node,
+                instead of starting the sandbox from scratch
+            record_checkpoints: Record a checkpoint after every action, see
+                checkpoints
         """
         self.testable_sandbox = testable_sandbox
         self.config = config
         self.ai_assistant = ai_assistant
+        self.sandbox_pool = sandbox_pool
+        self.action_policy = action_policy
+        self.pipelined = pipelined
+        self.goal = goal
+        self.checkpoint = checkpoint
+        self.record_checkpoints = record_checkpoints
+        # Checkpoints of the last exploration, for explorations to branch from
+        self.checkpoints: List[ExplorationCheckpoint] = []
         
     @classmethod
     def create(cls) -> ExplorerFactory:
@@ -86,10 +161,43 @@ class Explorer:
         Returns:
             List of RegressionTestProposal objects
         """
+        sandbox = (
+            self.sandbox_pool.acquire() if self.sandbox_pool
+            else self.testable_sandbox
+        )
+        exploratory_test = ExploratoryTest(
+            sandbox, 
+            self.ai_assistant,
+            action_policy=self.action_policy,
+            record_checkpoints=self.record_checkpoints,
+            pipelined=self.pipelined,
+            goal=self.goal
+        )
+        proposal = exploratory_test.execute(self.checkpoint)
+        self.checkpoints = exploratory_test.checkpoints
+        return [proposal]
+
+    async def explore_async(self) -> List[RegressionTestProposal]:
+        """
+        Asyncio counterpart of explore
+        
+        Returns:
+            List of RegressionTestProposal objects
+        """
+        if self.sandbox_pool:
+            loop = asyncio.get_running_loop()
+            sandbox = await loop.run_in_executor(None, self.sandbox_pool.acquire)
+        else:
+            sandbox = self.testable_sandbox
         exploratory_test = ExploratoryTest(
-            self.testable_sandbox, 
-            self.ai_assistant
+            sandbox, 
+            self.ai_assistant,
+            action_policy=self.action_policy,
+            record_checkpoints=self.record_checkpoints,
+            pipelined=self.pipelined,
+            goal=self.goal
         )
-        proposal = exploratory_test.execute()
+        proposal = await exploratory_test.execute_async(self.checkpoint)
+        self.checkpoints = exploratory_test.checkpoints
         return [proposal]
         
\ No newline at end of file
@@ -0,0 +1,459 @@
+import heapq
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .action_policy import state_fingerprint
+from .exploratory_test import ExplorationCheckpoint
+from .regression_test_proposal import TestStep
+from .testable_sandbox import SnapshotNotSupportedError, TestableSandbox
+
+DEFAULT_MAX_STATES = 50
+DEFAULT_MAX_DEPTH = 10
+FRONTIER_FILE_SUFFIX = ".frontier.json"
+_FRONTIER_VERSION = 1
+
+
+def testability_signature(testability_dir: Path) -> Dict[str, List[int]]:
+    """
+    Identify the version of a sandbox's testability files, so a frontier
+    saved for other files is not continued.
+
+    Args:
+        testability_dir: Testability directory of the sandbox
+
+    Returns:
+        Modification time in nanoseconds and size of each file, by name
+    """
+    signature = {}
+    for path in sorted(Path(testability_dir).iterdir()):
+        if path.is_file():
+            stat = path.stat()
+            signature[path.name] = [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+
+@dataclass
+class FrontierNode:
+    """A distinct state reached by the frontier exploration, and how"""
+    fingerprint: str
+    depth: int
+    steps: List[TestStep]
+    possible_actions: Dict[str, Dict[str, Any]]
+    state: Dict[str, Any]
+    snapshot_token: Any = field(default=None, repr=False)
+    # False once replaying its steps led to another state
+    reachable: bool = True
+
+    def checkpoint(self) -> ExplorationCheckpoint:
+        """Checkpoint an exploration can continue from, see ExploratoryTest."""
+        return ExplorationCheckpoint(
+            steps=list(self.steps),
+            possible_next_actions=self.possible_actions,
+            current_state=self.state,
+            snapshot_token=self.snapshot_token
+        )
+
+
+class FrontierScheduler:
+    """
+    Keeps the distinct states of a sandbox and a priority queue of the
+    (state, action) pairs not tried yet.
+
+    States are identified by state_fingerprint, so a state reached again by
+    another path is not explored twice. Lower scores are tried first: each
+    level of depth adds depth_weight, and an action tried n times before
+    anywhere in the sandbox subtracts novelty_weight / (n + 1). Scores only
+    grow as actions are tried, so they are updated when a pair is popped.
+    States that cannot be reached again are marked unreachable and neither
+    expanded nor offered as checkpoints.
+    """
+
+    def __init__(self, novelty_weight: float = 1.0, depth_weight: float = 1.0):
+        """
+        Args:
+            novelty_weight: Weight of trying actions tried least often
+            depth_weight: Weight of trying shallow states first
+        """
+        self.novelty_weight = novelty_weight
+        self.depth_weight = depth_weight
+        self.nodes: Dict[str, FrontierNode] = {}
+        self.action_tries: Counter = Counter()
+        self.duplicates = 0
+        self._queue: List[Tuple[float, int, str, str]] = []
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        """Number of (state, action) pairs not tried yet"""
+        return len(self._queue)
+
+    def score(self, node: FrontierNode, action: str) -> float:
+        """Priority of trying an action in a state, lower first."""
+        novelty = 1.0 / (self.action_tries[action] + 1)
+        return self.depth_weight * node.depth - self.novelty_weight * novelty
+
+    def add(
+        self,
+        possible_actions: Dict[str, Dict[str, Any]],
+        state: Dict[str, Any],
+        steps: List[TestStep],
+        snapshot_token: Any = None,
+        expand: bool = True
+    ) -> Tuple[FrontierNode, bool]:
+        """
+        Record a state reached by the given steps.
+
+        Args:
+            possible_actions: Actions available in the state
+            state: State read from the sandbox
+            steps: Steps reaching the state from start
+            snapshot_token: Sandbox snapshot of the state, if taken
+            expand: Queue the state's actions to be tried
+
+        Returns:
+            tuple: (node of the state, whether the state is new). A state seen
+            before keeps its first node and its shorter path.
+        """
+        fingerprint = state_fingerprint(possible_actions, state)
+        node = self.nodes.get(fingerprint)
+        if node is not None:
+            self.duplicates += 1
+            return node, False
+        node = FrontierNode(
+            fingerprint=fingerprint,
+            depth=sum(
+                1 for step in steps if step.tool_call != "assertion_for_regression"
+            ),
+            steps=list(steps),
+            possible_actions=possible_actions,
+            state=state,
+            snapshot_token=snapshot_token
+        )
+        self.nodes[fingerprint] = node
+        if expand:
+            for action in sorted(possible_actions):
+                self._push(node, action)
+        return node, True
+
+    def pop(self) -> Optional[Tuple[FrontierNode, str]]:
+        """
+        Take the best (state, action) pair not tried yet.
+
+        Returns:
+            tuple: (node, action name), None when the frontier is empty
+        """
+        while self._queue:
+            score, _, fingerprint, action = heapq.heappop(self._queue)
+            node = self.nodes[fingerprint]
+            if not node.reachable:
+                continue
+            current = self.score(node, action)
+            if current > score:
+                self._push(node, action, current)
+                continue
+            self.action_tries[action] += 1
+            return node, action
+        return None
+
+    def mark_unreachable(self, node: FrontierNode) -> None:
+        """
+        Stop expanding a state whose steps do not lead back to it, e.g.
+        because the sandbox is not deterministic.
+
+        Args:
+            node: Node of the state
+        """
+        node.reachable = False
+        self._queue = [item for item in self._queue if item[2] != node.fingerprint]
+        heapq.heapify(self._queue)
+
+    def frontier_nodes(self) -> List[FrontierNode]:
+        """
+        Get the states with actions not tried yet, best first.
+
+        Returns:
+            Nodes ordered by the score of their best untried action
+        """
+        best: Dict[str, float] = {}
+        for _, _, fingerprint, action in self._queue:
+            score = self.score(self.nodes[fingerprint], action)
+            best[fingerprint] = min(score, best.get(fingerprint, score))
+        return [
+            self.nodes[fingerprint]
+            for fingerprint in sorted(best, key=lambda f: (best[f], f))
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the size of the explored state space.
+
+        Returns:
+            Dictionary with the distinct states, the unreachable ones, the
+            states reached again, the pairs tried and the pairs still queued
+        """
+        return {
+            "states": len(self.nodes),
+            "unreachable": sum(1 for node in self.nodes.values() if not node.reachable),
+            "duplicates": self.duplicates,
+            "tried": sum(self.action_tries.values()),
+            "frontier": len(self._queue),
+        }
+
+    def save(
+        self,
+        path: Path,
+        signature: Optional[Dict[str, List[int]]] = None
+    ) -> None:
+        """
+        Write the states and the untried pairs, without snapshot tokens, so a
+        later run can continue with load.
+
+        Args:
+            path: File to write
+            signature: testability_signature of the explored sandbox
+        """
+        data = {
+            "version": _FRONTIER_VERSION,
+            "signature": signature,
+            "nodes": [
+                {
+                    "fingerprint": node.fingerprint,
+                    "depth": node.depth,
+                    "steps": [
+                        [step.tool_call, step.action, step.parameters]
+                        for step in node.steps
+                    ],
+                    "possible_actions": node.possible_actions,
+                    "state": node.state,
+                    "reachable": node.reachable,
+                }
+                for node in self.nodes.values()
+            ],
+            "queue": [[fingerprint, action] for _, _, fingerprint, action
+                      in sorted(self._queue)],
+            "action_tries": dict(self.action_tries),
+            "duplicates": self.duplicates,
+        }
+        temporary_path = Path(path).with_suffix(".tmp")
+        with open(temporary_path, "w") as f:
+            json.dump(data, f, default=str)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(
+        cls,
+        path: Path,
+        novelty_weight: float = 1.0,
+        depth_weight: float = 1.0,
+        signature: Optional[Dict[str, List[int]]] = None
+    ) -> Optional['FrontierScheduler']:
+        """
+        Read a scheduler written by save.
+
+        Args:
+            path: File to read
+            novelty_weight: Weight of trying actions tried least often
+            depth_weight: Weight of trying shallow states first
+            signature: Current testability_signature of the sandbox, None to
+                accept the file whatever it was saved for
+
+        Returns:
+            The scheduler, None if the file is missing, unreadable or saved
+            for other testability files
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") != _FRONTIER_VERSION:
+                return None
+            if signature is not None and data.get("signature") != signature:
+                return None
+            scheduler = cls(novelty_weight, depth_weight)
+            for item in data["nodes"]:
+                node = FrontierNode(
+                    fingerprint=item["fingerprint"],
+                    depth=item["depth"],
+                    steps=[TestStep(*step) for step in item["steps"]],
+                    possible_actions=item["possible_actions"],
+                    state=item["state"],
+                    reachable=item.get("reachable", True)
+                )
+                scheduler.nodes[node.fingerprint] = node
+            scheduler.action_tries.update(data["action_tries"])
+            scheduler.duplicates = data["duplicates"]
+            for fingerprint, action in data["queue"]:
+                scheduler._push(scheduler.nodes[fingerprint], action)
+            return scheduler
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _push(
+        self,
+        node: FrontierNode,
+        action: str,
+        score: Optional[float] = None
+    ) -> None:
+        if score is None:
+            score = self.score(node, action)
+        self._sequence += 1
+        heapq.heappush(
+            self._queue, (score, self._sequence, node.fingerprint, action)
+        )
+
+
+class FrontierExplorer:
+    """
+    Explores a sandbox breadth-first without the model: tries the queued
+    (state, action) pairs of a FrontierScheduler in order of priority, with
+    no parameters, until max_states new distinct states are found.
+
+    To try a pair, the sandbox is brought to the pair's state by restoring
+    the state's snapshot when the sandbox supports it, and otherwise by
+    tearing it down and replaying the state's steps from start. Nothing is
+    done when the sandbox is already in that state. A state the replay does
+    not reach again is marked unreachable.
+    """
+
+    def __init__(
+        self,
+        testable_sandbox: TestableSandbox,
+        scheduler: Optional[FrontierScheduler] = None,
+        max_states: int = DEFAULT_MAX_STATES,
+        max_depth: int = DEFAULT_MAX_DEPTH
+    ):
+        """
+        Args:
+            testable_sandbox: The sandbox to explore
+            scheduler: Scheduler to continue, e.g. one read with
+                FrontierScheduler.load; None to start from scratch
+            max_states: New distinct states after which the exploration stops,
+                not counting the states of a continued scheduler
+            max_depth: Actions from start after which states are not expanded
+        """
+        self.testable_sandbox = testable_sandbox
+        self.scheduler = scheduler or FrontierScheduler()
+        self.max_states = max_states
+        self.max_depth = max_depth
+        self._stats = Counter()
+        self._current: Optional[str] = None
+        self._started = False
+
+    def explore(self) -> FrontierScheduler:
+        """
+        Explore until max_states new distinct states are found or no untried
+        pair is left, then tear the sandbox down.
+
+        Returns:
+            The scheduler holding the states and the remaining frontier
+        """
+        known_states = len(self.scheduler.nodes)
+        try:
+            if not self.scheduler.nodes:
+                possible_actions = self.testable_sandbox.start()
+                self._started = True
+                root, _ = self.scheduler.add(
+                    possible_actions,
+                    self.testable_sandbox.read_state(),
+                    [],
+                    self._snapshot(),
+                    expand=self.max_depth > 0
+                )
+                self._current = root.fingerprint
+            while len(self.scheduler.nodes) - known_states < self.max_states:
+                pair = self.scheduler.pop()
+                if pair is None:
+                    break
+                self._try(*pair)
+        finally:
+            self._current = None
+            if self._started:
+                self._started = False
+                self.testable_sandbox.teardown()
+        return self.scheduler
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the scheduler's stats and how the sandbox was moved between
+        states.
+
+        Returns:
+            Dictionary with the scheduler stats, restores, replays, replayed
+            actions, replays ending in another state, and failed actions
+        """
+        return {
+            **self.scheduler.stats(),
+            "restores": 0,
+            "replays": 0,
+            "replayed_actions": 0,
+            "replay_mismatches": 0,
+            "failed_actions": 0,
+            **self._stats,
+        }
+
+    def _try(self, node: FrontierNode, action: str) -> None:
+        if not self._go_to(node):
+            self.scheduler.mark_unreachable(node)
+            return
+        self._current = None
+        try:
+            possible_actions = self.testable_sandbox.execute_action(action, {})
+            state = self.testable_sandbox.read_state()
+        except Exception:
+            self._stats["failed_actions"] += 1
+            return
+        steps = node.steps + [TestStep("select_next_action", action, {})]
+        expand = node.depth + 1 < self.max_depth
+        fingerprint = state_fingerprint(possible_actions, state)
+        snapshot_token = None
+        if fingerprint not in self.scheduler.nodes:
+            snapshot_token = self._snapshot()
+        child, _ = self.scheduler.add(
+            possible_actions, state, steps, snapshot_token, expand
+        )
+        self._current = child.fingerprint
+
+    def _go_to(self, node: FrontierNode) -> bool:
+        # Returns whether the sandbox is now in the node's state
+        if self._current == node.fingerprint:
+            return True
+        if node.snapshot_token is not None:
+            try:
+                self.testable_sandbox.restore(node.snapshot_token)
+                self._stats["restores"] += 1
+                return True
+            except ValueError:
+                # The snapshot was released, e.g. evicted by a worker
+                node.snapshot_token = None
+        self._current = None
+        if self._started:
+            self._started = False
+            self.testable_sandbox.teardown()
+        possible_actions = self.testable_sandbox.start()
+        self._started = True
+        self._stats["replays"] += 1
+        try:
+            for step in node.steps:
+                if step.tool_call != "assertion_for_regression":
+                    possible_actions = self.testable_sandbox.execute_action(
+                        step.action, step.parameters
+                    )
+                    self._stats["replayed_actions"] += 1
+            reached = state_fingerprint(
+                possible_actions, self.testable_sandbox.read_state()
+            ) == node.fingerprint
+        except Exception:
+            reached = False
+        if not reached:
+            self._stats["replay_mismatches"] += 1
+        return reached
+
+    def _snapshot(self) -> Any:
+        if not getattr(self.testable_sandbox, "supports_snapshot", False):
+            return None
+        try:
+            return self.testable_sandbox.snapshot()
+        except SnapshotNotSupportedError:
+            return None
@@ -0,0 +1,70 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+DEFAULT_GOAL = {
+    "title": "start cli with no parameter should receive helpful message",
+    "description": (
+        "Verify that when the CLI is started without any parameters, "
+        "it displays a helpful message to remind the user that a "
+        "oracle_dir is required."
+    )
+}
+
+# Key of a goal file's goals that apply to every sandbox
+ALL_SANDBOXES = "*"
+
+
+def load_goal_file(path: Union[str, Path]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load test goals from a JSON file.
+
+    The file holds either a list of goals for every sandbox, or an object
+    mapping sandbox names to their goals, with "*" for goals of every
+    sandbox. Each goal has a 'title' and a 'description'.
+
+    Args:
+        path: Path to the goal file
+
+    Returns:
+        Goals per sandbox name, with ALL_SANDBOXES for the shared ones
+
+    Raises:
+        ValueError: If the file is not in this format
+    """
+    with open(path) as f:
+        content = json.load(f)
+    if isinstance(content, list):
+        content = {ALL_SANDBOXES: content}
+    if not isinstance(content, dict):
+        raise ValueError(f"{path} must hold a list or an object of goals")
+    for sandbox_name, goals in content.items():
+        if not isinstance(goals, list) or not all(
+            isinstance(goal, dict) and "title" in goal and "description" in goal
+            for goal in goals
+        ):
+            raise ValueError(
+                f"Goals of {sandbox_name!r} in {path} must be a list of objects "
+                "with a title and a description"
+            )
+    return content
+
+
+def goals_for(
+    goal_file_goals: Dict[str, List[Dict[str, Any]]],
+    sandbox_name: str
+) -> List[Dict[str, Any]]:
+    """
+    Get the goals of a loaded goal file that apply to a sandbox.
+
+    Args:
+        goal_file_goals: Result of load_goal_file
+        sandbox_name: Name of the sandbox
+
+    Returns:
+        Goals for every sandbox followed by the sandbox's own goals
+    """
+    return (
+        goal_file_goals.get(ALL_SANDBOXES, [])
+        + goal_file_goals.get(sandbox_name, [])
+    )
@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .action_policy import ActionPolicy
+from .AiAssistant.ai_exploratory_test_assistant import AIExploratoryTestAssistant
+from .exploratory_test import ExplorationCheckpoint
+from .explorer import Explorer
+from .regression_test_proposal import RegressionTestProposal
+from .sandbox_pool import SandboxPool
+from .testable_sandbox import TestableSandbox
+
+DEFAULT_MAX_PARALLEL = 4
+
+
+@dataclass
+class GoalResult:
+    """Outcome of exploring one goal on one sandbox"""
+    sandbox_name: str
+    goal: Dict[str, Any]
+    proposals: List[RegressionTestProposal] = field(default_factory=list)
+    # Recorded after every action with record_checkpoints
+    checkpoints: List[ExplorationCheckpoint] = field(default_factory=list)
+    error: Optional[BaseException] = None
+    duration: float = 0.0
+
+
+class MultiGoalExecutor:
+    """
+    Explores many (sandbox, goal) pairs on a bounded pool of threads and
+    yields each result as soon as its exploration finishes.
+
+    With use_workers, every exploration runs its sandbox in a worker
+    process, so in-process state of the testability modules is never shared
+    between explorations running at the same time. Each pool thread keeps its
+    worker per sandbox for the following goals, since the sandbox is torn
+    down and started again by every exploration anyway. Without workers, the
+    explorations use the given sandbox and its module cache.
+
+    With a pool size, each sandbox directory gets a SandboxPool that keeps
+    that many sandboxes started, so explorations don't wait for start();
+    without workers the pool keeps one, since in-process sandboxes share
+    their modules' state.
+    """
+
+    def __init__(
+        self,
+        ai_assistant: AIExploratoryTestAssistant,
+        max_parallel: int = DEFAULT_MAX_PARALLEL,
+        use_workers: Optional[bool] = None,
+        action_policy: Optional[ActionPolicy] = None,
+        pipelined: bool = False,
+        sandbox_config: Optional[Dict[str, Any]] = None,
+        pool_size: int = 0,
+        record_checkpoints: bool = False
+    ):
+        """
+        Args:
+            ai_assistant: AI assistant shared by all explorations
+            max_parallel: Most explorations running at the same time
+            use_workers: Run each sandbox instance in a worker process,
+                defaults to doing so when explorations run in parallel
+            action_policy: Chooses the steps of all explorations, None to ask
+                the AI assistant for every step
+            pipelined: Overlap requesting each next step with sandbox work
+            sandbox_config: Configuration passed with each sandbox
+            pool_size: Sandboxes kept started per sandbox directory, 0 to
+                start each exploration's sandbox when it begins
+            record_checkpoints: Record a checkpoint after every action of
+                each exploration, snapshotting the sandbox when it can; their
+                snapshots stay valid until run returns
+        """
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        self.ai_assistant = ai_assistant
+        self.max_parallel = max_parallel
+        self.use_workers = max_parallel > 1 if use_workers is None else use_workers
+        self.action_policy = action_policy
+        self.pipelined = pipelined
+        self.sandbox_config = sandbox_config or {}
+        self.pool_size = pool_size
+        self.record_checkpoints = record_checkpoints
+        self._pools: Dict[Any, SandboxPool] = {}
+        self._local = threading.local()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+
+    def run(
+        self,
+        jobs: Iterable[Tuple]
+    ) -> Iterator[GoalResult]:
+        """
+        Explore every goal on its sandbox.
+
+        Args:
+            jobs: (sandbox, goal) pairs, or (sandbox, goal, checkpoint) to
+                start the exploration from an ExplorationCheckpoint
+
+        Yields:
+            GoalResult of each exploration, in the order they finish. A failed
+            exploration has its error set instead of raising.
+        """
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.max_parallel, thread_name_prefix="exploration"
+            ) as pool:
+                futures = [
+                    pool.submit(self._explore, *job)
+                    for job in jobs
+                ]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            with self._workers_lock:
+                workers, self._workers = self._workers, []
+                pools, self._pools = list(self._pools.values()), {}
+            for pool in pools:
+                pool.close()
+            for worker in workers:
+                worker.close()
+
+    def _explore(
+        self,
+        sandbox: TestableSandbox,
+        goal: Dict[str, Any],
+        checkpoint: Optional[ExplorationCheckpoint] = None
+    ) -> GoalResult:
+        result = GoalResult(sandbox_name=sandbox.name, goal=goal)
+        started = time.monotonic()
+        try:
+            factory = Explorer.create()
+            if self.pool_size > 0:
+                factory.with_sandbox_pool(self._pool(sandbox), self.sandbox_config)
+            else:
+                factory.with_sandbox(self._instance(sandbox), self.sandbox_config)
+            explorer = (factory
+                    .with_ai_assistant(self.ai_assistant)
+                    .with_action_policy(self.action_policy)
+                    .with_pipelining(self.pipelined)
+                    .with_goal(goal)
+                    .with_checkpoint(checkpoint)
+                    .with_checkpoint_recording(self.record_checkpoints)
+                    .build())
+            result.proposals = explorer.explore()
+            result.checkpoints = explorer.checkpoints
+        except Exception as e:
+            result.error = e
+        finally:
+            result.duration = time.monotonic() - started
+        return result
+
+    def _pool(self, sandbox: TestableSandbox) -> SandboxPool:
+        with self._workers_lock:
+            pool = self._pools.get(sandbox.path)
+            if pool is None:
+                pool = self._pools[sandbox.path] = SandboxPool.for_sandbox(
+                    sandbox,
+                    use_workers=self.use_workers,
+                    size=self.pool_size if self.use_workers else 1
+                )
+            return pool
+
+    def _instance(self, sandbox: TestableSandbox):
+        if not self.use_workers:
+            # Explorations in this process share its testability modules, so
+            # they also share the sandbox and its warm module cache
+            return sandbox
+        workers = getattr(self._local, "workers", None)
+        if workers is None:
+            workers = self._local.workers = {}
+        worker = workers.get(sandbox.path)
+        if worker is None or not worker.is_alive:
+            worker = workers[sandbox.path] = sandbox.spawn_worker()
+            with self._workers_lock:
+                self._workers.append(worker)
+        return worker
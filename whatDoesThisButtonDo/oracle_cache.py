@@ -0,0 +1,20 @@
+from pathlib import Path
+
+# Directory under the oracle root holding indexes and manifests that make
+# repeated runs over the same oracle directory cheap
+CACHE_DIR_NAME = ".wdtbd_cache"
+
+
+def get_cache_dir(oracle_dir: Path) -> Path:
+    """
+    Get the cache directory of an oracle directory, creating it if needed.
+
+    Args:
+        oracle_dir: Root directory of the test oracles
+
+    Returns:
+        Path of the cache directory
+    """
+    cache_dir = Path(oracle_dir) / CACHE_DIR_NAME
+    cache_dir.mkdir(exist_ok=True)
+    return cache_dir
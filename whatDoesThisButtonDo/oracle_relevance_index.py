@@ -0,0 +1,327 @@
+import ast
+import json
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .oracle_cache import CACHE_DIR_NAME, get_cache_dir
+from .test_oracles import TestOracles
+
+INDEX_FILE_NAME = "relevance_index.json"
+_INDEX_VERSION = 2
+
+# Sections longer than this are split at paragraph boundaries
+MAX_SECTION_CHARS = 1500
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+_HEADING = re.compile(r"^#{1,6}\s+(.*)$")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have if in into is it its of on "
+    "or should that the their them then there these this to was were when which "
+    "will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of a text, without stopwords."""
+    return [
+        token for token in _TOKEN.findall(text.lower())
+        if len(token) > 1 and token not in _STOPWORDS
+    ]
+
+
+@dataclass
+class OracleSection:
+    """A heading-delimited part of a test oracle file"""
+    name: str
+    oracle_name: str
+    content: str
+
+
+def split_sections(oracle_name: str, content: str) -> List[OracleSection]:
+    """
+    Split an oracle into sections at markdown headings, and long sections
+    further at paragraph boundaries.
+
+    Args:
+        oracle_name: File name of the oracle
+        content: Markdown content of the oracle
+
+    Returns:
+        Sections in document order
+    """
+    parts: List[Tuple[str, List[str]]] = [("", [])]
+    for line in content.splitlines():
+        heading = _HEADING.match(line)
+        if heading and any(existing.strip() for existing in parts[-1][1]):
+            parts.append((heading.group(1).strip(), [line]))
+        else:
+            if heading and not parts[-1][0]:
+                parts[-1] = (heading.group(1).strip(), parts[-1][1])
+            parts[-1][1].append(line)
+
+    sections = []
+    for heading, lines in parts:
+        text = "\n".join(lines).strip()
+        if not text:
+            continue
+        base_name = f"{oracle_name} § {heading}" if heading else oracle_name
+        chunks = _chunk_paragraphs(text)
+        for i, chunk in enumerate(chunks):
+            name = base_name if len(chunks) == 1 else f"{base_name} ({i + 1})"
+            sections.append(OracleSection(name, oracle_name, chunk))
+    return sections
+
+
+def _chunk_paragraphs(text: str) -> List[str]:
+    if len(text) <= MAX_SECTION_CHARS:
+        return [text]
+    chunks: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(paragraph) > MAX_SECTION_CHARS:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def sandbox_query(sandbox_path: Path, goal: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Describe a sandbox and goal as query text for the relevance index.
+
+    Uses the sandbox's requirement.md and the docstrings of its testability
+    functions, which are parsed without importing the modules.
+
+    Args:
+        sandbox_path: Path to the sandbox directory
+        goal: Test goal with 'title' and 'description'
+
+    Returns:
+        Free text query
+    """
+    sandbox_path = Path(sandbox_path)
+    parts = [sandbox_path.name]
+    if goal:
+        parts.extend(str(goal.get(key, "")) for key in ("title", "description"))
+    requirement = sandbox_path / "requirement.md"
+    if requirement.is_file():
+        parts.append(requirement.read_text(errors="replace"))
+    for file in sorted((sandbox_path / "testability").glob("*.py")):
+        try:
+            tree = ast.parse(file.read_text(errors="replace"))
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and node.name == file.stem:
+                parts.append(node.name.replace("_", " "))
+                parts.append(ast.get_docstring(node) or "")
+    return "\n".join(part for part in parts if part)
+
+
+class OracleRelevanceIndex:
+    """
+    BM25 index over the sections of the test oracles.
+
+    It runs entirely locally. Its term statistics are persisted in the oracle
+    cache directory, keyed by the oracle digest, so sections are only
+    tokenized again when the oracles change.
+    """
+
+    def __init__(
+        self,
+        sections: List[OracleSection],
+        digest: str,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        """
+        Build the index.
+
+        Args:
+            sections: Sections to index
+            digest: Digest of the oracle set the sections come from
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        term_counts = [Counter(tokenize(s.content)) for s in sections]
+        document_frequency = Counter()
+        for counts in term_counts:
+            document_frequency.update(counts.keys())
+        total = len(sections)
+        idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        self._set_statistics(sections, digest, k1, b, term_counts, idf)
+
+    def _set_statistics(
+        self,
+        sections: List[OracleSection],
+        digest: str,
+        k1: float,
+        b: float,
+        term_counts: List[Dict[str, int]],
+        idf: Dict[str, float]
+    ) -> None:
+        self.sections = sections
+        self.digest = digest
+        self.k1 = k1
+        self.b = b
+        self._term_counts = term_counts
+        self._lengths = [sum(counts.values()) for counts in term_counts]
+        self._average_length = (
+            sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        )
+        self._idf = idf
+
+    @classmethod
+    def from_oracles(cls, test_oracles: TestOracles) -> 'OracleRelevanceIndex':
+        """Build an index over the sections of all loaded oracles."""
+        sections = []
+        for oracle in test_oracles.oracles:
+            sections.extend(split_sections(oracle['name'], oracle['content']))
+        return cls(sections, test_oracles.digest)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        test_oracles: TestOracles,
+        oracle_dir: str
+    ) -> 'OracleRelevanceIndex':
+        """
+        Load the persisted index of an oracle directory, rebuilding and saving
+        it if it is missing or was built for different oracles.
+
+        Args:
+            test_oracles: Oracles loaded from oracle_dir
+            oracle_dir: Root directory of the test oracles
+        """
+        oracle_path = Path(oracle_dir)
+        index = cls._read(oracle_path / CACHE_DIR_NAME / INDEX_FILE_NAME)
+        if index is not None and index.digest == test_oracles.digest:
+            return index
+        index = cls.from_oracles(test_oracles)
+        index._write(oracle_path)
+        return index
+
+    def score(self, query: str) -> List[float]:
+        """
+        BM25 score of every section for a query.
+
+        Args:
+            query: Free text, e.g. a sandbox description and test goal
+
+        Returns:
+            Scores in the order of ``sections``
+        """
+        terms = Counter(tokenize(query))
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            norm = self.k1 * (
+                1 - self.b + self.b * length / (self._average_length or 1.0)
+            )
+            for term, query_count in terms.items():
+                frequency = counts.get(term)
+                if frequency:
+                    score += query_count * self._idf[term] * (
+                        frequency * (self.k1 + 1) / (frequency + norm)
+                    )
+            scores.append(score)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[Tuple[OracleSection, float]]:
+        """
+        The k sections most relevant to a query, best first.
+
+        Sections that share no term with the query are never returned.
+        """
+        ranked = sorted(
+            (
+                (score, i) for i, score in enumerate(self.score(query))
+                if score > 0
+            ),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [(self.sections[i], score) for score, i in ranked[:k]]
+
+    def select(
+        self,
+        test_oracles: TestOracles,
+        query: str,
+        k: int
+    ) -> TestOracles:
+        """
+        Build an oracle collection of the k sections most relevant to a query.
+
+        Sections keep their document order and carry their score as relevance,
+        so a token budget summarizes the least relevant ones first. When no
+        section shares a term with the query, the full collection is returned.
+
+        Args:
+            test_oracles: The full collection, for its render settings
+            query: Free text describing the sandbox and goal
+            k: Number of sections to keep
+
+        Returns:
+            TestOracles with one oracle per selected section
+        """
+        selected = self.top_k(query, k)
+        if not selected:
+            return test_oracles
+        order = {id(section): i for i, section in enumerate(self.sections)}
+        selected.sort(key=lambda item: order[id(item[0])])
+        subset = test_oracles.with_oracles([
+            {'name': section.name, 'content': section.content}
+            for section, _ in selected
+        ])
+        subset.relevance = {section.name: score for section, score in selected}
+        return subset
+
+    @classmethod
+    def _read(cls, path: Path) -> Optional['OracleRelevanceIndex']:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") != _INDEX_VERSION:
+                return None
+            # Reuse the persisted statistics instead of tokenizing again
+            index = cls.__new__(cls)
+            index._set_statistics(
+                [OracleSection(**section) for section in data["sections"]],
+                data["digest"],
+                data["k1"],
+                data["b"],
+                data["term_counts"],
+                data["idf"]
+            )
+            return index
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _write(self, oracle_path: Path) -> None:
+        data = {
+            "version": _INDEX_VERSION,
+            "digest": self.digest,
+            "sections": [asdict(section) for section in self.sections],
+            "k1": self.k1,
+            "b": self.b,
+            "term_counts": self._term_counts,
+            "idf": self._idf,
+        }
+        try:
+            index_path = get_cache_dir(oracle_path) / INDEX_FILE_NAME
+            temporary_path = index_path.with_suffix(".tmp")
+            with open(temporary_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temporary_path, index_path)
+        except OSError:
+            pass
@@ -63,33 +63,30 @@ class RegressionTestProposal:
             "        possible_actions = sandbox.start()"
         ]
         
-        # Add each test step
+        # Add each test step, batching consecutive assertions so the state is
+        # read only once for them
+        pending_assertions: List[TestStep] = []
         for step in self.steps:
             if step.tool_call == "assertion_for_regression":
+                pending_assertions.append(step)
+                continue
+            self._append_assertions(code, pending_assertions)
+            pending_assertions = []
+            if step.parameters:
                 params_str = ", ".join(
                     f"'{k}': {repr(v)}" 
                     for k, v in step.parameters.items()
                 )
-                code.append("        sandbox.execute_assertion(")
-                code.append(f"            '{step.action}',")
-                code.append(f"            {{{params_str}}},")
-                code.append("            sandbox.read_state()")
-                code.append("        )")
+                code.append(
+                    f"        possible_actions = "
+                    f"sandbox.execute_action('{step.action}', {{{params_str}}})"
+                )
             else:
-                if step.parameters:
-                    params_str = ", ".join(
-                        f"'{k}': {repr(v)}" 
-                        for k, v in step.parameters.items()
-                    )
-                    code.append(
-                        f"        possible_actions = "
-                        f"sandbox.execute_action('{step.action}', {{{params_str}}})"
-                    )
-                else:
-                    code.append(
-                        f"        possible_actions = "
-                        f"sandbox.execute_action('{step.action}')"
-                    )
+                code.append(
+                    f"        possible_actions = "
+                    f"sandbox.execute_action('{step.action}')"
+                )
+        self._append_assertions(code, pending_assertions)
         
         # Add teardown in finally block
         code.extend([
@@ -98,4 +95,18 @@ class RegressionTestProposal:
         ])
         
         # Return the code without the extra indentation
-        return "\n".join(code) 
\ No newline at end of file
+        return "\n".join(code)
+
+    @staticmethod
+    def _append_assertions(code: List[str], steps: List[TestStep]) -> None:
+        """Append one batched execute_assertions call for the given steps"""
+        if not steps:
+            return
+        code.append("        sandbox.execute_assertions([")
+        for step in steps:
+            params_str = ", ".join(
+                f"'{k}': {repr(v)}" 
+                for k, v in step.parameters.items()
+            )
+            code.append(f"            ('{step.action}', {{{params_str}}}),")
+        code.append("        ])")
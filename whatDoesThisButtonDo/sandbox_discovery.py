@@ -0,0 +1,167 @@
+import json
+import os
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .oracle_cache import CACHE_DIR_NAME, get_cache_dir
+
+# Directory names never searched for sandboxes. Hidden directories cover
+# .git, .venv and the oracle cache directory.
+DEFAULT_IGNORE_GLOBS = (
+    ".*",
+    "__pycache__",
+    "regression_tests",
+    "venv",
+    "node_modules",
+    "site-packages",
+    "*.egg-info",
+)
+
+INDEX_FILE_NAME = "discovery.json"
+_INDEX_VERSION = 1
+
+
+class SandboxDiscovery:
+    """
+    Finds sandbox directories, i.e. directories with a testability subfolder,
+    below an oracle directory.
+
+    The walk uses os.scandir, skips directories matching the ignore globs and
+    doesn't descend into a sandbox once it has been found. The result is kept
+    in an index in the oracle cache directory together with the mtime of
+    every directory scanned, so a later run over an unchanged tree only stats
+    those directories.
+    """
+
+    def __init__(
+        self,
+        ignore_globs: Sequence[str] = DEFAULT_IGNORE_GLOBS,
+        use_index: bool = True
+    ):
+        """
+        Initialize the discovery walker.
+
+        Args:
+            ignore_globs: fnmatch patterns of directory names to skip
+            use_index: Read and write the on-disk discovery index
+        """
+        self.ignore_globs = list(ignore_globs)
+        self.use_index = use_index
+        self.last_stats: Dict[str, int] = {}
+
+    def discover(self, oracle_dir: str) -> List[Path]:
+        """
+        Find all sandbox directories below an oracle directory.
+
+        Args:
+            oracle_dir: Root directory of the test oracles
+
+        Returns:
+            Sorted list of sandbox directory paths
+        """
+        root = Path(oracle_dir)
+        if self.use_index:
+            sandboxes = self._read_index(root)
+            if sandboxes is not None:
+                return sandboxes
+
+        if self.use_index:
+            # Create the cache directory before the walk records the root's mtime
+            try:
+                get_cache_dir(root)
+            except OSError:
+                pass
+        sandboxes, directories = self._walk(root)
+        self.last_stats = {
+            "directories_scanned": len(directories),
+            "sandboxes": len(sandboxes),
+            "from_index": False,
+        }
+        if self.use_index:
+            self._write_index(root, sandboxes, directories)
+        return [root / sandbox for sandbox in sandboxes]
+
+    def _is_ignored(self, name: str) -> bool:
+        return any(fnmatch(name, pattern) for pattern in self.ignore_globs)
+
+    def _walk(self, root: Path) -> Tuple[List[str], Dict[str, int]]:
+        sandboxes: List[str] = []
+        directories: Dict[str, int] = {}
+        pending = [""]
+        while pending:
+            relative = pending.pop()
+            path = os.path.join(root, relative) if relative else str(root)
+            try:
+                directories[relative] = os.stat(path).st_mtime_ns
+                with os.scandir(path) as entries:
+                    children = [
+                        entry for entry in entries
+                        if (
+                            entry.name == "testability" and entry.is_dir()
+                        ) or (
+                            not self._is_ignored(entry.name)
+                            and entry.is_dir(follow_symlinks=False)
+                        )
+                    ]
+            except OSError:
+                continue
+            # The oracle root itself is never a sandbox
+            if relative and any(entry.name == "testability" for entry in children):
+                sandboxes.append(relative)
+                continue
+            pending.extend(
+                os.path.join(relative, entry.name) if relative else entry.name
+                for entry in children
+            )
+        return sorted(sandboxes), directories
+
+    def _index_path(self, root: Path) -> Path:
+        return root / CACHE_DIR_NAME / INDEX_FILE_NAME
+
+    def _read_index(self, root: Path) -> Optional[List[Path]]:
+        try:
+            with open(self._index_path(root)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            index.get("version") != _INDEX_VERSION
+            or index.get("ignore_globs") != self.ignore_globs
+        ):
+            return None
+        for relative, mtime_ns in index["directories"].items():
+            try:
+                if os.stat(root / relative).st_mtime_ns != mtime_ns:
+                    return None
+            except OSError:
+                return None
+        self.last_stats = {
+            "directories_scanned": 0,
+            "directories_validated": len(index["directories"]),
+            "sandboxes": len(index["sandboxes"]),
+            "from_index": True,
+        }
+        return [root / sandbox for sandbox in index["sandboxes"]]
+
+    def _write_index(
+        self,
+        root: Path,
+        sandboxes: List[str],
+        directories: Dict[str, int]
+    ) -> None:
+        index = {
+            "version": _INDEX_VERSION,
+            "ignore_globs": self.ignore_globs,
+            "sandboxes": sandboxes,
+            "directories": directories,
+        }
+        try:
+            index_path = get_cache_dir(root) / INDEX_FILE_NAME
+            temporary_path = index_path.with_suffix(".tmp")
+            with open(temporary_path, "w") as f:
+                json.dump(index, f)
+            os.replace(temporary_path, index_path)
+        except OSError:
+            # A read-only oracle directory just means no index
+            pass
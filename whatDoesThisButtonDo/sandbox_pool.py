@@ -0,0 +1,329 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from .testable_sandbox import TestableSandbox
+
+
+def default_health_check(sandbox: TestableSandbox) -> bool:
+    """A sandbox is healthy if its state can still be read."""
+    return isinstance(sandbox.read_state(), dict)
+
+
+@dataclass
+class _ReadySandbox:
+    sandbox: TestableSandbox
+    initial_actions: Dict[str, Dict[str, Any]]
+    ready_since: float
+
+
+class PooledSandbox:
+    """
+    A started sandbox leased from a SandboxPool.
+
+    It can be used wherever a TestableSandbox is expected: start() returns the
+    actions captured when the sandbox was pre-warmed instead of starting it
+    again, and teardown() hands the sandbox back to the pool for recycling.
+    """
+
+    def __init__(
+        self,
+        pool: 'SandboxPool',
+        sandbox: TestableSandbox,
+        initial_actions: Dict[str, Dict[str, Any]]
+    ):
+        self.sandbox = sandbox
+        self._pool = pool
+        self._initial_actions = initial_actions
+        self._started = False
+        self._released = False
+
+    @property
+    def name(self) -> str:
+        """Get the name of the pooled sandbox."""
+        return self.sandbox.name
+
+    def start(self) -> dict:
+        """
+        Returns the actions available after the pre-warmed start, or starts
+        the sandbox again if the lease has already been started once.
+        """
+        if self._started:
+            return self.sandbox.start()
+        self._started = True
+        return dict(self._initial_actions)
+
+    def teardown(self) -> None:
+        """Returns the sandbox to the pool, which tears it down and restarts it."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self.sandbox)
+
+    def __getattr__(self, name: str):
+        return getattr(self.sandbox, name)
+
+
+class SandboxPool:
+    """
+    Keeps a number of started sandboxes ready so explorations don't wait for
+    start().
+
+    Sandboxes are created by a factory and started on background threads. An
+    acquired sandbox is health-checked before it is handed out; sandboxes that
+    are unhealthy or have been idle longer than max_idle_seconds are torn down
+    and started again. After a lease is torn down the sandbox is recycled in
+    the background.
+
+    In-process sandboxes of the same testability directory share module level
+    state, so a pool size above one is only safe for sandboxes that isolate
+    their state, e.g. ones running in a worker process.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], TestableSandbox],
+        size: int = 2,
+        max_idle_seconds: Optional[float] = 300.0,
+        health_check: Optional[Callable[[TestableSandbox], bool]] = (
+            default_health_check
+        ),
+    ):
+        """
+        Initialize the pool and start pre-warming sandboxes.
+
+        Args:
+            factory: Creates a new, not yet started sandbox
+            size: Number of sandboxes kept started or leased
+            max_idle_seconds: Restart ready sandboxes idle for longer than this,
+                None to keep them indefinitely
+            health_check: Called on a ready sandbox before it is leased, None
+                to skip health checks
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check = health_check
+        self.stats = {
+            "started": 0,
+            "start_failures": 0,
+            "acquired": 0,
+            "recycled": 0,
+            "expired": 0,
+            "unhealthy": 0,
+            "acquire_wait_seconds": 0.0,
+        }
+        self._ready: Deque[_ReadySandbox] = deque()
+        self._in_flight = 0
+        self._leased = 0
+        self._closed = False
+        self._last_error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="sandbox-pool"
+        )
+        with self._condition:
+            self._fill()
+
+    @classmethod
+    def for_sandbox(
+        cls,
+        sandbox: TestableSandbox,
+        use_workers: bool = False,
+        **kwargs
+    ) -> 'SandboxPool':
+        """
+        Create a pool of sandboxes for the same directory.
+
+        Args:
+            sandbox: Sandbox whose path the pooled sandboxes use
+            use_workers: Run each pooled sandbox in its own worker process
+            **kwargs: Passed to SandboxPool. The size defaults to 2 with
+                workers and to 1 for in-process sandboxes, which share their
+                testability modules' state
+        """
+        if use_workers:
+            kwargs.setdefault("size", 2)
+            return cls(lambda: TestableSandbox(sandbox.path).spawn_worker(), **kwargs)
+        kwargs.setdefault("size", 1)
+        # Keeps the sandbox's warm module cache
+        return cls(lambda: sandbox, **kwargs)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledSandbox:
+        """
+        Lease a started sandbox, waiting for one to become ready if needed.
+
+        Args:
+            timeout: Maximum seconds to wait, None to wait indefinitely
+
+        Returns:
+            PooledSandbox ready to explore
+
+        Raises:
+            TimeoutError: If no sandbox became ready in time
+            RuntimeError: If the pool is closed or sandboxes fail to start
+        """
+        requested_at = time.monotonic()
+        deadline = None if timeout is None else requested_at + timeout
+        while True:
+            with self._condition:
+                ready = self._next_ready(deadline)
+                self._leased += 1
+            if self._is_healthy(ready.sandbox):
+                break
+            with self._condition:
+                self._leased -= 1
+                self.stats["unhealthy"] += 1
+                recycled = self._submit_recycle(ready.sandbox)
+            if not recycled:
+                self._retire(ready.sandbox)
+
+        with self._condition:
+            self.stats["acquired"] += 1
+            self.stats["acquire_wait_seconds"] += time.monotonic() - requested_at
+        return PooledSandbox(self, ready.sandbox, ready.initial_actions)
+
+    def release(self, sandbox: TestableSandbox) -> None:
+        """
+        Give a leased sandbox back to the pool to be torn down and restarted.
+
+        Args:
+            sandbox: The sandbox of a PooledSandbox lease
+        """
+        with self._condition:
+            self._leased -= 1
+            recycled = self._submit_recycle(sandbox)
+        if not recycled:
+            self._retire(sandbox)
+
+    def close(self) -> None:
+        """Tear down all ready sandboxes and stop pre-warming new ones."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._executor.shutdown(wait=True)
+        with self._condition:
+            ready, self._ready = list(self._ready), deque()
+        error = None
+        for entry in ready:
+            try:
+                self._retire(entry.sandbox)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def __enter__(self) -> 'SandboxPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _next_ready(self, deadline: Optional[float]) -> _ReadySandbox:
+        # Called with the condition held
+        while True:
+            if self._closed:
+                raise RuntimeError("Sandbox pool is closed")
+            self._expire_idle()
+            self._fill()
+            if self._ready:
+                return self._ready.popleft()
+            if self._in_flight == 0 and self._last_error is not None:
+                error, self._last_error = self._last_error, None
+                raise RuntimeError("Failed to start pooled sandbox") from error
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("No pooled sandbox became ready in time")
+            self._condition.wait(remaining)
+
+    def _expire_idle(self) -> None:
+        if self.max_idle_seconds is None:
+            return
+        now = time.monotonic()
+        while self._ready and (
+            now - self._ready[0].ready_since > self.max_idle_seconds
+        ):
+            entry = self._ready.popleft()
+            self.stats["expired"] += 1
+            self._submit_recycle(entry.sandbox)
+
+    def _fill(self) -> None:
+        if self._last_error is not None:
+            # Don't retry failing starts until the error has been reported
+            return
+        while len(self._ready) + self._in_flight + self._leased < self.size:
+            self._in_flight += 1
+            self._executor.submit(self._start, None)
+
+    def _submit_recycle(self, sandbox: TestableSandbox) -> bool:
+        # Called with the condition held, so close() cannot shut the executor
+        # down between the check and the submit
+        if self._closed:
+            return False
+        self._in_flight += 1
+        self._executor.submit(self._recycle, sandbox)
+        return True
+
+    def _is_healthy(self, sandbox: TestableSandbox) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            return bool(self.health_check(sandbox))
+        except Exception:
+            return False
+
+    def _recycle(self, sandbox: TestableSandbox) -> None:
+        try:
+            sandbox.teardown()
+        except Exception:
+            # Don't reuse a sandbox that could not be torn down cleanly
+            self._close(sandbox)
+            sandbox = None
+        with self._condition:
+            self.stats["recycled"] += 1
+        self._start(sandbox)
+
+    def _start(self, sandbox: Optional[TestableSandbox]) -> None:
+        try:
+            if sandbox is None:
+                sandbox = self.factory()
+            initial_actions = sandbox.start()
+        except Exception as e:
+            if sandbox is not None:
+                self._close(sandbox)
+            with self._condition:
+                self._in_flight -= 1
+                self._last_error = e
+                self.stats["start_failures"] += 1
+                self._condition.notify_all()
+            return
+        with self._condition:
+            self._in_flight -= 1
+            self.stats["started"] += 1
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._ready.append(
+                    _ReadySandbox(sandbox, initial_actions, time.monotonic())
+                )
+                self._condition.notify_all()
+        if closed:
+            self._retire(sandbox)
+
+    def _retire(self, sandbox: TestableSandbox) -> None:
+        try:
+            sandbox.teardown()
+        finally:
+            self._close(sandbox)
+
+    @staticmethod
+    def _close(sandbox: TestableSandbox) -> None:
+        # Worker sandboxes own a process; in-process ones have nothing to close
+        close = getattr(sandbox, "close", None)
+        if close is not None:
+            close()
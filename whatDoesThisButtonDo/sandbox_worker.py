@@ -0,0 +1,454 @@
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .assertion_engine import AssertionResult
+from .testable_sandbox import SnapshotNotSupportedError, TestableSandbox
+from .tracing import traced_call
+
+# Sandbox methods a worker serves, and read-only properties it exposes
+_CALLS = {
+    "start",
+    "execute_action",
+    "read_state",
+    "teardown",
+    "execute_assertion",
+    "execute_assertions",
+}
+_PROPERTIES = {"module_cache_stats"}
+DEFAULT_MAX_SNAPSHOTS = 16
+
+
+class SandboxWorkerError(RuntimeError):
+    """Raised when a sandbox worker process dies or cannot be reached"""
+
+
+# Returned by _ForkSnapshots.snapshot in a worker resumed from a snapshot
+_RESUMED = object()
+
+
+class _ForkSnapshots:
+    """
+    Default snapshot/restore for sandboxes served by a worker, used when the
+    testability directory doesn't provide its own.
+
+    A snapshot forks the worker; the copy stays frozen, listening on a unix
+    socket named after the token. Restoring asks the frozen copy to fork a
+    new active worker, which takes over the pipe to the parent, and the old
+    worker exits. The frozen copy stays available for further restores.
+
+    Forking only captures the worker's memory, so it is used only while the
+    worker has no other threads and no child processes whose state would be
+    left behind.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    @staticmethod
+    def is_safe() -> bool:
+        return (
+            hasattr(os, "fork")
+            and threading.active_count() == 1
+            and not multiprocessing.active_children()
+        )
+
+    def snapshot(self) -> Any:
+        if not self.is_safe():
+            raise SnapshotNotSupportedError(
+                "Sandbox has no snapshot.py/restore.py and cannot be forked "
+                "safely while it runs threads or child processes"
+            )
+        token = uuid.uuid4().hex
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self._socket_path(token))
+            listener.listen()
+        except OSError as e:
+            # E.g. a socket path longer than AF_UNIX allows in a deep TMPDIR
+            listener.close()
+            raise SnapshotNotSupportedError(
+                f"Cannot listen for the forked snapshot: {e}"
+            ) from e
+        if os.fork() == 0:
+            return self._freeze(listener)
+        listener.close()
+        return token
+
+    def restore(self, token: Any) -> int:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            try:
+                client.connect(self._socket_path(token))
+            except OSError as e:
+                raise ValueError(f"Unknown snapshot token: {token}") from e
+            client.sendall(b"r")
+            return int(client.recv(32))
+
+    def release_token(self, token: Any) -> None:
+        """Stop the frozen copy of one snapshot."""
+        path = self._socket_path(token)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            try:
+                client.connect(path)
+                client.sendall(b"x")
+            except OSError:
+                pass
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def release(directory: str) -> None:
+        """Stop all frozen copies with sockets in a directory."""
+        for name in os.listdir(directory):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                try:
+                    client.connect(os.path.join(directory, name))
+                    client.sendall(b"x")
+                except OSError:
+                    pass
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _socket_path(self, token: Any) -> str:
+        return os.path.join(self._directory, f"{token}.sock")
+
+    @staticmethod
+    def _freeze(listener: socket.socket) -> Any:
+        # Reap the active workers forked from this copy automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        while True:
+            connection, _ = listener.accept()
+            with connection:
+                if connection.recv(1) != b"r":
+                    os._exit(0)
+                pid = os.fork()
+                if pid == 0:
+                    listener.close()
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    return _RESUMED
+                connection.sendall(str(pid).encode())
+
+
+def _serve(
+    conn,
+    sandbox_path: str,
+    sandbox_start_method: str,
+    snapshot_directory: str
+) -> None:
+    """
+    Worker process main loop.
+
+    Each request is a pickled ``(operation, args)`` tuple sent as one
+    length-prefixed frame; each reply is ``(True, result)`` or
+    ``(False, exception)``.
+    """
+    # Processes started by the sandbox should behave as they do in the
+    # explorer, not inherit the start method used for the worker itself
+    multiprocessing.set_start_method(sandbox_start_method, force=True)
+    sandbox = TestableSandbox(Path(sandbox_path))
+    fork_snapshots = _ForkSnapshots(snapshot_directory)
+    while True:
+        try:
+            operation, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        if operation == "close":
+            conn.send((True, None))
+            break
+        try:
+            if operation in _CALLS:
+                result = getattr(sandbox, operation)(*args)
+            elif operation in _PROPERTIES:
+                result = getattr(sandbox, operation)
+            elif operation == "supports_snapshot":
+                result = sandbox.supports_snapshot or fork_snapshots.is_safe()
+            elif operation == "snapshot":
+                if sandbox.supports_snapshot:
+                    result = ("module", sandbox.snapshot())
+                else:
+                    token = fork_snapshots.snapshot()
+                    if token is _RESUMED:
+                        # The old worker has already replied to the restore
+                        continue
+                    result = ("fork", token)
+            elif operation == "release_snapshot":
+                kind, token = args[0]
+                if kind == "fork":
+                    fork_snapshots.release_token(token)
+                result = None
+            elif operation == "restore":
+                kind, token = args[0]
+                if kind == "module":
+                    sandbox.restore(token)
+                    result = os.getpid()
+                else:
+                    # Hand the pipe over to the resumed copy and exit
+                    conn.send((True, fork_snapshots.restore(token)))
+                    os._exit(0)
+            else:
+                raise ValueError(f"Unknown sandbox worker operation: {operation}")
+        except Exception as e:
+            _send_error(conn, e)
+        else:
+            conn.send((True, result))
+    conn.close()
+
+
+def _send_error(conn, error: Exception) -> None:
+    try:
+        conn.send((False, error))
+    except Exception:
+        # The exception itself could not be pickled
+        conn.send((False, RuntimeError(f"{type(error).__name__}: {error}")))
+
+
+def _shutdown(conn, process, timeout: float, snapshot_directory: str) -> None:
+    try:
+        conn.send(("close", ()))
+        if conn.poll(timeout):
+            conn.recv()
+    except (EOFError, OSError):
+        pass
+    conn.close()
+    _ForkSnapshots.release(snapshot_directory)
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+
+
+class SandboxWorker:
+    """
+    Runs a TestableSandbox in a long-lived child process.
+
+    The worker exposes the same interface as TestableSandbox, so it can be
+    explored, pooled or used in generated regression tests unchanged. Each
+    worker has its own interpreter, so testability modules and sys.path
+    changes of different sandboxes never collide, several sandboxes can be
+    driven in parallel, and a crashing SUT only takes its worker down.
+
+    Workers also support snapshot() and restore() for sandboxes without their
+    own snapshot.py/restore.py, by forking the worker process.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        start_method: str = "spawn",
+        shutdown_timeout: float = 10.0,
+        liveness_interval: float = 1.0,
+        max_snapshots: int = DEFAULT_MAX_SNAPSHOTS
+    ):
+        """
+        Start a worker process for a sandbox directory.
+
+        Args:
+            path: Path to the sandbox directory
+            start_method: multiprocessing start method for the worker
+            shutdown_timeout: Seconds to wait for the worker to exit on close
+                before terminating it
+            liveness_interval: Seconds between checks that the worker is still
+                alive while waiting for a reply
+            max_snapshots: Most fork snapshots kept alive; the oldest is
+                released when another one is taken
+        """
+        self.path = Path(path)
+        self.liveness_interval = liveness_interval
+        self.max_snapshots = max_snapshots
+        self._fork_tokens: Deque[Any] = deque()
+        self.testability_dir = self.path / "testability"
+        snapshot_directory = tempfile.mkdtemp(prefix="wdtbd-snapshots-")
+        context = multiprocessing.get_context(start_method)
+        self._conn, child_conn = context.Pipe()
+        # Not a daemon: sandboxes commonly start processes of their own
+        self._process = context.Process(
+            target=_serve,
+            args=(
+                child_conn,
+                str(self.path),
+                multiprocessing.get_start_method(),
+                snapshot_directory,
+            ),
+            name=f"sandbox-worker-{self.path.name}",
+        )
+        self._process.start()
+        child_conn.close()
+        self._active_pid = self._process.pid
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(
+            self,
+            _shutdown,
+            self._conn,
+            self._process,
+            shutdown_timeout,
+            snapshot_directory,
+        )
+
+    @property
+    def name(self) -> str:
+        """Get the name of the sandbox directory."""
+        return self.path.name
+
+    @property
+    def is_valid(self) -> bool:
+        """Check if this is a valid testable sandbox."""
+        return self.testability_dir.is_dir()
+
+    @property
+    def is_alive(self) -> bool:
+        """Check if the worker process is still running."""
+        if not self._finalizer.alive:
+            return False
+        if self._active_pid == self._process.pid:
+            return self._process.is_alive()
+        # Restored from a fork snapshot, the active worker is not our child
+        try:
+            os.kill(self._active_pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+    @property
+    def supports_snapshot(self) -> bool:
+        """
+        Check if the sandbox can be snapshotted right now, either through its
+        own snapshot.py/restore.py or by forking the worker.
+        """
+        return self._call("supports_snapshot")
+
+    @property
+    def module_cache_stats(self) -> Dict[str, int]:
+        """Get hit and miss counters of the worker's module cache."""
+        return self._call("module_cache_stats")
+
+    @traced_call("sandbox.start")
+    def start(self) -> dict:
+        """Runs start() in the worker. See TestableSandbox.start."""
+        return self._call("start")
+
+    @traced_call("sandbox.execute_action")
+    def execute_action(
+        self,
+        action_name: str,
+        parameters: Optional[dict] = None
+    ) -> dict:
+        """Runs an action in the worker. See TestableSandbox.execute_action."""
+        return self._call("execute_action", action_name, parameters)
+
+    @traced_call("sandbox.read_state")
+    def read_state(self) -> dict:
+        """Runs read_state() in the worker. See TestableSandbox.read_state."""
+        return self._call("read_state")
+
+    @traced_call("sandbox.teardown")
+    def teardown(self) -> None:
+        """Runs teardown() in the worker. The worker itself keeps running."""
+        return self._call("teardown")
+
+    def snapshot(self) -> Any:
+        """
+        Snapshot the sandbox state.
+        
+        Returns:
+            Opaque token to pass to restore()
+            
+        Raises:
+            SnapshotNotSupportedError: If the sandbox provides no snapshot.py
+                and the worker cannot be forked safely
+        """
+        token = self._call("snapshot")
+        if token[0] == "fork":
+            # Each fork snapshot is a frozen process, keep only the newest
+            self._fork_tokens.append(token)
+            while len(self._fork_tokens) > self.max_snapshots:
+                self.release_snapshot(self._fork_tokens[0])
+        return token
+
+    def release_snapshot(self, token: Any) -> None:
+        """
+        Free a snapshot that will not be restored again. Restoring it
+        afterwards raises ValueError.
+
+        Args:
+            token: Token returned by snapshot()
+        """
+        try:
+            self._fork_tokens.remove(token)
+        except ValueError:
+            pass
+        self._call("release_snapshot", token)
+
+    def restore(self, token: Any) -> None:
+        """
+        Return the sandbox to a snapshot. A token can be restored many times.
+        
+        Args:
+            token: Token returned by snapshot()
+        """
+        self._active_pid = self._call("restore", token)
+
+    @traced_call("sandbox.execute_assertion")
+    def execute_assertion(
+        self,
+        action: str,
+        parameters: dict,
+        current_state: dict,
+    ) -> bool:
+        """Evaluates an assertion in the worker."""
+        return self._call("execute_assertion", action, parameters, current_state)
+
+    @traced_call("sandbox.execute_assertions")
+    def execute_assertions(
+        self,
+        assertions: Sequence[Tuple[str, dict]],
+        current_state: Optional[dict] = None,
+        collect_all: bool = False,
+    ) -> List[AssertionResult]:
+        """Evaluates a batch of assertions in the worker."""
+        return self._call(
+            "execute_assertions", list(assertions), current_state, collect_all
+        )
+
+    def close(self) -> None:
+        """Stop the worker process."""
+        self._finalizer()
+
+    def __enter__(self) -> 'SandboxWorker':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _call(self, operation: str, *args) -> Any:
+        with self._lock:
+            if not self._finalizer.alive:
+                raise SandboxWorkerError(
+                    f"Sandbox worker for {self.name} has been closed"
+                )
+            try:
+                self._conn.send((operation, args))
+                # Frozen snapshot copies keep the pipe open, so a dead worker
+                # doesn't always show up as EOF
+                while not self._conn.poll(self.liveness_interval):
+                    if not self.is_alive:
+                        raise EOFError
+                ok, value = self._conn.recv()
+            except (EOFError, OSError) as e:
+                self._process.join(1)
+                raise SandboxWorkerError(
+                    f"Sandbox worker for {self.name} exited unexpectedly "
+                    f"(exit code {self._process.exitcode})"
+                ) from e
+        if ok:
+            return value
+        raise value
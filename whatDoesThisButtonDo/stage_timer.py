@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+from . import tracing
+
+
+class StageTimer:
+    """
+    Records when each stage of an exploration ran, so the time saved by
+    running stages concurrently can be measured.
+    """
+
+    def __init__(self):
+        self.intervals: List[Tuple[str, float, float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one run of a stage, and trace it."""
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"exploration.{name}"):
+                yield
+        finally:
+            self.intervals.append((name, start, time.perf_counter()))
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Get the time spent per stage and how much of it overlapped.
+
+        Returns:
+            Dictionary with the seconds spent in each stage, their sum, the
+            wall time during which any stage ran, and the overlap: the
+            difference between the two
+        """
+        stages: Dict[str, float] = {}
+        for name, start, end in self.intervals:
+            stages[name] = stages.get(name, 0.0) + end - start
+        busy = 0.0
+        covered_until = float("-inf")
+        for _, start, end in sorted(self.intervals, key=lambda i: i[1]):
+            if end > covered_until:
+                busy += end - max(start, covered_until)
+                covered_until = end
+        total = sum(stages.values())
+        return {
+            "stages": stages,
+            "stage_total": total,
+            "busy": busy,
+            "overlap": total - busy,
+        }
+
+    def report(self) -> str:
+        """Format the summary for printing."""
+        summary = self.summary()
+        stages = ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in summary["stages"].items()
+        )
+        return (
+            f"Stages: {stages}; total {summary['stage_total']:.3f}s in "
+            f"{summary['busy']:.3f}s, overlapped {summary['overlap']:.3f}s"
+        )
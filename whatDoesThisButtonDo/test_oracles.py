@@ -1,49 +1,343 @@
-from typing import Dict, List
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
+from .oracle_cache import CACHE_DIR_NAME, get_cache_dir
+from .token_estimate import estimate_tokens
+
+MANIFEST_FILE_NAME = "oracle_manifest.json"
+
+# "json" is the original JSON-in-markdown rendering, "compact" renders each
+# oracle as a markdown section without JSON escaping
+RENDER_MODES = ("json", "compact")
+
+# Rendered assistant messages shared by all TestOracles with the same digest
+_RENDER_CACHE_SIZE = 32
+_render_cache: "OrderedDict[Tuple, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+
+@dataclass
+class OracleManifestEntry:
+    """Identity of one loaded test oracle file"""
+    name: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
 
 class TestOracles:
     """
     Represents a collection of test oracles that define testing rules and expectations
     """
     
-    def __init__(self):
+    def __init__(
+        self,
+        render_mode: str = "json",
+        token_budget: Optional[int] = None
+    ):
+        """
+        Initialize an empty oracle collection.
+        
+        Args:
+            render_mode: Default mode of as_assistant_message, one of RENDER_MODES
+            token_budget: Default estimated token budget of as_assistant_message,
+                None for no limit
+        """
+        if render_mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {render_mode}")
+        self.render_mode = render_mode
+        self.token_budget = token_budget
+        # Relevance score per oracle name; lower scores are summarized first
+        # when the token budget is exceeded
+        self.relevance: Dict[str, float] = {}
+        self.render_stats: Dict[str, Any] = {}
         self._oracles: List[Dict[str, str]] = []
+        self._manifest: Dict[str, OracleManifestEntry] = {}
+        self._contents: Dict[str, str] = {}
+        self._digest: Optional[str] = None
+        self.changes: Dict[str, List[str]] = {
+            "added": [], "modified": [], "removed": []
+        }
         
     def load_from_directory(self, oracle_dir: str) -> None:
         """
         Load all test oracle markdown files from the specified directory
         
+        Files are ordered by name. Within a process, a file whose size and
+        mtime match the previous load of this collection is not read again.
+        A new process reads every file, since only the manifest is saved, not
+        the contents; the manifest's content hashes then tell which files
+        changed since the previous run. The changes since the previous load,
+        or since the saved manifest, are available in ``changes``.
+        
         Args:
             oracle_dir: Path to the directory containing test oracle files
         """
         oracle_path = Path(oracle_dir)
+        previous = self._manifest or self._read_manifest(oracle_path)
+        
+        manifest: Dict[str, OracleManifestEntry] = {}
+        contents: Dict[str, str] = {}
+        changes: Dict[str, List[str]] = {"added": [], "modified": [], "removed": []}
+        for file in sorted(oracle_path.glob("*.md")):
+            stat = file.stat()
+            known = previous.get(file.name)
+            if (
+                known is not None
+                and file.name in self._contents
+                and known.size == stat.st_size
+                and known.mtime_ns == stat.st_mtime_ns
+            ):
+                manifest[file.name] = known
+                contents[file.name] = self._contents[file.name]
+                continue
+            
+            with open(file, 'rb') as f:
+                raw = f.read()
+            entry = OracleManifestEntry(
+                name=file.name,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                sha256=hashlib.sha256(raw).hexdigest()
+            )
+            manifest[file.name] = entry
+            # Decoded like open(file, 'r'): locale encoding, universal newlines
+            contents[file.name] = io.TextIOWrapper(io.BytesIO(raw)).read()
+            if known is None:
+                changes["added"].append(file.name)
+            elif known.sha256 != entry.sha256:
+                changes["modified"].append(file.name)
+        changes["removed"] = sorted(set(previous) - set(manifest))
+        
+        if manifest != previous:
+            self._write_manifest(oracle_path, manifest)
+        self._manifest = manifest
+        self._contents = contents
+        self.changes = changes
+        self._digest = None
+        self._oracles = [
+            {'name': name, 'content': content}
+            for name, content in contents.items()
+        ]
+
+    def with_oracles(self, oracles: List[Dict[str, str]]) -> 'TestOracles':
+        """
+        Create a collection of the given oracles with the same render settings,
+        e.g. a subset of the sections of the loaded oracles.
+
+        Args:
+            oracles: Dictionaries with 'name' and 'content'
+
+        Returns:
+            TestOracles not tied to any directory
+        """
+        subset = TestOracles(self.render_mode, self.token_budget)
+        for oracle in oracles:
+            raw = oracle['content'].encode()
+            subset._manifest[oracle['name']] = OracleManifestEntry(
+                name=oracle['name'],
+                size=len(raw),
+                mtime_ns=0,
+                sha256=hashlib.sha256(raw).hexdigest()
+            )
+            subset._contents[oracle['name']] = oracle['content']
+        subset._oracles = [dict(oracle) for oracle in oracles]
+        return subset
+
+    @property
+    def digest(self) -> str:
+        """
+        Combined SHA-256 digest of the names and contents of all loaded oracles.
         
-        self._oracles = []
-        for file in oracle_path.glob("*.md"):
-            with open(file, 'r') as f:
-                self._oracles.append({
-                    'name': file.name,
-                    'content': f.read()
-                })
+        Caches derived from the oracles can key off this instead of hashing
+        the content again.
+        """
+        if self._digest is None:
+            combined = hashlib.sha256()
+            for entry in self._manifest.values():
+                combined.update(f"{entry.name}\0{entry.sha256}\n".encode())
+            self._digest = combined.hexdigest()
+        return self._digest
+
+    @property
+    def oracles(self) -> List[Dict[str, str]]:
+        """Loaded oracles as dictionaries with 'name' and 'content'."""
+        return [dict(oracle) for oracle in self._oracles]
+
+    @property
+    def manifest(self) -> List[OracleManifestEntry]:
+        """Manifest entries of the loaded oracles, ordered by name."""
+        return list(self._manifest.values())
+
+    @staticmethod
+    def _read_manifest(oracle_path: Path) -> Dict[str, OracleManifestEntry]:
+        try:
+            with open(oracle_path / CACHE_DIR_NAME / MANIFEST_FILE_NAME) as f:
+                return {
+                    entry["name"]: OracleManifestEntry(**entry)
+                    for entry in json.load(f)
+                }
+        except (OSError, ValueError, TypeError, KeyError):
+            return {}
+
+    @staticmethod
+    def _write_manifest(
+        oracle_path: Path,
+        manifest: Dict[str, OracleManifestEntry]
+    ) -> None:
+        try:
+            manifest_path = get_cache_dir(oracle_path) / MANIFEST_FILE_NAME
+            temporary_path = manifest_path.with_suffix(".tmp")
+            with open(temporary_path, 'w') as f:
+                json.dump([asdict(entry) for entry in manifest.values()], f)
+            os.replace(temporary_path, manifest_path)
+        except OSError:
+            # A read-only oracle directory just means no manifest
+            pass
                 
-    def as_assistant_message(self) -> str:
+    def as_assistant_message(
+        self,
+        mode: Optional[str] = None,
+        token_budget: Optional[int] = None
+    ) -> str:
         """
-        Formats the test oracles into a JSON structure for AI consumption
+        Formats the test oracles into a message for AI consumption
         
+        Rendered messages are memoized by oracle digest, mode and budget. If the
+        estimated token count exceeds the budget, the least relevant oracles
+        are reduced to their headings and first line, then left out, until the
+        message fits. Sizes of the last render are kept in ``render_stats``.
+        
+        Args:
+            mode: One of RENDER_MODES, defaults to the collection's render_mode
+            token_budget: Estimated token budget, defaults to the collection's
+            
         Returns:
-            str: A formatted string containing all test oracle contents as JSON
+            str: A formatted string containing the test oracle contents
         """
         if not self._oracles:
             return "No test oracles have been loaded."
         
-        import json
+        mode = mode or self.render_mode
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {mode}")
+        if token_budget is None:
+            token_budget = self.token_budget
+        key = (
+            self.digest,
+            mode,
+            token_budget,
+            tuple(sorted(self.relevance.items())) if token_budget else ()
+        )
         
-        message = "# Test Oracles\n\n"
-        message += "Below is a JSON structure containing all test oracles that define "
-        message += "the testing rules and expectations:\n\n"
-        message += "```json\n"
-        message += json.dumps(self._oracles, indent=2)
-        message += "\n```"
+        with _render_cache_lock:
+            cached = _render_cache.get(key)
+            if cached is not None:
+                _render_cache.move_to_end(key)
+        if cached is not None:
+            message, stats = cached
+            self.render_stats = dict(stats, cache_hit=True)
+            return message
         
+        message, stats = self._render_within_budget(mode, token_budget)
+        with _render_cache_lock:
+            _render_cache[key] = (message, stats)
+            while len(_render_cache) > _RENDER_CACHE_SIZE:
+                _render_cache.popitem(last=False)
+        self.render_stats = dict(stats, cache_hit=False)
         return message
-                
\ No newline at end of file
+
+    def _render_within_budget(
+        self,
+        mode: str,
+        token_budget: Optional[int]
+    ) -> Tuple[str, Dict[str, Any]]:
+        oracles = [dict(oracle) for oracle in self._oracles]
+        summarized: List[str] = []
+        omitted: List[str] = []
+        message = self._render(mode, oracles, omitted)
+        
+        if token_budget is not None and estimate_tokens(message) > token_budget:
+            position = {oracle['name']: i for i, oracle in enumerate(oracles)}
+            # Least relevant first; without scores, later files go first
+            least_relevant = sorted(
+                position,
+                key=lambda name: (self.relevance.get(name, 0.0), -position[name])
+            )
+            for name in least_relevant:
+                oracle = oracles[position[name]]
+                oracle['content'] = _summarize(oracle['content'])
+                summarized.append(name)
+                message = self._render(mode, oracles, omitted)
+                if estimate_tokens(message) <= token_budget:
+                    break
+            else:
+                for name in least_relevant:
+                    omitted.append(name)
+                    summarized.remove(name)
+                    message = self._render(
+                        mode,
+                        [o for o in oracles if o['name'] not in omitted],
+                        omitted
+                    )
+                    if estimate_tokens(message) <= token_budget:
+                        break
+        
+        stats = {
+            "mode": mode,
+            "token_budget": token_budget,
+            "characters": len(message),
+            "estimated_tokens": estimate_tokens(message),
+            "oracles_full": len(oracles) - len(summarized) - len(omitted),
+            "oracles_summarized": len(summarized),
+            "oracles_omitted": len(omitted),
+        }
+        return message, stats
+
+    @staticmethod
+    def _render(
+        mode: str,
+        oracles: List[Dict[str, str]],
+        omitted: List[str]
+    ) -> str:
+        if mode == "json":
+            message = "# Test Oracles\n\n"
+            message += "Below is a JSON structure containing all test oracles that "
+            message += "define the testing rules and expectations:\n\n"
+            message += "```json\n"
+            message += json.dumps(oracles, indent=2)
+            message += "\n```"
+        else:
+            sections = [
+                "# Test Oracles\n\n"
+                "The following test oracles define the testing rules and "
+                "expectations."
+            ]
+            for oracle in oracles:
+                content = _BLANK_LINES.sub("\n\n", oracle['content'].strip())
+                sections.append(f"## {oracle['name']}\n\n{content}")
+            message = "\n\n".join(sections)
+        if omitted:
+            message += (
+                "\n\nOmitted to fit the prompt budget: " + ", ".join(omitted)
+            )
+        return message
+
+
+_BLANK_LINES = re.compile(r"\n\s*\n(\s*\n)+")
+
+
+def _summarize(content: str, max_line_length: int = 200) -> str:
+    """Reduce an oracle to its headings and first line of text."""
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    headings = [line for line in lines if line.startswith("#")]
+    first_text = next((line for line in lines if not line.startswith("#")), "")
+    summary = headings[:1] + [first_text[:max_line_length]] + headings[1:]
+    return "\n".join(line for line in summary if line) + "\n(summarized)"
@@ -1,5 +1,7 @@
-from typing import List
+from typing import List, Optional
 from pathlib import Path
+from .oracle_relevance_index import OracleRelevanceIndex
+from .sandbox_discovery import SandboxDiscovery
 from .testable_sandbox import TestableSandbox
 from .test_oracles import TestOracles
 
@@ -9,11 +11,18 @@ class TestScope():
     TestScope defines the boundaries and constraints for testing.
     """
     
-    def __init__(self):
+    def __init__(self, discovery: Optional[SandboxDiscovery] = None):
         """
         Initialize the test scope with configuration.
+        
+        Args:
+            discovery: Walker used to find sandboxes, configurable with ignore
+                globs. Defaults to SandboxDiscovery()
         """
         self.test_oracles = TestOracles()
+        self.discovery = discovery or SandboxDiscovery()
+        self._oracle_dir: Optional[str] = None
+        self._relevance_index: Optional[OracleRelevanceIndex] = None
         self._testable_sandboxes: List[TestableSandbox] = []
     
     def get_testable_sandboxes(self) -> List[TestableSandbox]:
@@ -34,16 +43,28 @@ class TestScope():
         """
         oracle_path = Path(oracle_dir)
         self.test_oracles.load_from_directory(oracle_dir)
+        self._oracle_dir = oracle_dir
+        self._relevance_index = None
         
         self._testable_sandboxes = []
         
-        # Walk through all subdirectories
-        for path in oracle_path.rglob("*"):
-            # Try to create a TestableSandbox for each potential directory
-            if path.is_dir():
-                sandbox = TestableSandbox.create_if_valid(path)
-                if sandbox:
-                    self._testable_sandboxes.append(sandbox)
+        for path in self.discovery.discover(oracle_path):
+            sandbox = TestableSandbox.create_if_valid(path)
+            if sandbox:
+                self._testable_sandboxes.append(sandbox)
+    
+    @property
+    def relevance_index(self) -> Optional[OracleRelevanceIndex]:
+        """
+        Relevance index over the sections of the loaded oracles, built on
+        first use or reused from the one persisted for the same oracles.
+        None before any oracles are loaded.
+        """
+        if self._relevance_index is None and self._oracle_dir is not None:
+            self._relevance_index = OracleRelevanceIndex.load_or_build(
+                self.test_oracles, self._oracle_dir
+            )
+        return self._relevance_index
     
     def get_test_oracles(self) -> TestOracles:
         """
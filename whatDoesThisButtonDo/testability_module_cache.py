@@ -0,0 +1,117 @@
+import hashlib
+import importlib.util
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Dict
+
+
+@dataclass
+class _CachedModule:
+    module: ModuleType
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+class TestabilityModuleCache:
+    """
+    Caches the modules loaded from a sandbox's testability directory.
+
+    Modules are keyed by file path and revalidated on every load: an unchanged
+    mtime and size is a hit, a changed mtime with identical content hash is
+    still a hit, anything else re-executes the file. Modules are registered in
+    sys.modules under a name qualified by the sandbox directory, so different
+    sandboxes never overwrite each other's ``start``/``teardown`` modules.
+    """
+
+    def __init__(self, testability_dir: Path):
+        """
+        Initialize an empty cache for a testability directory.
+
+        Args:
+            testability_dir: Directory containing the testability modules
+        """
+        self.testability_dir = testability_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Path, _CachedModule] = {}
+        self._lock = threading.RLock()
+        path_hash = hashlib.sha1(
+            str(testability_dir.resolve()).encode()
+        ).hexdigest()[:12]
+        self._namespace = f"testability_{path_hash}"
+
+    def qualified_name(self, name: str) -> str:
+        """Get the sys.modules name used for a testability module."""
+        return f"{self._namespace}_{name}"
+
+    def load(self, name: str) -> ModuleType:
+        """
+        Get the module ``<name>.py``, executing it only if it is new or changed.
+
+        Args:
+            name: Module name without the .py suffix
+
+        Returns:
+            The loaded module
+        """
+        path = self.testability_dir / f"{name}.py"
+        with self._lock:
+            stat = path.stat()
+            entry = self._entries.get(path)
+            if entry is not None and (
+                entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size
+            ):
+                self.hits += 1
+                return entry.module
+
+            source = path.read_bytes()
+            digest = hashlib.sha256(source).hexdigest()
+            if entry is not None and entry.digest == digest:
+                # Touched but not modified, e.g. by a checkout
+                entry.mtime_ns = stat.st_mtime_ns
+                entry.size = stat.st_size
+                self.hits += 1
+                return entry.module
+
+            self.misses += 1
+            module = self._execute(name, path, source)
+            self._entries[path] = _CachedModule(
+                module, stat.st_mtime_ns, stat.st_size, digest
+            )
+            return module
+
+    def _execute(self, name: str, path: Path, source: bytes) -> ModuleType:
+        qualified_name = self.qualified_name(name)
+        spec = importlib.util.spec_from_file_location(qualified_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified_name] = module
+        try:
+            exec(compile(source, str(path), "exec"), module.__dict__)
+        except BaseException:
+            sys.modules.pop(qualified_name, None)
+            raise
+        return module
+
+    def clear(self) -> None:
+        """Drop all cached modules."""
+        with self._lock:
+            for path in self._entries:
+                sys.modules.pop(self.qualified_name(path.stem), None)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache hit and miss counters.
+
+        Returns:
+            Dictionary with 'hits', 'misses' and the number of cached 'modules'
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "modules": len(self._entries),
+        }
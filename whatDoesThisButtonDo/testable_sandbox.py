@@ -1,46 +1,19 @@
 from pathlib import Path
-from typing import Optional
-import jsonpath_ng
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+from .assertion_engine import AssertionResult, default_engine
+from .testability_module_cache import TestabilityModuleCache
+from .tracing import traced_call
+
+if TYPE_CHECKING:
+    from .sandbox_worker import SandboxWorker
 
 def evaluate_assertion(sut_state, assertion_parameters):
-    path_expr = jsonpath_ng.parse(assertion_parameters['path'])
-    matches = [match.value for match in path_expr.find(sut_state)]
-    
-    if not matches:
-        raise AssertionError(f"No match found for path: {assertion_parameters['path']}")
-    
-    condition = assertion_parameters['condition']
-    value = assertion_parameters['value']
-    path = assertion_parameters['path']
-    
-    for match in matches:
-        if condition == 'equals':
-            if match != value:
-                raise AssertionError(
-                    f"Expected {value} at {path}, found {match}"
-                )
-        elif condition == 'not_equals':
-            if match == value:
-                raise AssertionError(
-                    f"Did not expect {value} at {path}"
-                )
-        elif condition == 'contains':
-            if value not in match:
-                raise AssertionError(f"Expected {match} to contain {value}")
-        elif condition == 'not_contains':
-            if value in match:
-                raise AssertionError(f"Did not expect {match} to contain {value}")
-        elif condition == 'matches_regex':
-            import re
-            if not re.match(value, match):
-                raise AssertionError(
-                    f"Value did not match regex pattern.\n"
-                    f"Pattern: {value}\n"
-                    f"Actual output:\n{match}\n"
-                    "Hint: For CLI output, use (?s).* to match across multiple lines"
-                )
-        else:
-            raise ValueError(f"Unknown condition: {condition}")
+    default_engine.evaluate(sut_state, assertion_parameters)
+
+
+class SnapshotNotSupportedError(NotImplementedError):
+    """Raised when a sandbox cannot snapshot its current state"""
+
 
 class TestableSandbox:
     """
@@ -55,6 +28,7 @@ class TestableSandbox:
         """
         self.path = path
         self.testability_dir = path / "testability"
+        self.module_cache = TestabilityModuleCache(self.testability_dir)
 
     @property
     def name(self) -> str:
@@ -66,6 +40,25 @@ class TestableSandbox:
         """Check if this is a valid testable sandbox."""
         return self.testability_dir.is_dir()
 
+    @property
+    def module_cache_stats(self) -> Dict[str, int]:
+        """Get hit and miss counters of the testability module cache."""
+        return self.module_cache.stats()
+
+    def spawn_worker(self, **kwargs) -> 'SandboxWorker':
+        """
+        Start a worker process that runs this sandbox out of process.
+        
+        Args:
+            **kwargs: Passed to SandboxWorker
+            
+        Returns:
+            SandboxWorker with the same interface as this sandbox
+        """
+        from .sandbox_worker import SandboxWorker
+        return SandboxWorker(self.path, **kwargs)
+
+    @traced_call("sandbox.start")
     def start(self) -> dict:
         """
         Loads and executes the start function from the testability directory.
@@ -73,18 +66,12 @@ class TestableSandbox:
         Returns:
             A dictionary mapping function names to their documentation
         """
-        import importlib.util
-        import sys
-        
         # Load the start.py module from testability directory
         start_path = self.testability_dir / "start.py"
         if not start_path.is_file():
             raise FileNotFoundError("start.py not found in testability directory")
             
-        spec = importlib.util.spec_from_file_location("start", start_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules["start"] = module
-        spec.loader.exec_module(module)
+        module = self.module_cache.load("start")
         
         if not hasattr(module, "start"):
             raise AttributeError("start function not found in start.py")
@@ -114,6 +101,7 @@ class TestableSandbox:
         sandbox = cls(path)
         return sandbox if sandbox.is_valid else None 
 
+    @traced_call("sandbox.execute_action")
     def execute_action(
         self, 
         action_name: str, 
@@ -131,7 +119,6 @@ class TestableSandbox:
             A dictionary mapping function names to their documentation for next 
             possible actions
         """
-        import importlib.util
         import sys
         
         # Add testability directory to Python path
@@ -145,11 +132,8 @@ class TestableSandbox:
                 f"{action_name}.py not found in testability directory"
             )
             
-        # Import the action module
-        spec = importlib.util.spec_from_file_location(action_name, action_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[action_name] = module
-        spec.loader.exec_module(module)
+        # Import the action module, reusing it if unchanged since the last call
+        module = self.module_cache.load(action_name)
         
         # Get and execute the action function
         if not hasattr(module, action_name):
@@ -176,28 +160,24 @@ class TestableSandbox:
             for func in result['actions']
         }
 
+    @traced_call("sandbox.teardown")
     def teardown(self) -> None:
         """
         Loads and executes the teardown function from the testability directory.
         """
-        import importlib.util
-        import sys
-        
         # Load the teardown.py module from testability directory
         teardown_path = self.testability_dir / "teardown.py"
         if not teardown_path.is_file():
             raise FileNotFoundError("teardown.py not found in testability directory")
             
-        spec = importlib.util.spec_from_file_location("teardown", teardown_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules["teardown"] = module
-        spec.loader.exec_module(module)
+        module = self.module_cache.load("teardown")
         
         if not hasattr(module, "teardown"):
             raise AttributeError("teardown function not found in teardown.py")
             
         module.teardown()
 
+    @traced_call("sandbox.read_state")
     def read_state(self) -> dict:
         """
         Loads and executes the read_state function from the testability directory.
@@ -205,24 +185,75 @@ class TestableSandbox:
         Returns:
             The state dictionary returned by read_state.py
         """
-        import importlib.util
-        import sys
-        
         # Load the read_state.py module from testability directory
         read_state_path = self.testability_dir / "read_state.py"
         if not read_state_path.is_file():
             raise FileNotFoundError("read_state.py not found in testability directory")
         
-        spec = importlib.util.spec_from_file_location("read_state", read_state_path)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules["read_state"] = module
-        spec.loader.exec_module(module)
+        module = self.module_cache.load("read_state")
         
         if not hasattr(module, "read_state"):
             raise AttributeError("read_state function not found in read_state.py")
         
         return module.read_state()
 
+    @property
+    def supports_snapshot(self) -> bool:
+        """Check if the testability directory provides snapshot and restore."""
+        return (
+            (self.testability_dir / "snapshot.py").is_file()
+            and (self.testability_dir / "restore.py").is_file()
+        )
+
+    def snapshot(self) -> Any:
+        """
+        Loads and executes the optional snapshot function from the testability
+        directory.
+        
+        Returns:
+            The opaque token returned by snapshot(), to be passed to restore()
+            
+        Raises:
+            SnapshotNotSupportedError: If snapshot.py or restore.py is missing
+        """
+        if not self.supports_snapshot:
+            raise SnapshotNotSupportedError(
+                "snapshot.py and restore.py not found in testability directory"
+            )
+        module = self.module_cache.load("snapshot")
+        if not hasattr(module, "snapshot"):
+            raise AttributeError("snapshot function not found in snapshot.py")
+        return module.snapshot()
+
+    def restore(self, token: Any) -> None:
+        """
+        Loads and executes the optional restore function from the testability
+        directory, returning the SUT to the state captured by snapshot().
+        
+        The sandbox may have been torn down since the snapshot was taken.
+        
+        Args:
+            token: Token returned by snapshot()
+        """
+        if not self.supports_snapshot:
+            raise SnapshotNotSupportedError(
+                "snapshot.py and restore.py not found in testability directory"
+            )
+        module = self.module_cache.load("restore")
+        if not hasattr(module, "restore"):
+            raise AttributeError("restore function not found in restore.py")
+        module.restore(token)
+
+    def release_snapshot(self, token: Any) -> None:
+        """
+        Free a snapshot that will not be restored again. Snapshots of
+        snapshot.py are plain values, so there is nothing to free.
+
+        Args:
+            token: Token returned by snapshot()
+        """
+
+    @traced_call("sandbox.execute_assertion")
     def execute_assertion(
         self,
         action: str,
@@ -235,4 +266,26 @@ class TestableSandbox:
         if action != "assert_state":
             raise ValueError(f"Unknown assertion type: {action}")
             
-        evaluate_assertion(current_state, parameters)
\ No newline at end of file
+        evaluate_assertion(current_state, parameters)
+
+    @traced_call("sandbox.execute_assertions")
+    def execute_assertions(
+        self,
+        assertions: Sequence[Tuple[str, dict]],
+        current_state: Optional[dict] = None,
+        collect_all: bool = False,
+    ) -> List[AssertionResult]:
+        """
+        Executes a batch of assertion checks against a single state snapshot.
+        
+        Args:
+            assertions: (action, parameters) pairs as for execute_assertion
+            current_state: State to check, read once from the sandbox if omitted
+            collect_all: Record every failure instead of raising the first one
+            
+        Returns:
+            One AssertionResult per assertion, in the order given
+        """
+        if current_state is None:
+            current_state = self.read_state()
+        return default_engine.evaluate_many(current_state, assertions, collect_all)
@@ -0,0 +1,18 @@
+import math
+
+# Average characters per token of OpenAI tokenizers on English text and JSON.
+# Good enough for budgeting without shipping a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of prompt tokens of a text.
+
+    Args:
+        text: Text to be sent to the model
+
+    Returns:
+        Estimated token count
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
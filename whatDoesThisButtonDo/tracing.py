@@ -0,0 +1,290 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, Union
+
+# Id of the span enclosing the current code, per thread and asyncio task
+_current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+_tracer: Optional['Tracer'] = None
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def payload_size(payload: Any) -> int:
+    """
+    Get the size of a payload as JSON.
+
+    Args:
+        payload: JSON-like value
+
+    Returns:
+        Number of characters of its JSON encoding
+    """
+    return len(json.dumps(payload, separators=(',', ':'), default=str))
+
+
+class Span:
+    """
+    One timed operation. Attributes such as payload sizes and token counts
+    can be added with set while it runs.
+    """
+
+    recording = True
+
+    def __init__(self, tracer: 'Tracer', name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.id = next(tracer._ids)
+        self.parent: Optional[int] = None
+        self.start = 0.0
+        self._token = None
+        self._open = False
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def keep_open(self) -> None:
+        """
+        Let the span continue after its with block, for work that completes in
+        the background. It ends when finish is called.
+        """
+        self._open = True
+
+    def finish(self) -> None:
+        """End a span kept open after its with block."""
+        self.tracer._finish(self, time.perf_counter())
+
+    def __enter__(self) -> 'Span':
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        end = time.perf_counter()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        if not self._open:
+            self.tracer._finish(self, end)
+
+
+class _NoSpan:
+    """Stands in for a span while tracing is disabled."""
+
+    recording = False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def keep_open(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """
+    Writes every finished span as one line of a JSONL file, and optionally
+    all spans as a Chrome trace-event file on close, which chrome://tracing
+    and Perfetto can open.
+    """
+
+    def __init__(
+        self,
+        jsonl_path: Union[str, Path],
+        chrome_path: Optional[Union[str, Path]] = None
+    ):
+        """
+        Args:
+            jsonl_path: File to write a JSON object per span to
+            chrome_path: File to write the Chrome trace to on close, None for
+                none
+        """
+        self.chrome_path = chrome_path
+        self._file = open(jsonl_path, "w")
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Forked processes inherit the tracer but must not write to its files
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._origin_wall = time.time()
+
+    def span(self, name: str, **attributes: Any) -> Span:
+        """
+        Create a span, to be used as a context manager.
+
+        Args:
+            name: Operation name, e.g. "sandbox.execute_action"
+            **attributes: Attributes known when it starts
+
+        Returns:
+            The span
+        """
+        return Span(self, name, attributes)
+
+    def close(self) -> None:
+        """Close the JSONL file and write the Chrome trace."""
+        with self._lock:
+            self._file.close()
+            if self.chrome_path is not None:
+                with open(self.chrome_path, "w") as f:
+                    json.dump(
+                        {"traceEvents": self._events, "displayTimeUnit": "ms"},
+                        f,
+                        default=str
+                    )
+
+    def _finish(self, span: Span, end: float) -> None:
+        record = {
+            "name": span.name,
+            "id": span.id,
+            "parent": span.parent,
+            "start": self._origin_wall + span.start - self._origin,
+            "duration": end - span.start,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "attributes": span.attributes,
+        }
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            if self.chrome_path is not None:
+                self._events.append({
+                    "name": span.name,
+                    "cat": span.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": (span.start - self._origin) * 1e6,
+                    "dur": (end - span.start) * 1e6,
+                    "pid": record["pid"],
+                    "tid": threading.get_ident(),
+                    "args": span.attributes,
+                })
+
+
+def span(name: str, **attributes: Any) -> Union[Span, _NoSpan]:
+    """
+    Create a span of the active tracer, to be used as a context manager.
+    While tracing is disabled this returns a shared span that records
+    nothing, so check its recording before computing costly attributes.
+
+    Args:
+        name: Operation name, e.g. "sandbox.execute_action"
+        **attributes: Attributes known when it starts
+
+    Returns:
+        The span
+    """
+    tracer = _tracer
+    if tracer is None or tracer.pid != os.getpid():
+        return _NO_SPAN
+    return tracer.span(name, **attributes)
+
+
+def traced_call(name: str) -> Callable[[F], F]:
+    """
+    Decorate a method to run in a span that records the name of the object
+    it is called on, the JSON size of its arguments and of its result, and
+    a leading string argument, such as an action name, as 'action'.
+
+    Args:
+        name: Operation name of the span
+
+    Returns:
+        The decorator
+    """
+    def decorate(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if _tracer is None:
+                return method(self, *args, **kwargs)
+            current = span(name)
+            if not current.recording:
+                return method(self, *args, **kwargs)
+            with current:
+                current.set(
+                    target=getattr(self, "name", None),
+                    request_bytes=payload_size([args, kwargs])
+                )
+                if args and isinstance(args[0], str):
+                    current.set(action=args[0])
+                result = method(self, *args, **kwargs)
+                current.set(response_bytes=payload_size(result))
+                return result
+        return wrapper
+    return decorate
+
+
+def enable(
+    jsonl_path: Union[str, Path],
+    chrome_path: Optional[Union[str, Path]] = None
+) -> Tracer:
+    """
+    Start recording spans, replacing the active tracer.
+
+    Args:
+        jsonl_path: File to write a JSON object per span to
+        chrome_path: File to write the Chrome trace to when disabled
+
+    Returns:
+        The active tracer
+    """
+    global _tracer
+    disable()
+    _tracer = Tracer(jsonl_path, chrome_path)
+    return _tracer
+
+
+def disable() -> None:
+    """Stop recording spans and close the active tracer's files."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+@contextmanager
+def traced(
+    jsonl_path: Optional[Union[str, Path]],
+    chrome_path: Optional[Union[str, Path]] = None
+) -> Iterator[Optional[Tracer]]:
+    """
+    Record spans in the enclosed block.
+
+    Args:
+        jsonl_path: File to write a JSON object per span to, None to leave
+            tracing disabled
+        chrome_path: File to write the Chrome trace to at the end
+
+    Yields:
+        The active tracer, None if tracing stays disabled
+    """
+    if jsonl_path is None:
+        yield None
+        return
+    tracer = enable(jsonl_path, chrome_path)
+    try:
+        yield tracer
+    finally:
+        disable()